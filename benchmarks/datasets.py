@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.datasets
+~~~~~~~~~~~~~~~~~~~
+
+Синтетические наборы данных большого репозитория. Объекты не хранятся в памяти,
+а вычисляются по индексу, поэтому наборы из миллионов коммитов и issues обслуживаются постранично
+"""
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+
+GOLDEN_RATIO = 0.6180339887498949
+END_DATE = datetime(2020, 12, 31, 12, 0, 0)
+
+
+class Dataset(NamedTuple):
+    """Размеры синтетического репозитория"""
+    commits: int = 10000
+    open_pulls: int = 500
+    closed_pulls: int = 5000
+    open_issues: int = 1000
+    closed_issues: int = 10000
+    authors: int = 200
+    pull_request_ratio: int = 5
+    step_minutes: int = 37
+    commits_without_author: int = 50
+
+
+PRESETS = {
+    "small": Dataset(commits=1000, open_pulls=50, closed_pulls=500, open_issues=100, closed_issues=1000, authors=20),
+    "medium": Dataset(),
+    "large": Dataset(commits=1000000, open_pulls=5000, closed_pulls=200000, open_issues=20000, closed_issues=500000,
+                     authors=5000),
+}
+
+
+def get_date(index: int, step_minutes: int) -> datetime:
+    """
+    Дата объекта с индексом index: списки отсортированы от новых к старым
+    :param index:
+    :param step_minutes:
+    :return:
+    """
+    return END_DATE - timedelta(minutes=index * step_minutes)
+
+
+def to_iso(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def get_login(index: int, authors: int) -> str:
+    """
+    Логин автора объекта: распределение авторов скошено, как в реальных репозиториях
+    :param index:
+    :param authors:
+    :return:
+    """
+    return f"developer{int(authors * ((index * GOLDEN_RATIO) % 1) ** 2)}"
+
+
+def get_commit(dataset: Dataset, index: int) -> dict:
+    created = to_iso(get_date(index, dataset.step_minutes))
+    has_author = dataset.commits_without_author == 0 or index % dataset.commits_without_author
+    login = get_login(index, dataset.authors)
+    return {
+        "sha": f"{index:040x}",
+        "commit": {"author": {"name": login, "email": f"{login}@example.com", "date": created}},
+        "author": {"login": login} if has_author else None,
+    }
+
+
+def get_item(dataset: Dataset, kind: str, state: str, index: int, base_url: str, repository: str) -> dict:
+    """
+    Pull request или issue с индексом index в списке kind ("pulls" или "issues") состояния state
+    :param dataset:
+    :param kind:
+    :param state:
+    :param index:
+    :param base_url:
+    :param repository:
+    :return:
+    """
+    number = index * 2 + (1 if state == "open" else 2)
+    created = get_date(index, dataset.step_minutes)
+    is_pull = kind == "pulls" or index % dataset.pull_request_ratio == 0
+    item = {
+        "number": number,
+        "url": f"{base_url}/repos/{repository}/{'pulls' if kind == 'pulls' else 'issues'}/{number}",
+        "state": state,
+        "created_at": to_iso(created),
+        "closed_at": to_iso(created + timedelta(hours=index % 72 + 1)) if state == "closed" else None,
+        "merged_at": to_iso(created + timedelta(hours=index % 72 + 1)) if state == "closed" and is_pull and index % 3
+        else None,
+        "user": {"login": get_login(index, dataset.authors)},
+    }
+    if kind == "issues" and is_pull:
+        item["pull_request"] = {"url": f"{base_url}/repos/{repository}/pulls/{number}"}
+    return item
+
+
+def to_bitbucket_date(value: Optional[str]) -> Optional[str]:
+    return value.replace("Z", "+00:00") if value else value
+
+
+def get_bitbucket_commit(dataset: Dataset, index: int) -> dict:
+    """
+    Коммит с индексом index в формате Bitbucket Cloud
+    :param dataset:
+    :param index:
+    :return:
+    """
+    commit = get_commit(dataset, index)
+    author = commit["commit"]["author"]
+    return {
+        "type": "commit",
+        "hash": commit["sha"],
+        "date": to_bitbucket_date(author["date"]),
+        "author": {
+            "raw": f"{author['name']} <{author['email']}>",
+            **({"user": {"nickname": commit["author"]["login"]}} if commit["author"] else {}),
+        },
+    }
+
+
+def get_bitbucket_item(dataset: Dataset, kind: str, state: str, index: int) -> dict:
+    """
+    Pull request или issue в формате Bitbucket Cloud. Дата закрытия передается датой последнего изменения,
+    закрытый pull request с датой слияния получает состояние MERGED, остальные - DECLINED
+    :param dataset:
+    :param kind: "pulls" или "issues"
+    :param state:
+    :param index:
+    :return:
+    """
+    item = get_item(dataset, kind, state, index, "", "")
+    common = {
+        "id": item["number"],
+        "created_on": to_bitbucket_date(item["created_at"]),
+        "updated_on": to_bitbucket_date(item["closed_at"] or item["created_at"]),
+    }
+    if kind == "pulls":
+        return {"type": "pullrequest", **common, "author": {"nickname": item["user"]["login"]},
+                "state": "OPEN" if state == "open" else ("MERGED" if item["merged_at"] else "DECLINED")}
+    return {"type": "issue", **common, "reporter": {"nickname": item["user"]["login"]},
+            "state": "new" if state == "open" else "resolved"}
+
+
+def get_issue_index(dataset: Dataset, position: int) -> int:
+    """
+    Индекс issue набора, которая не является pull request, по ее номеру среди таких issues
+    (issues Bitbucket не содержат pull requests)
+    :param dataset:
+    :param position:
+    :return:
+    """
+    ratio = dataset.pull_request_ratio
+    return position // (ratio - 1) * ratio + position % (ratio - 1) + 1
+
+
+def get_issues_size(dataset: Dataset, state: str) -> int:
+    """
+    Количество issues состояния state, которые не являются pull requests
+    :param dataset:
+    :param state:
+    :return:
+    """
+    size = get_size(dataset, "issues", state)
+    return size - -(-size // dataset.pull_request_ratio)
+
+
+def get_size(dataset: Dataset, kind: str, state: Optional[str]) -> int:
+    """
+    Количество объектов списка
+    :param dataset:
+    :param kind:
+    :param state:
+    :return:
+    """
+    if kind == "commits":
+        return dataset.commits
+    return getattr(dataset, f"{state}_{'pulls' if kind == 'pulls' else 'issues'}")
+
+
+def get_commits_range(dataset: Dataset, since: Optional[str], until: Optional[str]) -> range:
+    """
+    Диапазон индексов коммитов с датами в интервале [since; until]
+    :param dataset:
+    :param since:
+    :param until:
+    :return:
+    """
+    step = timedelta(minutes=dataset.step_minutes)
+    first, last = 0, dataset.commits
+    if until:
+        first = max(0, -(-(END_DATE - datetime.fromisoformat(until[:19])) // step))
+    if since:
+        last = min(last, (END_DATE - datetime.fromisoformat(since[:19])) // step + 1)
+    return range(first, max(first, last))
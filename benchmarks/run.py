@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.run
+~~~~~~~~~~~~~~~~~~~
+
+Запуск замеров производительности против локальной заглушки github api или Bitbucket Cloud api.
+Каждая пара (стратегия, этап) выполняется в отдельном процессе, чтобы пиковый RSS не накапливался:
+
+    python -m benchmarks.run --dataset medium --latency 0.02 --jitter 0.01
+    python -m benchmarks.run --site github --site bitbucket --strategy full
+"""
+import multiprocessing
+import resource
+import time
+
+import click
+import requests
+
+from benchmarks.datasets import PRESETS
+from benchmarks.stub_server import StubServer, SITES
+from repository_statistics import httpclient
+from repository_statistics.sites import get_driver
+from repository_statistics.structure import Params
+
+SCANS = ("dev_activity", "pull_requests", "issues")
+
+
+def run_pagination(params: Params):
+    return sum(1 for _ in get_driver(params.url).fetch("commits", params))
+
+
+def run_full(params: Params):
+    from repository_statistics.calculations import get_result_data
+    return get_result_data(params)
+
+
+def run_session(params: Params):
+    httpclient.use_session(requests.Session())
+    return run_full(params)
+
+
+def run_workers(params: Params):
+    return run_full(params._replace(workers=0))
+
+
+def run_estimate(params: Params):
+    from repository_statistics.sampling import get_estimated_result_data
+    return get_estimated_result_data(params._replace(estimate=True), seed=0)
+
+
+def run_plan(params: Params):
+    from repository_statistics.planner import get_plan
+    return get_plan(params)
+
+
+STRATEGIES = {
+    "pagination": run_pagination,
+    "full": run_full,
+    "session": run_session,
+    "workers": run_workers,
+    "estimate": run_estimate,
+    "plan": run_plan,
+}
+# Стратегии, которые требуют режима драйвера сайта
+STRATEGY_MODES = {"workers": "workers", "estimate": "estimate", "plan": "plan"}
+
+
+def measure(strategy: str, scan: str, base_url: str, repository_url: str, queue: multiprocessing.Queue):
+    """
+    Выполняет стратегию для одного этапа в дочернем процессе и передает замеры в очередь
+    :param strategy:
+    :param scan:
+    :param base_url:
+    :param repository_url:
+    :param queue:
+    :return:
+    """
+    get_driver(repository_url).set_base_url(base_url)
+    counter = []
+    httpclient.response_hooks.append(counter.append)
+    params = Params(url=repository_url, api_key="benchmark", begin_date=None, end_date=None, branch="master",
+                    dev_activity=scan == "dev_activity", pull_requests=scan == "pull_requests",
+                    issues=scan == "issues")
+    wall, cpu = time.perf_counter(), time.process_time()
+    STRATEGIES[strategy](params)
+    queue.put({
+        "strategy": strategy,
+        "scan": scan,
+        "requests": len(counter),
+        "wall": time.perf_counter() - wall,
+        "cpu": time.process_time() - cpu,
+        "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    })
+
+
+def run_benchmarks(stub: StubServer, strategies: list, scans: list, site: str = "github") -> list:
+    """
+    Выполняет замеры для всех пар (стратегия, этап). Стратегии, режим которых драйвер сайта
+    не поддерживает, пропускаются
+    :param stub:
+    :param strategies:
+    :param scans:
+    :param site:
+    :return:
+    """
+    context = multiprocessing.get_context("spawn")
+    modes = get_driver(stub.repository_url).modes
+    results = []
+    for strategy in strategies:
+        if strategy in STRATEGY_MODES and STRATEGY_MODES[strategy] not in modes:
+            continue
+        for scan in scans if strategy != "pagination" else ["dev_activity"]:
+            queue = context.Queue()
+            process = context.Process(target=measure, args=(strategy, scan, stub.url, stub.repository_url, queue))
+            process.start()
+            process.join()
+            if process.exitcode:
+                raise click.ClickException(f"strategy {strategy} failed on {scan} (exit code {process.exitcode})")
+            results.append({"site": site, **queue.get()})
+    return results
+
+
+def format_results(results: list) -> str:
+    lines = ['{0:9} | {1:12} | {2:15} | {3:>9} | {4:>9} | {5:>9} | {6:>13}'.format(
+        "site", "strategy", "scan", "requests", "wall, s", "cpu, s", "peak RSS, MiB")]
+    lines.append("-" * len(lines[0]))
+    for result in results:
+        lines.append(
+            '{site:9} | {strategy:12} | {scan:15} | {requests:9d} | {wall:9.2f} | {cpu:9.2f} | {peak_rss:13.1f}'.format(
+                **result))
+    return "\n".join(lines)
+
+
+@click.command()
+@click.option('--dataset', type=click.Choice(list(PRESETS)), default="small", help='synthetic repository size')
+@click.option('--commits', type=int, default=None, help='override the number of commits of the dataset')
+@click.option('--issues', type=int, default=None, help='override the number of closed issues of the dataset')
+@click.option('--latency', type=float, default=0.0, help='base response latency, seconds')
+@click.option('--jitter', type=float, default=0.0, help='maximum extra random latency, seconds')
+@click.option('--strategy', 'strategies', multiple=True, type=click.Choice(list(STRATEGIES)),
+              help='strategies to measure (default: all)')
+@click.option('--scan', 'scans', multiple=True, type=click.Choice(SCANS), help='scans to measure (default: all)')
+@click.option('--site', 'sites', multiple=True, type=click.Choice(list(SITES)),
+              help='site drivers to measure against their stubs (default: github)')
+def main(dataset, commits, issues, latency, jitter, strategies, scans, sites):
+    """
+    Benchmarks the scans against local GitHub and Bitbucket Cloud API stubs with the same synthetic repository.
+    Strategies that the site driver does not support are skipped.
+    """
+    dataset = PRESETS[dataset]
+    if commits is not None:
+        dataset = dataset._replace(commits=commits)
+    if issues is not None:
+        dataset = dataset._replace(closed_issues=issues)
+    results = []
+    for site in sites or ["github"]:
+        with StubServer(dataset, latency=latency, jitter=jitter, rate_limit=10 ** 9, site=site) as stub:
+            results.extend(run_benchmarks(stub, list(strategies or STRATEGIES), list(scans or SCANS), site))
+    print(format_results(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.startup
+~~~~~~~~~~~~~~~~~~~
+
+Замер времени импорта cli и холодного старта процесса (--help и --offline ответ из кэша).
+Запись кэша сохраняется под ключом, который cli строит по тем же опциям командной строки.
+Завершается с ошибкой, если при импорте cli загружаются сетевые модули, --offline не отвечает
+записью из кэша или время превышает порог:
+
+    python -m benchmarks.startup --runs 10 --max_import 0.15
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import click
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("requests", "numpy", "urllib3", "repository_statistics.sites.github",
+                 "repository_statistics.validation")
+OFFLINE_ARGS = ["https://github.com/owner/repo", "key", "--all_active", "--offline"]
+CACHED_LOGIN = "cached-developer"
+
+
+def get_loaded_heavy_modules() -> list:
+    """
+    Сетевые и тяжелые модули, загружаемые при импорте cli
+    :return:
+    """
+    code = f"import sys, cli; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return [module for module in output.strip().split(",") if module]
+
+
+def get_import_time() -> float:
+    """
+    Суммарное время импорта cli в секундах по данным python -X importtime
+    :return:
+    """
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import cli"], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stderr
+    line = next(line for line in reversed(stderr.splitlines()) if line.rstrip().endswith("| cli"))
+    return int(line.split("|")[1]) / 10 ** 6
+
+
+def get_offline_cache_key() -> str:
+    """
+    Ключ кэша, который cli строит для OFFLINE_ARGS
+    :return:
+    """
+    import cli
+    from repository_statistics.cache import get_cache_key
+
+    return get_cache_key(**cli.get_options(**cli.main.make_context("cli.py", list(OFFLINE_ARGS)).params))
+
+
+def serves_cached_result(env: dict) -> bool:
+    """
+    Отвечает ли cli с --offline записью из кэша, а не сообщением об ее отсутствии
+    :param env:
+    :return:
+    """
+    output = subprocess.run([sys.executable, "cli.py", *OFFLINE_ARGS], cwd=ROOT, env=env, capture_output=True,
+                            text=True, check=True).stdout
+    return CACHED_LOGIN in output
+
+
+def get_cold_start(args: list, env: dict) -> float:
+    """
+    Время работы процесса python cli.py args в секундах
+    :param args:
+    :param env:
+    :return:
+    """
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "cli.py", *args], cwd=ROOT, env=env, capture_output=True, check=True)
+    return time.perf_counter() - started
+
+
+@click.command()
+@click.option('--runs', type=int, default=5, help='number of measurements, the median is reported')
+@click.option('--max_import', type=float, default=None, help='fail if importing cli takes longer, seconds')
+@click.option('--max_start', type=float, default=None, help='fail if the offline cold start takes longer, seconds')
+def main(runs, max_import, max_start):
+    """Measures cli import time and cold start, guarding against startup regressions."""
+    from repository_statistics.cache import save_result_data
+    from repository_statistics.structure import ResultData, PullRequests, Issues
+
+    failures = []
+    heavy = get_loaded_heavy_modules()
+    if heavy:
+        failures.append(f"modules imported eagerly by cli: {', '.join(heavy)}")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = {**os.environ, "REPOSITORY_STATISTICS_CACHE": cache_dir}
+        os.environ["REPOSITORY_STATISTICS_CACHE"] = cache_dir
+        save_result_data(get_offline_cache_key(),
+                         ResultData([(CACHED_LOGIN, 1)], PullRequests(1, 2, 3), Issues(4, 5, 6)))
+        if not serves_cached_result(env):
+            failures.append("--offline did not serve the cached result, the cold start measures a cache miss")
+        import_time = statistics.median(get_import_time() for _ in range(runs))
+        help_start = statistics.median(get_cold_start(["--help"], env) for _ in range(runs))
+        offline_start = statistics.median(get_cold_start(OFFLINE_ARGS, env) for _ in range(runs))
+
+    print(f"import cli          {import_time * 1000:8.1f} ms")
+    print(f"cold start --help   {help_start * 1000:8.1f} ms")
+    print(f"cold start offline  {offline_start * 1000:8.1f} ms")
+    if max_import is not None and import_time > max_import:
+        failures.append(f"import time {import_time:.3f} s exceeds {max_import} s")
+    if max_start is not None and offline_start > max_start:
+        failures.append(f"offline cold start {offline_start:.3f} s exceeds {max_start} s")
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
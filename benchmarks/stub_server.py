@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.stub_server
+~~~~~~~~~~~~~~~~~~~
+
+Локальные заглушки github api и Bitbucket Cloud api для измерения производительности без обращения к сайтам.
+Заглушка github обслуживает /repos/{owner}/{repo}, /repos/{owner}/{repo}/commits, /pulls, /issues, /branches/{branch},
+/compare/{base}...{head}, /rate_limit, /search/issues и /graphql (включая поиск пользователей по email)
+с корректными заголовками Link, ETag и X-RateLimit-*. Заглушка Bitbucket обслуживает
+/repositories/{workspace}/{repo}, /commits/{branch}, /pullrequests, /issues, /refs/branches/{branch} и /user
+со ссылкой next в теле ответа и заголовками X-RateLimit-Limit и X-RateLimit-NearLimit.
+Обе заглушки отдают один синтетический набор данных с настраиваемой задержкой и разбросом задержки ответа
+"""
+import hashlib
+import json
+import random
+import re
+import socket
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import urlparse, parse_qs, urlencode
+
+from benchmarks.datasets import (Dataset, get_commit, get_item, get_size, get_commits_range, get_bitbucket_commit,
+                                 get_bitbucket_item, get_issue_index, get_issues_size)
+
+REPOSITORY = "owner/repo"
+RATE_LIMIT = 5000
+DEFAULT_PER_PAGE = 30
+MAX_PER_PAGE = 100
+DEFAULT_PAGELEN = 10
+NEAR_LIMIT_SHARE = 0.2
+
+_repository_path = re.compile(r"^/repos/(?P<repository>[^/]+/[^/]+)/(?P<kind>commits|pulls|issues)$")
+_dataset_email = re.compile(r"^developer(\d+)@example\.com$")
+_user_search = re.compile(r'(e\d+): search\(query: "([^"]+) in:email"')
+_compare_path = re.compile(r"^/repos/(?P<repository>[^/]+/[^/]+)/compare/(?P<base>[^.]+)\.\.\.(?P<head>[^.]+)$")
+_sha = re.compile(r"^[0-9a-f]{40}$")
+_branch_path = re.compile(r"^/repos/(?P<repository>[^/]+/[^/]+)/branches/(?P<branch>[^/]+)$")
+_github_repository = re.compile(r"^/repos/(?P<repository>[^/]+/[^/]+)$")
+_bitbucket_repository = re.compile(r"^/repositories/(?P<repository>[^/]+/[^/]+)$")
+_bitbucket_path = re.compile(
+    r"^/repositories/(?P<repository>[^/]+/[^/]+)/(?P<kind>commits(?:/[^/]+)?|pullrequests|issues)$")
+_bitbucket_branch_path = re.compile(r"^/repositories/(?P<repository>[^/]+/[^/]+)/refs/branches/(?P<branch>[^/]+)$")
+
+
+class StubState:
+    """Общее состояние заглушки: набор данных, задержка, счетчики запросов и лимита"""
+
+    def __init__(self, dataset: Dataset, latency: float = 0.0, jitter: float = 0.0, rate_limit: int = RATE_LIMIT,
+                 seed: Optional[int] = None):
+        self.dataset = dataset
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.remaining = rate_limit
+        self.reset = int(time.time()) + 3600
+        self.requests = 0
+        # Ветка указывает на коммит с индексом hidden_commits: уменьшение значения имитирует новые коммиты,
+        # diverged - перезапись истории (force push)
+        self.hidden_commits = 0
+        self.diverged = False
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def consume(self, counted: bool = True) -> int:
+        """
+        Учитывает запрос. Условные запросы с ответом 304 github не учитывает в лимите (counted=False)
+        :param counted:
+        :return:
+        """
+        with self.lock:
+            self.requests += 1
+            if counted:
+                self.remaining = max(0, self.remaining - 1)
+            return self.remaining
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self.rng.uniform(0, self.jitter))
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    state: StubState = None
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Заголовки и тело отправляются отдельно: без TCP_NODELAY keep-alive соединения ждут delayed ACK
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_GET(self):
+        self._handle(send_body=True)
+
+    def do_HEAD(self):
+        self._handle(send_body=False)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if urlparse(self.path).path == "/graphql":
+            searches = _user_search.findall(json.loads(body or b"{}").get("query", ""))
+            if searches:
+                return self._reply(200, {"data": {
+                    alias: {"nodes": [{"login": login}] if (login := self._find_login(email)) else []}
+                    for alias, email in searches
+                }})
+            return self._reply(200, {"data": {"repository": {
+                "pullRequests": {"totalCount": self.state.dataset.open_pulls + self.state.dataset.closed_pulls},
+                "issues": {"totalCount": self.state.dataset.open_issues + self.state.dataset.closed_issues},
+            }}})
+        self._reply(404, {"message": "Not Found"})
+
+    def _handle(self, send_body: bool):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        listing = _repository_path.match(url.path)
+        if listing:
+            return self._listing(url.path, listing.group("repository"), listing.group("kind"), query, send_body)
+        if _branch_path.match(url.path):
+            return self._reply(200, {"name": _branch_path.match(url.path).group("branch"),
+                                     "commit": {"sha": f"{self.state.hidden_commits:040x}"}}, send_body=send_body)
+        if _github_repository.match(url.path):
+            return self._reply(200, {"full_name": _github_repository.match(url.path).group("repository")},
+                               send_body=send_body)
+        compare = _compare_path.match(url.path)
+        if compare:
+            return self._compare(url.path, compare.group("base"), compare.group("head"), query, send_body)
+        if url.path == "/rate_limit":
+            return self._reply(200, {"resources": {"core": {"limit": self.state.rate_limit,
+                                                            "remaining": self.state.remaining,
+                                                            "reset": self.state.reset}}}, send_body=send_body)
+        if url.path == "/search/issues":
+            return self._reply(200, self._search(query.get("q", "")), send_body=send_body)
+        self._reply(404, {"message": "Not Found"}, send_body=send_body)
+
+    def _find_login(self, email: str) -> Optional[str]:
+        """
+        Логин пользователя с публичным адресом email: developerN@example.com для авторов набора данных
+        :param email:
+        :return:
+        """
+        match = _dataset_email.match(email)
+        return f"developer{match.group(1)}" if match and int(match.group(1)) < self.state.dataset.authors else None
+
+    def _search(self, q: str) -> dict:
+        dataset = self.state.dataset
+        kind = "pulls" if "is:pr" in q else "issues"
+        states = [state for state in ("open", "closed") if f"state:{state}" in q] or ["open", "closed"]
+        return {"total_count": sum(get_size(dataset, kind, state) for state in states),
+                "incomplete_results": False, "items": []}
+
+    def _listing(self, path: str, repository: str, kind: str, query: dict, send_body: bool):
+        dataset = self.state.dataset
+        per_page = min(int(query.get("per_page", DEFAULT_PER_PAGE)), MAX_PER_PAGE)
+        page = max(int(query.get("page", 1)), 1)
+        if kind == "commits":
+            indexes = get_commits_range(dataset, query.get("since"), query.get("until"))
+            sha = query.get("sha", "")
+            head = int(sha, 16) if _sha.match(sha) else self.state.hidden_commits
+            indexes = indexes[max(0, head - indexes.start):]
+        else:
+            indexes = range(get_size(dataset, kind, query.get("state", "open")))
+        page_indexes, links = self._paginate(path, query, indexes, per_page, page)
+        base_url = f"http://{self.headers.get('Host')}"
+        if not send_body:
+            items = []
+        elif kind == "commits":
+            items = [get_commit(dataset, index) for index in page_indexes]
+        else:
+            items = [get_item(dataset, kind, query.get("state", "open"), index, base_url, repository)
+                     for index in page_indexes]
+        self._reply(200, items, {"Link": ", ".join(links)} if links else {}, send_body)
+
+    def _compare(self, path: str, base: str, head: str, query: dict, send_body: bool):
+        """
+        Сравнение base...head: коммиты, которых нет в base, от старых к новым
+        :param path:
+        :param base:
+        :param head:
+        :param query:
+        :param send_body:
+        :return:
+        """
+        if not (_sha.match(base) and _sha.match(head)):
+            return self._reply(404, {"message": "Not Found"}, send_body=send_body)
+        base_index, head_index = int(base, 16), int(head, 16)
+        if self.state.diverged or base_index < head_index:
+            return self._reply(200, {"status": "diverged", "ahead_by": 0, "behind_by": 0, "total_commits": 0,
+                                     "commits": []}, send_body=send_body)
+        indexes = range(base_index - 1, head_index - 1, -1)
+        per_page = min(int(query.get("per_page", DEFAULT_PER_PAGE)), MAX_PER_PAGE)
+        page_indexes, links = self._paginate(path, query, indexes, per_page, max(int(query.get("page", 1)), 1))
+        self._reply(200, {
+            "status": "ahead" if indexes else "identical",
+            "ahead_by": len(indexes),
+            "behind_by": 0,
+            "total_commits": len(indexes),
+            "commits": [get_commit(self.state.dataset, index) for index in page_indexes] if send_body else [],
+        }, {"Link": ", ".join(links)} if links else {}, send_body)
+
+    def _paginate(self, path: str, query: dict, indexes: range, per_page: int, page: int) -> tuple:
+        """
+        Индексы объектов страницы и ссылки Link на соседние страницы
+        :param path:
+        :param query:
+        :param indexes:
+        :param per_page:
+        :param page:
+        :return:
+        """
+        last_page = max(1, -(-len(indexes) // per_page))
+        base_url = f"http://{self.headers.get('Host')}"
+        links = []
+        if page < last_page:
+            links.append(f'<{base_url}{path}?{urlencode({**query, "page": page + 1})}>; rel="next"')
+            links.append(f'<{base_url}{path}?{urlencode({**query, "page": last_page})}>; rel="last"')
+        if page > 1:
+            links.append(f'<{base_url}{path}?{urlencode({**query, "page": 1})}>; rel="first"')
+            links.append(f'<{base_url}{path}?{urlencode({**query, "page": page - 1})}>; rel="prev"')
+        return indexes[(page - 1) * per_page:page * per_page], links
+
+    def _reply(self, status: int, data, headers: Optional[dict] = None, send_body: bool = True):
+        self.state.delay()
+        body = json.dumps(data).encode("utf-8")
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        not_modified = status == 200 and self.headers.get("If-None-Match") == etag
+        remaining = self.state.consume(counted=not not_modified)
+        if not_modified:
+            status, body, send_body = 304, b"", False
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if status in (200, 304):
+            self.send_header("ETag", etag)
+        for name, value in {**self._rate_limit_headers(remaining), **(headers or {})}.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _rate_limit_headers(self, remaining: int) -> dict:
+        return {"X-RateLimit-Limit": str(self.state.rate_limit), "X-RateLimit-Remaining": str(remaining),
+                "X-RateLimit-Reset": str(self.state.reset)}
+
+    def log_message(self, format, *args):
+        pass
+
+
+class BitbucketStubHandler(StubHandler):
+    """
+    Заглушка Bitbucket Cloud api. Issues не содержат pull requests набора данных,
+    закрытые pull requests отдаются при любом наборе закрытых состояний
+    """
+
+    def do_POST(self):
+        self._reply(404, {"type": "error", "error": {"message": "Not Found"}})
+
+    def _handle(self, send_body: bool):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        listing = _bitbucket_path.match(url.path)
+        if listing:
+            return self._values(url.path, listing.group("kind").split("/")[0], query, send_body)
+        branch = _bitbucket_branch_path.match(url.path)
+        if branch:
+            return self._reply(200, {"type": "branch", "name": branch.group("branch"),
+                                     "target": {"hash": f"{self.state.hidden_commits:040x}"}}, send_body=send_body)
+        if _bitbucket_repository.match(url.path):
+            return self._reply(200, {"type": "repository",
+                                     "full_name": _bitbucket_repository.match(url.path).group("repository")},
+                               send_body=send_body)
+        if url.path == "/user":
+            return self._reply(200, {"type": "user", "nickname": "benchmark"}, send_body=send_body)
+        self._reply(404, {"type": "error", "error": {"message": "Not Found"}}, send_body=send_body)
+
+    def _values(self, path: str, kind: str, query: dict, send_body: bool):
+        """
+        Страница списка: {"values": [...], "pagelen": ..., "page": ..., "size": ..., "next": ...}.
+        Размер списка коммитов Bitbucket не сообщает
+        :param path:
+        :param kind: commits, pullrequests или issues
+        :param query: параметры запроса со всеми значениями
+        :param send_body:
+        :return:
+        """
+        dataset = self.state.dataset
+        pagelen = min(int(query.get("pagelen", [DEFAULT_PAGELEN])[0]), MAX_PER_PAGE)
+        page = max(int(query.get("page", ["1"])[0]), 1)
+        state = None
+        if kind == "commits":
+            size = dataset.commits
+        elif kind == "pullrequests":
+            state = "open" if "OPEN" in query.get("state", ["OPEN"]) else "closed"
+            size = get_size(dataset, "pulls", state)
+        else:
+            state = "open" if 'state="new"' in query.get("q", [""])[0] else "closed"
+            size = get_issues_size(dataset, state)
+        positions = range((page - 1) * pagelen, min(page * pagelen, size)) if send_body else range(0)
+        if kind == "commits":
+            values = [get_bitbucket_commit(dataset, position) for position in positions]
+        elif kind == "pullrequests":
+            values = [get_bitbucket_item(dataset, "pulls", state, position) for position in positions]
+        else:
+            values = [get_bitbucket_item(dataset, "issues", state, get_issue_index(dataset, position))
+                      for position in positions]
+        body = {"pagelen": pagelen, "page": page, "values": values}
+        if kind != "commits":
+            body["size"] = size
+        if page * pagelen < size:
+            body["next"] = f"http://{self.headers.get('Host')}{path}?{urlencode({**query, 'page': page + 1}, True)}"
+        self._reply(200, body, send_body=send_body)
+
+    def _rate_limit_headers(self, remaining: int) -> dict:
+        return {"X-RateLimit-Limit": str(self.state.rate_limit), "X-RateLimit-Resource": "api",
+                "X-RateLimit-NearLimit": str(remaining < self.state.rate_limit * NEAR_LIMIT_SHARE).lower()}
+
+
+SITES = {
+    "github": (StubHandler, f"https://github.com/{REPOSITORY}"),
+    "bitbucket": (BitbucketStubHandler, f"https://bitbucket.org/{REPOSITORY}"),
+}
+
+
+class StubServer:
+    """Заглушка api сайта site в отдельном потоке: with StubServer(dataset) as stub: stub.url ..."""
+
+    def __init__(self, dataset: Dataset, host: str = "127.0.0.1", port: int = 0, site: str = "github", **options):
+        self.state = StubState(dataset, **options)
+        handler_class, self.repository_url = SITES[site]
+        handler = type("BoundStubHandler", (handler_class,), {"state": self.state})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+
+    def __enter__(self) -> "StubServer":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
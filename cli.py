@@ -1,16 +1,32 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import math
+import sys
+
+from contextlib import ExitStack
+
 import click
 
+from repository_statistics.cache import get_cache_key, load_result_data, save_result_data
 from repository_statistics.exceptions import TimeoutConnectionError, ConnectError, ValidationError, HTTPError
+from repository_statistics.output import FORMATS, get_writer, write_result_data, write_sections
 from repository_statistics.utils import get_begin_date, get_end_date
-from repository_statistics.structure import Params, ResultData
-from repository_statistics.calculations import get_result_data
-from repository_statistics.validation import get_valid_params
+from repository_statistics.structure import Params, Metrics, Contributors, Estimate, Plan, ResultData
+
+# Модули, выполняющие запросы (requests, numpy, validation, sites), импортируются только на сетевом пути
 
 
-@get_valid_params
 def get_params(**params) -> Params:
+    """
+    Валидирует параметры скрипта и формирует структуру для их хранения
+    :param params:
+    :return:
+    """
+    from repository_statistics.validation import get_valid_params
+    return get_valid_params(make_params)(**params)
+
+
+def make_params(**params) -> Params:
     """
     Формирует структуру для хранения параметров скрипта
     :param params:
@@ -24,22 +40,83 @@ def get_params(**params) -> Params:
         branch=params["branch"],
         dev_activity=params["dev_activity"],
         pull_requests=params["pull_requests"],
-        issues=params["issues"]
+        issues=params["issues"],
+        metrics=params["metrics"],
+        sketch=params["sketch"] or None,
+        estimate=params["estimate"],
+        sample_budget=params["sample_budget"],
+        target_error=params["target_error"],
+        plan=params["plan"],
+        identities=params["identities"],
+        aliases=params["aliases"],
+        workers=params["workers"],
+        incremental=params["incremental"]
     )
 
 
+def get_options(url, api_key, begin_date, end_date, branch, dev_activity, pull_requests, issues, all_active, metrics,
+                sketch, estimate, budget, target_error, identities, aliases, workers, incremental, plan, **_) -> dict:
+    """
+    Параметры отчета по значениям опций командной строки: --all_active включает все виды анализа,
+    --sketch - статистику коммитов, --aliases - разрешение авторов. По этим параметрам строится и ключ кэша
+    :return:
+    """
+    if all_active:
+        dev_activity = pull_requests = issues = True
+    if sketch:
+        dev_activity = True
+    if aliases:
+        identities = True
+    return dict(
+        url=url,
+        api_key=api_key,
+        begin_date=begin_date,
+        end_date=end_date,
+        branch=branch,
+        dev_activity=dev_activity,
+        pull_requests=pull_requests,
+        issues=issues,
+        metrics=metrics,
+        sketch=sketch,
+        estimate=estimate,
+        sample_budget=budget,
+        target_error=target_error,
+        plan=plan,
+        identities=identities,
+        aliases=aliases,
+        workers=workers,
+        incremental=incremental
+    )
+
+
+def echo_message(message: str, output_format: str):
+    """
+    Выводит сообщение для пользователя. В машиночитаемых форматах сообщение выводится в stderr,
+    чтобы не попасть в документ с данными
+    :param message:
+    :param output_format:
+    :return:
+    """
+    click.echo(message, err=output_format != "text")
+
+
 def output_data(result_data: ResultData):
     """
     Вывод результатов работы скрипта.
     :param result_data:
     :return:
     """
+    if result_data.sampling:
+        return output_estimates(result_data)
     if result_data.dev_activity:
         print("1. COMMIT STATISTICS")
         print('{0:25} | {1:10}'.format("login", "number of commits"))
         print("-" * 46)
         for developer in result_data.dev_activity:
             print('{0:25} | {1:10d}'.format(developer[0], developer[1]))
+    if result_data.unresolved_commits:
+        print(f"Partial statistics: authors of {result_data.unresolved_commits} commits were not resolved "
+              "before the rate limit reserve and are not counted")
     if result_data.pull_requests:
         print(f"2.Number of open pull requests = {result_data.pull_requests.open_pull_requests}")
         print(f"3.Number of closed pull requests = {result_data.pull_requests.closed_pull_requests}")
@@ -48,6 +125,114 @@ def output_data(result_data: ResultData):
         print(f"5.Number of open issues = {result_data.issues.open_issues}")
         print(f"6.Number of closed issues = {result_data.issues.closed_issues}")
         print(f"7.Number of old pull issues = {result_data.issues.old_issues}")
+    if result_data.metrics:
+        output_metrics(result_data.metrics)
+    if result_data.contributors:
+        output_contributors(result_data.contributors)
+
+
+def output_metrics(metrics: Metrics):
+    """
+    Вывод временных рядов и распределений.
+    :param metrics:
+    :return:
+    """
+    if metrics.commits_per_week:
+        print("8. COMMITS PER WEEK")
+        print('{0:25} | {1:12} | {2:10}'.format("login", "week", "commits"))
+        print("-" * 53)
+        for author, row in zip(metrics.commits_per_week.authors, metrics.commits_per_week.counts):
+            for week, commits in zip(metrics.commits_per_week.weeks, row):
+                if commits:
+                    print('{0:25} | {1:12} | {2:10d}'.format(author, str(week), commits))
+    if metrics.pull_requests_time_to_merge:
+        distribution = metrics.pull_requests_time_to_merge
+        print(f"9. PULL REQUESTS TIME TO MERGE, HOURS (merged pull requests = {distribution.size})")
+        for percentile, value in zip(distribution.percentiles, distribution.values):
+            print(f"p{percentile} = {value / 3600:.1f}" if value is not None else f"p{percentile} = -")
+    if metrics.open_issues_age:
+        histogram = metrics.open_issues_age
+        print("10. OPEN ISSUES AGE, DAYS")
+        for i, count in enumerate(histogram.counts):
+            left, right = histogram.bin_edges[i], histogram.bin_edges[i + 1]
+            label = f"[{left}; {right})" if i < len(histogram.counts) - 1 else f">= {left}"
+            print('{0:>14} | {1:10d}'.format(label, count))
+
+
+def output_contributors(contributors: Contributors):
+    """
+    Вывод оценок статистики авторов по накопленному скетчу.
+    :param contributors:
+    :return:
+    """
+    print(f"11. ESTIMATED COMMIT STATISTICS (commits = {contributors.total_commits}, "
+          f"overestimate <= {contributors.max_error})")
+    print('{0:25} | {1:10} | {2:10}'.format("login", "commits", "max error"))
+    print("-" * 51)
+    for login, commits, error in contributors.top:
+        print('{0:25} | {1:10d} | {2:10d}'.format(login, commits, error))
+    print(f"12.Estimated number of distinct contributors = {contributors.distinct} "
+          f"(±{contributors.distinct_relative_error:.2%})")
+
+
+def output_estimates(result_data: ResultData):
+    """
+    Вывод результатов режима оценки с доверительными интервалами.
+    :param result_data:
+    :return:
+    """
+    sampling = result_data.sampling
+    print(f"ESTIMATES: {sampling.pages_sampled} of {sampling.pages_total} pages sampled "
+          f"(sampling fraction {sampling.sampling_fraction:.1%}), "
+          f"intervals at z = {sampling.confidence_z}")
+    if result_data.dev_activity:
+        print("1. COMMIT STATISTICS")
+        print('{0:25} | {1:20}'.format("login", "number of commits"))
+        print("-" * 48)
+        for login, estimate in result_data.dev_activity:
+            print('{0:25} | {1:20}'.format(login, format_estimate(estimate)))
+    if result_data.pull_requests:
+        print(f"2.Number of open pull requests = {format_estimate(result_data.pull_requests.open_pull_requests)}")
+        print(f"3.Number of closed pull requests = {format_estimate(result_data.pull_requests.closed_pull_requests)}")
+        print(f"4.Number of old pull requests = {format_estimate(result_data.pull_requests.old_pull_requests)}")
+    if result_data.issues:
+        print(f"5.Number of open issues = {format_estimate(result_data.issues.open_issues)}")
+        print(f"6.Number of closed issues = {format_estimate(result_data.issues.closed_issues)}")
+        print(f"7.Number of old pull issues = {format_estimate(result_data.issues.old_issues)}")
+
+
+def format_estimate(estimate: Estimate) -> str:
+    """
+    Форматирует оценку в виде "значение ± погрешность"
+    :param estimate:
+    :return:
+    """
+    if estimate.margin == 0:
+        return f"{estimate.value:.0f}"
+    if estimate.margin is None or math.isinf(estimate.margin):
+        return f"{estimate.value:.0f} ± ?"
+    return f"{estimate.value:.0f} ± {estimate.margin:.0f}"
+
+
+def output_plan(plan: Plan):
+    """
+    Вывод прогноза стоимости запуска.
+    :param plan:
+    :return:
+    """
+    print("RUN PLAN")
+    print('{0:25} | {1:10} | {2:10}'.format("scan", "items", "pages"))
+    print("-" * 51)
+    for scan in plan.scans:
+        print('{0:25} | {1:10d} | {2:10d}'.format(scan.name, scan.items, scan.pages))
+    print(f"Predicted requests = {plan.requests} (plus {plan.probes} probe requests already made)")
+    print(f"Estimated wall time = {plan.wall_time:.1f} s")
+    if plan.rate_limit_remaining is not None:
+        print(f"Rate limit remaining = {plan.rate_limit_remaining}, resets at {plan.rate_limit_reset}")
+    print("The run fits in the remaining rate limit." if plan.fits
+          else "The run does NOT fit in the remaining rate limit.")
+    for recommendation in plan.recommendations:
+        print(f"- {recommendation}")
 
 
 @click.command()
@@ -81,9 +266,103 @@ def output_data(result_data: ResultData):
     '--all_active', '-all', is_flag=True,
     help='analysis all activities (developer activity, pull requests, issues) on a given branch of the repository'
 )
-def main(url, api_key, begin_date, end_date, branch, dev_activity, pull_requests, issues, all_active):
+@click.option(
+    '--metrics', '-m', is_flag=True,
+    help='compute commits per week, pull requests time to merge and open issues age from the fetched data'
+)
+@click.option(
+    '--sketch', '-s', type=str, default="",
+    help='path to a contributor sketch file accumulated across runs (bounded-memory top committers and distinct count)'
+)
+@click.option(
+    '--estimate', '-est', is_flag=True,
+    help='estimate statistics with confidence intervals from a random sample of pages'
+)
+@click.option(
+    '--budget', '-bg', type=int, default=None,
+    help='maximum number of requests per listing in estimation mode'
+)
+@click.option(
+    '--target_error', '-te', type=float, default=None,
+    help='target relative error in estimation mode, e.g. 0.05'
+)
+@click.option(
+    '--identities', '-id', is_flag=True,
+    help='attribute commits without a linked account by author email and merge aliases of the same developer'
+)
+@click.option(
+    '--aliases', type=click.Path(exists=True, dir_okay=False), default=None,
+    help='json file mapping alias logins or emails to the main login (implies --identities)'
+)
+@click.option(
+    '--workers', '-w', type=int, default=None,
+    help='decode and aggregate pages in this many worker processes (0 - one per CPU core)'
+)
+@click.option(
+    '--incremental', '-inc', is_flag=True,
+    help='count commits incrementally from the branch head saved by the previous run'
+)
+@click.option(
+    '--plan', is_flag=True,
+    help='predict requests, wall time and rate-limit consumption of the run without downloading data'
+)
+@click.option(
+    '--webhook_port', type=int, default=None,
+    help='after a one-time backfill, keep statistics up to date from webhooks received on this local port'
+)
+@click.option(
+    '--webhook_secret', type=str, default=None, envvar='GITHUB_WEBHOOK_SECRET',
+    help='secret used to verify webhook signatures (required unless --webhook_insecure is given)'
+)
+@click.option(
+    '--webhook_host', type=str, default="127.0.0.1",
+    help='address the webhook server binds to'
+)
+@click.option(
+    '--webhook_insecure', is_flag=True,
+    help='accept unsigned webhooks when no secret is given'
+)
+@click.option(
+    '--trace', '-t', type=str, default="",
+    help='write one json record per request to this jsonl file and print a per-scan time summary'
+)
+@click.option(
+    '--profile', '-p', type=str, default="",
+    help='write cProfile stats and tracemalloc snapshots per analysis phase to this directory'
+)
+@click.option(
+    '--api_url', type=str, default=None,
+    help='API base URL of the repository site, e.g. a local caching proxy (default for GitHub: '
+         'REPOSITORY_STATISTICS_API_URL or https://api.github.com, for Bitbucket Cloud: '
+         'REPOSITORY_STATISTICS_BITBUCKET_API_URL or https://api.bitbucket.org/2.0)'
+)
+@click.option(
+    '--format', '-f', 'output_format', type=click.Choice(FORMATS), default="text",
+    help='output format: json, ndjson and csv are written progressively as each scan completes'
+)
+@click.option(
+    '--items', is_flag=True,
+    help='with a machine-readable --format, also stream one record per fetched commit, pull request and issue'
+)
+@click.option(
+    '--offline', is_flag=True,
+    help='serve the last cached results for these parameters without any network access'
+)
+@click.option(
+    '--max_age', type=float, default=None,
+    help='serve cached results younger than this many seconds instead of querying the API'
+)
+@click.option(
+    '--cache', 'use_cache', is_flag=True,
+    help='save the results of the run to the local cache (~/.cache/repository-statistics)'
+)
+def main(url, api_key, begin_date, end_date, branch, dev_activity, pull_requests, issues, all_active, metrics, sketch,
+         estimate, budget, target_error, identities, aliases, workers, incremental, plan, webhook_port,
+         webhook_secret, webhook_host, webhook_insecure, trace, profile, api_url, output_format, items, offline,
+         max_age, use_cache):
     """
     Script for analyzing repository statistics according to the specified parameters.
+    Repositories on github.com and bitbucket.org (Bitbucket Cloud) are supported.
     If the start and end dates of the analysis are not specified,
     then an unlimited interval is taken to the left, right or completely.
     If the repository branch is not specified, the master branch is taken by default.
@@ -96,34 +375,116 @@ def main(url, api_key, begin_date, end_date, branch, dev_activity, pull_requests
         3. Issues statistics (--issues).
 
     Or you can select all activities by setting the flag --all_active.
+    The flag --metrics adds time series and distributions computed without extra requests.
+    The option --sketch merges commits into a mergeable sketch file and reports estimates with their error bounds;
+    each repository and branch adds only the commits that reached the branch since its previous run
+    (compared by the branch head), without a full commit table.
+    The flag --estimate samples random pages (limited by --budget or --target_error) instead of fetching everything.
+    The flag --identities counts commits without a linked account by author email (resolved to logins
+    and cached between runs), --aliases merges logins and emails of the same developer; commits whose emails
+    could not be checked within the rate limit are left out and reported as partial statistics.
+    The option --workers decodes and aggregates pages in a pool of processes to use several CPU cores.
+    The flag --incremental counts only commits added since the branch head saved by the previous run.
+    The flag --plan only predicts the cost of the run.
+    The option --webhook_port starts a long-running server on --webhook_host: POST receives push, pull_request
+    and issues webhooks signed with --webhook_secret, GET returns the current statistics as json.
+    The option --format json|ndjson|csv writes each result as soon as its scan completes,
+    --items adds a record per fetched object.
+    The option --api_url sends requests through another API address, e.g. a shared
+    caching proxy started with python -m repository_statistics.proxy.
+    The flag --cache saves the results of the run to ~/.cache/repository-statistics (or the directory
+    from REPOSITORY_STATISTICS_CACHE): --offline serves them without network access,
+    --max_age serves them while they are fresh enough and refreshes them otherwise.
     """
-    if all_active:
-        dev_activity = pull_requests = issues = True
-    params = result_data = None
+    if items and output_format == "text":
+        raise click.UsageError("--items requires --format json, ndjson or csv")
+    options = get_options(**click.get_current_context().params)
+    identities = options["identities"]
+    if sketch and (metrics or identities):
+        raise click.UsageError("--sketch cannot be combined with --metrics, --identities or --aliases")
+    if estimate and (metrics or sketch or identities or items):
+        raise click.UsageError(
+            "--estimate cannot be combined with --metrics, --sketch, --identities, --aliases or --items")
+    if workers is not None and (metrics or sketch or identities or estimate or items):
+        raise click.UsageError(
+            "--workers cannot be combined with --metrics, --sketch, --identities, --estimate or --items")
+    if incremental and (metrics or sketch or estimate or workers is not None or items):
+        raise click.UsageError(
+            "--incremental cannot be combined with --metrics, --sketch, --estimate, --workers or --items")
+    if webhook_port is not None and not webhook_secret and not webhook_insecure:
+        raise click.UsageError("--webhook_port requires --webhook_secret (or GITHUB_WEBHOOK_SECRET) "
+                               "unless --webhook_insecure is given")
+    if (offline or max_age is not None) and (plan or webhook_port is not None or sketch):
+        raise click.UsageError("--offline and --max_age cannot be combined with --plan, --webhook_port or --sketch")
+    # План и сервер webhook из кэша не отвечают (сочетание с --offline и --max_age отклонено выше),
+    # поэтому кэш проверяется до проверки параметров, которой нужна сеть
+    cache_key = get_cache_key(**options)
+    if offline or max_age is not None:
+        result_data = load_result_data(cache_key, None if offline else max_age)
+        if result_data:
+            return output_data(result_data) if output_format == "text" else write_result_data(
+                get_writer(output_format), result_data)
+        if offline:
+            return echo_message("В кэше нет результатов для указанных параметров, запустите скрипт без --offline.",
+                                output_format)
+
+    if api_url:
+        from repository_statistics.sites import get_driver
+        get_driver(url).set_base_url(api_url)
+    result_data = tracer = profiler = None
     try:
-        params = get_params(
-                url=url,
-                api_key=api_key,
-                begin_date=begin_date,
-                end_date=end_date,
-                branch=branch,
-                dev_activity=dev_activity,
-                pull_requests=pull_requests,
-                issues=issues
-            )
+        params = get_params(**options)
     except ValidationError as err:
-        print("Проверьте правильность указания параметров скрипта:\n", "\n".join(err.message))
+        echo_message("Проверьте правильность указания параметров скрипта:\n " + "\n".join(err.message), output_format)
+        sys.exit(1)
     except (TimeoutConnectionError, ConnectError) as err:
-        print("Проверьте подключение к сети:\n", err)
+        echo_message(f"Проверьте подключение к сети:\n {err.message}", output_format)
+        sys.exit(1)
 
     try:
-        result_data = get_result_data(params)
+        if params.plan:
+            from repository_statistics.planner import get_plan
+            return output_plan(get_plan(params))
+        if webhook_port:
+            from repository_statistics.sites import get_driver
+            if "webhook" not in get_driver(url).modes:
+                return echo_message(f"Режим webhook не поддерживается для репозиториев {get_driver(url).name}.",
+                                    output_format)
+            from repository_statistics.webhook import serve
+            return serve(params, webhook_host, webhook_port, webhook_secret, webhook_insecure)
+        from repository_statistics.calculations import get_result_data, iter_result_data
+        from repository_statistics.profiling import profiling
+        from repository_statistics.tracing import tracing
+        with ExitStack() as stack:
+            tracer = stack.enter_context(tracing(trace)) if trace else None
+            profiler = stack.enter_context(profiling(profile)) if profile else None
+            if output_format == "text":
+                result_data = get_result_data(params)
+            else:
+                writer = get_writer(output_format)
+                result_data = write_sections(writer, iter_result_data(params, writer.item if items else None))
     except (TimeoutConnectionError, ConnectError) as err:
-        print("Проверьте подключение к сети:\n", err)
+        echo_message(f"Проверьте подключение к сети:\n {err.message}", output_format)
     except HTTPError as err:
-        print(err.message)
+        echo_message(err.message, output_format)
 
-    output_data(result_data) if result_data else print("Что-то пошло не так, результирующий набор данных не вычислен.")
+    # Неполный результат (авторы части коммитов не разрешены) не сохраняется
+    if result_data and (use_cache or max_age is not None) and not result_data.unresolved_commits:
+        save_result_data(cache_key, result_data)
+    if not result_data:
+        echo_message("Что-то пошло не так, результирующий набор данных не вычислен.", output_format)
+    elif output_format == "text":
+        output_data(result_data)
+    # В машиночитаемых форматах сводки выводятся в stderr, чтобы не смешиваться с данными
+    summary_file = sys.stdout if output_format == "text" else sys.stderr
+    if tracer:
+        print(f"REQUEST TRACE ({trace})", file=summary_file)
+        print(tracer.format_summary(), file=summary_file)
+    if profiler:
+        print(f"PROFILE ({profile})", file=summary_file)
+        print(profiler.summary, file=summary_file)
+    if not result_data:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+"""
+repository_statistic.cache
+~~~~~~~~~~~~~~~~~~~
+
+Модуль содержит локальный кэш результатов запусков. Модуль не импортирует requests и numpy,
+поэтому ответ из кэша выдается без загрузки сетевых модулей
+"""
+import hashlib
+import json
+import os
+import time
+
+from typing import Optional
+
+from repository_statistics.structure import (ResultData, PullRequests, Issues, Metrics, CommitsPerWeek, Distribution,
+                                             Histogram, Contributors, Estimate, Sampling)
+from repository_statistics.utils import load_json, save_json, to_serializable
+
+CACHE_DIR_ENV = "REPOSITORY_STATISTICS_CACHE"
+# Все параметры, от которых зависит результат (api_key в ключ не входит)
+KEY_FIELDS = ("url", "branch", "begin_date", "end_date", "dev_activity", "pull_requests", "issues", "metrics",
+              "sketch", "estimate", "sample_budget", "target_error", "plan", "identities", "aliases", "workers",
+              "incremental")
+
+
+def get_cache_dir() -> str:
+    """
+    Каталог кэша: переменная окружения REPOSITORY_STATISTICS_CACHE или ~/.cache/repository-statistics
+    :return:
+    """
+    return os.environ.get(CACHE_DIR_ENV) or os.path.join(os.path.expanduser("~"), ".cache", "repository-statistics")
+
+
+def get_cache_key(**params) -> str:
+    """
+    Ключ кэша по параметрам отчета (api_key в ключ не входит)
+    :param params:
+    :return:
+    """
+    data = json.dumps({field: params.get(field) for field in KEY_FIELDS}, sort_keys=True)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _get_path(key: str) -> str:
+    return os.path.join(get_cache_dir(), "results", f"{key}.json")
+
+
+def save_result_data(key: str, result_data: ResultData):
+    """
+    Сохраняет результирующий набор данных в кэш
+    :param key:
+    :param result_data:
+    :return:
+    """
+    save_json(_get_path(key), {"created": time.time(), "result_data": to_serializable(result_data)})
+
+
+def load_result_data(key: str, max_age: Optional[float] = None) -> Optional[ResultData]:
+    """
+    Загружает результирующий набор данных из кэша.
+    Возвращает None, если записи нет или она старше max_age секунд
+    :param key:
+    :param max_age: None - возраст записи не проверяется
+    :return:
+    """
+    data = load_json(_get_path(key))
+    if not data or (max_age is not None and time.time() - data["created"] > max_age):
+        return None
+    return result_data_from_dict(data["result_data"])
+
+
+def result_data_from_dict(data: dict) -> ResultData:
+    """
+    Восстанавливает результирующий набор данных из json. Массивы восстанавливаются списками
+    :param data:
+    :return:
+    """
+    sampling = data.get("sampling")
+
+    def _value(value):
+        return Estimate(**value) if sampling and value is not None else value
+
+    def _optional(structure, value, convert=lambda item: item):
+        return structure(**{key: convert(item) for key, item in value.items()}) if value else None
+
+    metrics = data.get("metrics")
+    return ResultData(
+        [(login, _value(commits)) for login, commits in data["dev_activity"]] if data.get("dev_activity") else None,
+        _optional(PullRequests, data.get("pull_requests"), _value),
+        _optional(Issues, data.get("issues"), _value),
+        Metrics(
+            _optional(CommitsPerWeek, metrics.get("commits_per_week")),
+            _optional(Distribution, metrics.get("pull_requests_time_to_merge")),
+            _optional(Histogram, metrics.get("open_issues_age"))
+        ) if metrics else None,
+        _optional(Contributors, data.get("contributors")),
+        _optional(Sampling, sampling),
+        data.get("unresolved_commits")
+    )
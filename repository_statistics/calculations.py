@@ -1,55 +1,299 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-from typing import Optional
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from contextvars import copy_context
+from functools import partial
+from typing import Callable, Optional
 
-from repository_statistics.sites.github import count_commits_by_author, count_issues, count_pulls
-from repository_statistics.structure import Params, PullRequests, Issues, ResultData
+from repository_statistics.exceptions import ValidationError
+from repository_statistics.identity import get_resolver
+from repository_statistics.metrics import get_commits_per_week, get_time_to_merge, get_issues_age
+from repository_statistics.sites import get_driver
+from repository_statistics.sites.base import (count_commits_by_author, count_issues, count_pulls, is_commit_in_period,
+                                              NUM_RECORDS)
+from repository_statistics.sampling import get_estimated_result_data
+from repository_statistics.sketches import ContributorSketch, load_sketch, save_sketch
+from repository_statistics.profiling import is_profiling, phase
+from repository_statistics.tracing import scan
+from repository_statistics.structure import Params, PullRequests, Issues, Metrics, Tables, ResultData
+from repository_statistics.utils import get_date_from_str_without_time
+from repository_statistics.validation import get_mode_errors
 
+EMPTY_TABLES = Tables(None, None, None, None, None)
 
-def get_dev_activity(params: Params) -> Optional[list]:
+
+@contextmanager
+def stage(name: str, enabled: bool = True):
+    """
+    Этап расчета: запросы внутри помечаются для трассировки, вычисления профилируются.
+    Невыбранный этап (enabled=False) не помечается и не профилируется
+    :param name:
+    :param enabled:
+    :return:
+    """
+    if not enabled:
+        yield
+        return
+    with scan(name), phase(name):
+        yield
+
+
+def get_dev_activity(params: Params, tables: Tables) -> Optional[list]:
     """
     Получить количество коммитов (опционально)
     :param params:
+    :param tables:
     :return:
     """
-    return count_commits_by_author(params) if params.dev_activity else None
+    return count_commits_by_author(tables.commits) if params.dev_activity else None
 
 
-def get_pull_requests(params: Params) -> Optional[PullRequests]:
+def get_pull_requests(params: Params, tables: Tables) -> Optional[PullRequests]:
     """
     Получить статистику pull request (опционально)
     :param params:
+    :param tables:
     :return:
     """
     return PullRequests(
-        count_pulls(params, is_open=True),
-        count_pulls(params, is_open=False),
-        count_pulls(params, is_open=True, is_old=True)
+        count_pulls(params, tables.open_pulls),
+        count_pulls(params, tables.closed_pulls),
+        count_pulls(params, tables.open_pulls, is_old=True)
     ) if params.pull_requests else None
 
 
-def get_issues(params: Params) -> Optional[Issues]:
+def get_issues(params: Params, tables: Tables) -> Optional[Issues]:
     """
-    Получить статистику pull request (опционально)
+    Получить статистику issues (опционально)
     :param params:
+    :param tables:
     :return:
     """
     return Issues(
-        count_issues(params, is_open=True),
-        count_issues(params, is_open=False),
-        count_issues(params, is_open=True, is_old=True)
+        count_issues(params, tables.open_issues),
+        count_issues(params, tables.closed_issues),
+        count_issues(params, tables.open_issues, is_old=True)
     ) if params.issues else None
 
 
+def get_metrics(params: Params, tables: Tables) -> Optional[Metrics]:
+    """
+    Получить временные ряды и распределения по уже загруженным таблицам (опционально).
+    Время до слияния вычисляется, только если api сайта сообщает даты слияния
+    :param params:
+    :param tables:
+    :return:
+    """
+    begin_date = get_date_from_str_without_time(params.begin_date)
+    end_date = get_date_from_str_without_time(params.end_date)
+    return Metrics(
+        get_commits_per_week(tables.commits) if params.dev_activity else None,
+        get_time_to_merge(tables.closed_pulls, begin_date, end_date)
+        if params.pull_requests and get_driver(params.url).has_merge_dates else None,
+        get_issues_age(tables.open_issues, begin_date, end_date) if params.issues else None
+    ) if params.metrics else None
+
+
+def count_commits_with_sketch(params: Params, driver, on_item: Optional[Callable] = None) -> tuple:
+    """
+    Пропускает коммиты через скетчи без таблицы коммитов, поэтому память ограничена емкостью скетчей.
+    Количество коммитов по авторам за период отчета оценивается сводкой этого запуска
+    (точно, пока авторов не больше ее емкости).
+    Скетч из файла params.sketch, накапливаемый между запусками по разным репозиториям, учитывает всю историю ветки
+    независимо от периода. Для репозитория и ветки в нем хранится head последнего учтенного запуска,
+    и следующий запуск добавляет через compare только коммиты last_sha...head, включая коммиты со старыми датами
+    (слияния веток, cherry-pick). При перезаписи истории добавляются коммиты ветки новее последнего учтенного
+    коммита по дате коммиттера
+    :param params:
+    :param driver:
+    :param on_item: вызывается для каждого коммита периода отчета: on_item("commits", запись)
+    :return: (количество коммитов по авторам, оценки по объединенному скетчу)
+    """
+    from repository_statistics.incremental import fetch_new_commits, get_branch_head
+    from repository_statistics.sites.github import get_commit_date
+
+    saved, current = load_sketch(params.sketch), ContributorSketch()
+    key = f"{params.url}#{params.branch}"
+    head = get_branch_head(params)
+    last_head, counted_until = saved.heads.get(key) or (None, "")
+    newest = counted_until
+    whole_history = params._replace(branch=head, begin_date=None, end_date=None)
+    new_commits = None
+    if last_head == head:
+        new_commits = iter(())
+    elif last_head is not None:
+        new_commits = fetch_new_commits(whole_history, last_head, head)
+
+    def add_new(commit: dict):
+        nonlocal newest
+        login = driver.project_commit(commit)["login"]
+        if login is not None:
+            saved.add(login)
+        newest = max(newest, get_commit_date(commit) or "")
+
+    if new_commits is not None:
+        for commit in new_commits:
+            add_new(commit)
+    # Без compare (первый запуск или перезапись истории) новые коммиты отбираются по списку всей истории ветки
+    scan = params._replace(branch=head) if new_commits is not None else whole_history
+    for commit in driver.fetch("commits", scan):
+        commit_date = get_commit_date(commit)
+        if new_commits is None and (last_head is None or (commit_date or "") > counted_until):
+            add_new(commit)
+        if not is_commit_in_period(params, commit_date):
+            continue
+        record = driver.project_commit(commit)
+        if on_item is not None:
+            on_item("commits", record)
+        if record["login"] is not None:
+            current.add(record["login"])
+    saved.heads[key] = [head, newest]
+    save_sketch(params.sketch, saved)
+    dev_activity = [(login, count) for login, count, _ in current.top.top(NUM_RECORDS)]
+    return dev_activity, saved.get_contributors(NUM_RECORDS)
+
+
+def scan_commits(params: Params, driver, on_item: Optional[Callable] = None, resolver=None) -> tuple:
+    """
+    Этап dev_activity: загружает коммиты и считает активность разработчиков
+    :param params:
+    :param driver: драйвер сайта репозитория
+    :param on_item:
+    :param resolver: сопоставление e-mail авторов с логинами (None, если этап не выбран)
+    :return: (загруженные списки по полям Tables, пары (поле ResultData, значение))
+    """
+    tables, contributors = {}, None
+    with stage("dev_activity", params.dev_activity):
+        if params.dev_activity and params.incremental:
+            from repository_statistics.incremental import count_commits_incrementally
+            dev_activity = count_commits_incrementally(params, on_item, resolver)
+        elif params.dev_activity and params.sketch:
+            dev_activity, contributors = count_commits_with_sketch(params, driver, on_item)
+        else:
+            if params.dev_activity:
+                tables["commits"] = driver.load_commits(params, on_item, resolver)
+            dev_activity = get_dev_activity(params, EMPTY_TABLES._replace(**tables))
+    return tables, [
+        ("dev_activity", dev_activity),
+        ("unresolved_commits", resolver.unresolved_commits if resolver else None),
+        ("contributors", contributors),
+    ]
+
+
+def scan_pulls(params: Params, driver, on_item: Optional[Callable] = None) -> tuple:
+    """
+    Этап pull_requests: загружает открытые и закрытые pull requests
+    :param params:
+    :param driver:
+    :param on_item:
+    :return: (загруженные списки по полям Tables, пары (поле ResultData, значение))
+    """
+    tables = {}
+    with stage("pull_requests", params.pull_requests):
+        if params.pull_requests:
+            tables["open_pulls"] = driver.load_pulls(params, is_open=True, on_item=on_item)
+            tables["closed_pulls"] = driver.load_pulls(params, is_open=False, on_item=on_item)
+        pull_requests = get_pull_requests(params, EMPTY_TABLES._replace(**tables))
+    return tables, [("pull_requests", pull_requests)]
+
+
+def scan_issues(params: Params, driver, on_item: Optional[Callable] = None) -> tuple:
+    """
+    Этап issues: загружает открытые и закрытые issues
+    :param params:
+    :param driver:
+    :param on_item:
+    :return: (загруженные списки по полям Tables, пары (поле ResultData, значение))
+    """
+    tables = {}
+    with stage("issues", params.issues):
+        if params.issues:
+            tables["open_issues"] = driver.load_issues(params, is_open=True, on_item=on_item)
+            tables["closed_issues"] = driver.load_issues(params, is_open=False, on_item=on_item)
+        issues = get_issues(params, EMPTY_TABLES._replace(**tables))
+    return tables, [("issues", issues)]
+
+
+def iter_scans(scans: tuple, concurrent: bool = True) -> Iterator:
+    """
+    Выполняет этапы и выдает их результаты по мере завершения.
+    Этапы запускаются одновременно в потоках, каждый в копии текущего контекста (трассировка, транспорт):
+    первым выдается результат этапа, который завершился раньше.
+    Последовательно этапы выполняются, если записи об объектах одного списка должны идти подряд
+    или если включено профилирование (пики памяти tracemalloc общие для всех потоков)
+    :param scans: функции без аргументов, возвращающие (списки по полям Tables, пары (поле, значение))
+    :param concurrent:
+    :return:
+    """
+    if not concurrent:
+        for run_scan in scans:
+            yield run_scan()
+        return
+    executor = ThreadPoolExecutor(max_workers=len(scans))
+    try:
+        futures = [executor.submit(copy_context().run, run_scan) for run_scan in scans]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_result_data(params: Params, on_item: Optional[Callable] = None) -> Iterator:
+    """
+    Получает результирующий набор данных по частям: пара (поле ResultData, значение) выдается
+    сразу после завершения этапа, на котором значение вычисляется. Выбранные этапы загружаются одновременно
+    (см. iter_scans), поэтому порядок полей зависит от того, какой этап завершился раньше; metrics - последнее поле.
+    Каждый список загружается один раз драйвером сайта репозитория и переиспользуется всеми расчетами.
+    Оценка, пул процессов и инкрементальный подсчет доступны только на сайтах, драйвер которых их поддерживает
+    :param params:
+    :param on_item: вызывается для каждого загруженного объекта: on_item(список, запись)
+    :return:
+    """
+    driver = get_driver(params.url)
+    mode_errors = get_mode_errors(**params._asdict())
+    if mode_errors:
+        raise ValidationError(mode_errors)
+    if params.incremental and on_item is not None:
+        raise ValidationError(["В режиме incremental загружаются только новые коммиты, записи объектов неполны."])
+    if params.sketch and (params.metrics or params.identities):
+        raise ValidationError(["Режим sketch не строит таблицу коммитов и не сочетается с metrics и identities."])
+    if params.estimate and (params.metrics or params.sketch or params.identities or params.aliases
+                            or on_item is not None):
+        raise ValidationError(["Режим estimate оценивает значения по выборке страниц и не сочетается с metrics, "
+                               "sketch, identities и записями объектов."])
+    if params.estimate:
+        with stage("estimate"):
+            result_data = get_estimated_result_data(params)
+        yield from result_data._asdict().items()
+        return
+    if params.workers is not None:
+        if on_item is not None:
+            raise ValidationError(["В режиме workers записи объектов не передаются: страницы разбираются в пуле."])
+        from repository_statistics.parallel import iter_parallel_result_data
+        yield from iter_parallel_result_data(params)
+        return
+    resolver = get_resolver(params) if params.dev_activity else None
+    scans = (
+        partial(scan_commits, params, driver, on_item, resolver),
+        partial(scan_pulls, params, driver, on_item),
+        partial(scan_issues, params, driver, on_item),
+    )
+    tables = {}
+    for scanned, sections in iter_scans(scans, concurrent=on_item is None and not is_profiling()):
+        tables.update(scanned)
+        yield from sections
+    yield "metrics", get_metrics(params, EMPTY_TABLES._replace(**tables))
+
+
 def get_result_data(params: Params) -> ResultData:
     """
     Получает результирующий набор данных.
     Запуск функций поиска осуществляется опционально.
+    В режиме оценки значения экстраполируются по случайной выборке страниц,
+    при заданном params.workers страницы разбираются в пуле процессов.
     :param params:
     :return:
     """
-    return ResultData(
-        get_dev_activity(params),
-        get_pull_requests(params),
-        get_issues(params)
-    )
+    return ResultData(**dict(iter_result_data(params)))
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+"""
+repository_statistic.client
+~~~~~~~~~~~~~~~~~~~
+
+Модуль содержит клиент для использования проекта как библиотеки. Клиент создается один раз
+и хранит сессию (соединения), api_key, кэш страниц и состояние лимита запросов,
+а параметры отчета (репозиторий, ветка, период) передаются в каждый вызов:
+
+    with Client(api_key) as client:
+        client.dev_activity("https://github.com/owner/repo", begin_date="01.01.2020")
+        client.issues("https://bitbucket.org/workspace/repo", branch="main")
+"""
+import threading
+
+from typing import Optional, Union
+
+import requests
+
+from repository_statistics import httpclient
+from repository_statistics.calculations import get_result_data
+from repository_statistics.exceptions import ValidationError
+from repository_statistics.sites import get_driver, get_drivers
+from repository_statistics.structure import Params, PullRequests, Issues, ResultData, RateLimit
+from repository_statistics.utils import get_begin_date, get_end_date
+from repository_statistics.validation import get_date_errors, is_api_key, is_branch
+
+
+class Client:
+    """
+    Долгоживущий клиент: сессия, кэш страниц, результаты проверки api_key и веток
+    и состояние лимита запросов переиспользуются между вызовами.
+    При нескольких api_key запрос выполняется с ключом, у которого больше остаток лимита
+    """
+
+    def __init__(self, api_keys: Union[str, list], session: Optional[requests.Session] = None,
+                 etag_cache: Optional[httpclient.EtagCache] = None, validate: bool = True):
+        """
+        :param api_keys: api_key или список api_key
+        :param session: None - создается новая сессия
+        :param etag_cache: None - создается новый кэш страниц с ограничением httpclient.ETAG_CACHE_SIZE записей
+        :param validate: проверять api_key и ветки (один раз для каждого значения)
+        """
+        self.api_keys = [api_keys] if isinstance(api_keys, str) else list(api_keys)
+        if not self.api_keys:
+            raise ValidationError(['Не задан api_key.'])
+        self.session = session if session is not None else requests.Session()
+        self.etag_cache = etag_cache if etag_cache is not None else httpclient.EtagCache()
+        self.validate = validate
+        self.rate_limits = {api_key: RateLimit(None, None) for api_key in self.api_keys}
+        # Заголовок Authorization различается у сайтов, поэтому по нему определяются и api_key, и драйвер ответа
+        self._authorizations = {
+            driver.get_headers(api_key)['Authorization']: (api_key, driver)
+            for driver in get_drivers() for api_key in self.api_keys
+        }
+        self._valid_api_keys = set()
+        self._valid_branches = set()
+        self._lock = threading.Lock()
+        self.session.hooks['response'].append(self._on_response)
+
+    def __enter__(self) -> "Client":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def dev_activity(self, url: str, branch: str = "master", begin_date: Optional[str] = None,
+                     end_date: Optional[str] = None) -> list:
+        """
+        Количество коммитов по авторам
+        :param url:
+        :param branch:
+        :param begin_date: дата в формате дд.мм.гггг
+        :param end_date: дата в формате дд.мм.гггг
+        :return:
+        """
+        return self.report(url, branch, begin_date, end_date, pull_requests=False, issues=False).dev_activity
+
+    def pull_requests(self, url: str, branch: str = "master", begin_date: Optional[str] = None,
+                      end_date: Optional[str] = None) -> PullRequests:
+        """
+        Статистика pull requests
+        :param url:
+        :param branch:
+        :param begin_date: дата в формате дд.мм.гггг
+        :param end_date: дата в формате дд.мм.гггг
+        :return:
+        """
+        return self.report(url, branch, begin_date, end_date, dev_activity=False, issues=False).pull_requests
+
+    def issues(self, url: str, branch: str = "master", begin_date: Optional[str] = None,
+               end_date: Optional[str] = None) -> Issues:
+        """
+        Статистика issues
+        :param url:
+        :param branch:
+        :param begin_date: дата в формате дд.мм.гггг
+        :param end_date: дата в формате дд.мм.гггг
+        :return:
+        """
+        return self.report(url, branch, begin_date, end_date, dev_activity=False, pull_requests=False).issues
+
+    def report(self, url: str, branch: str = "master", begin_date: Optional[str] = None,
+               end_date: Optional[str] = None, dev_activity: bool = True, pull_requests: bool = True,
+               issues: bool = True, metrics: bool = False) -> ResultData:
+        """
+        Результирующий набор данных по выбранным видам анализа
+        :param url:
+        :param branch:
+        :param begin_date: дата в формате дд.мм.гггг
+        :param end_date: дата в формате дд.мм.гггг
+        :param dev_activity:
+        :param pull_requests:
+        :param issues:
+        :param metrics:
+        :return:
+        """
+        with httpclient.transport(self.session, self.etag_cache):
+            params = self.get_params(url, branch, begin_date, end_date, dev_activity=dev_activity,
+                                     pull_requests=pull_requests, issues=issues, metrics=metrics)
+            return get_result_data(params)
+
+    def get_params(self, url: str, branch: str, begin_date: Optional[str], end_date: Optional[str],
+                   **analyses) -> Params:
+        """
+        Формирует параметры отчета с api_key, у которого больше остаток лимита.
+        Бросает ValidationError при некорректных датах, api_key или ветке
+        :param url:
+        :param branch:
+        :param begin_date:
+        :param end_date:
+        :param analyses: dev_activity, pull_requests, issues, metrics
+        :return:
+        """
+        errors = get_date_errors(begin_date, end_date)
+        api_key = self.get_api_key()
+        if self.validate and not errors:
+            errors.extend(self._validate(api_key, url, branch))
+        if errors:
+            raise ValidationError(errors)
+        return Params(
+            url=url,
+            api_key=api_key,
+            begin_date=get_begin_date(begin_date) if begin_date else None,
+            end_date=get_end_date(end_date) if end_date else None,
+            branch=branch,
+            **analyses
+        )
+
+    def get_api_key(self) -> str:
+        """
+        api_key с наибольшим известным остатком лимита. Ключ без сведений о лимите считается неизрасходованным
+        :return:
+        """
+        with self._lock:
+            return max(self.api_keys, key=lambda api_key: (
+                self.rate_limits[api_key].remaining is None, self.rate_limits[api_key].remaining or 0))
+
+    def _validate(self, api_key: str, url: str, branch: str) -> list:
+        errors = []
+        # Проверка api_key может зависеть от репозитория (токены доступа репозитория Bitbucket)
+        site_key = (get_driver(url).get_api_key_check_url(url), api_key)
+        if site_key not in self._valid_api_keys:
+            if is_api_key(api_key, url):
+                self._valid_api_keys.add(site_key)
+            else:
+                errors.append('Авторизация не удалась. Вероятно, некорректный api_key.')
+        if (url, branch) not in self._valid_branches:
+            if is_branch(url, branch, api_key):
+                self._valid_branches.add((url, branch))
+            else:
+                errors.append(f'Ветки репозитория {url} с указанным именем {branch} не существует.')
+        return errors
+
+    def _on_response(self, response: requests.Response, *args, **kwargs):
+        api_key, driver = self._authorizations.get(response.request.headers.get('Authorization'), (None, None))
+        rate_limit = driver.get_rate_limit(response.headers) if driver else None
+        if rate_limit is None:
+            return
+        with self._lock:
+            self.rate_limits[api_key] = rate_limit
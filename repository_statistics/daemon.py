@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+
+"""
+repository_statistic.daemon
+~~~~~~~~~~~~~~~~~~~
+
+Модуль содержит резидентный сервис: по расписанию обновляет статистику настроенных репозиториев,
+переиспользуя соединения и кэш страниц, и отдает результаты в формате метрик Prometheus
+"""
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple, Optional
+
+import click
+import requests
+
+from repository_statistics import httpclient
+from repository_statistics.calculations import get_result_data
+from repository_statistics.exceptions import Error
+from repository_statistics.structure import Params, ResultData
+from repository_statistics.utils import get_last_parts_url, load_json
+
+DEFAULT_INTERVAL = 300
+DEFAULT_PORT = 9100
+PREFIX = "repository_statistics"
+
+GAUGES = {
+    "commits": "Number of commits by author",
+    "pull_requests": "Number of pull requests by state (open, closed, old)",
+    "issues": "Number of issues by state (open, closed, old)",
+    "refresh_duration_seconds": "Duration of the last refresh",
+    "refresh_requests": "Number of API requests made by the last refresh",
+    "refresh_success": "1 if the last refresh succeeded, otherwise 0",
+    "last_refresh_timestamp_seconds": "Unix time of the last successful refresh",
+    "rate_limit_remaining": "Remaining API requests in the current rate-limit window",
+}
+
+
+class RefreshResult(NamedTuple):
+    """Результат обновления статистики одного репозитория"""
+    result_data: Optional[ResultData]
+    duration: float
+    requests: int
+    finished: float
+    error: Optional[str]
+
+
+class RequestCounter:
+    """Хук ответов httpclient: количество запросов и последний остаток лимита"""
+
+    def __init__(self):
+        self.requests = 0
+        self.rate_limit_remaining = None
+
+    def __call__(self, response: requests.Response):
+        self.requests += 1
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        if remaining is not None:
+            self.rate_limit_remaining = int(remaining)
+
+
+def get_repository_params(api_key: str, repository: dict) -> Params:
+    """
+    Формирует параметры отчета для репозитория из конфигурации
+    :param api_key:
+    :param repository: {"url": ..., "branch": ...}
+    :return:
+    """
+    return Params(
+        url=repository["url"],
+        api_key=repository.get("api_key", api_key),
+        begin_date=None,
+        end_date=None,
+        branch=repository.get("branch", "master"),
+        dev_activity=repository.get("dev_activity", True),
+        pull_requests=repository.get("pull_requests", True),
+        issues=repository.get("issues", True)
+    )
+
+
+class Daemon:
+    """Периодически обновляет статистику репозиториев и хранит последние результаты"""
+
+    def __init__(self, params: list, interval: int = DEFAULT_INTERVAL):
+        self.params = params
+        self.interval = interval
+        self.results = {}
+        self.counter = RequestCounter()
+        self.stopped = threading.Event()
+
+    def refresh(self, params: Params) -> RefreshResult:
+        """
+        Обновляет статистику одного репозитория
+        :param params:
+        :return:
+        """
+        requests_before = self.counter.requests
+        started = time.perf_counter()
+        result_data, error = None, None
+        try:
+            result_data = get_result_data(params)
+        except Error as err:
+            error = str(err.message)
+        result = RefreshResult(
+            result_data if result_data else self._previous(params),
+            time.perf_counter() - started,
+            self.counter.requests - requests_before,
+            time.time(),
+            error
+        )
+        self.results[(params.url, params.branch)] = result
+        return result
+
+    def refresh_all(self):
+        for params in self.params:
+            self.refresh(params)
+
+    def run(self):
+        """
+        Цикл обновления до вызова stop. Соединения и кэш страниц переиспользуются между обновлениями
+        :return:
+        """
+        httpclient.use_session(requests.Session())
+        httpclient.use_etag_cache(httpclient.EtagCache())
+        httpclient.response_hooks.append(self.counter)
+        try:
+            while not self.stopped.is_set():
+                self.refresh_all()
+                self.stopped.wait(self.interval)
+        finally:
+            httpclient.response_hooks.remove(self.counter)
+            httpclient.use_etag_cache(None)
+            httpclient.use_session(None)
+
+    def stop(self):
+        self.stopped.set()
+
+    def _previous(self, params: Params) -> Optional[ResultData]:
+        previous = self.results.get((params.url, params.branch))
+        return previous.result_data if previous else None
+
+    def render_metrics(self) -> str:
+        """
+        Текущие результаты в текстовом формате Prometheus
+        :return:
+        """
+        samples = {name: [] for name in GAUGES}
+        for (url, branch), result in list(self.results.items()):
+            labels = {"repository": get_last_parts_url(url, 2), "branch": branch}
+            data = result.result_data
+            if data and data.dev_activity:
+                for author, commits in data.dev_activity:
+                    samples["commits"].append(({**labels, "author": author}, commits))
+            if data and data.pull_requests:
+                for state, value in zip(("open", "closed", "old"), data.pull_requests):
+                    samples["pull_requests"].append(({**labels, "state": state}, value))
+            if data and data.issues:
+                for state, value in zip(("open", "closed", "old"), data.issues):
+                    samples["issues"].append(({**labels, "state": state}, value))
+            samples["refresh_duration_seconds"].append((labels, result.duration))
+            samples["refresh_requests"].append((labels, result.requests))
+            samples["refresh_success"].append((labels, 0 if result.error else 1))
+            if not result.error:
+                samples["last_refresh_timestamp_seconds"].append((labels, result.finished))
+        if self.counter.rate_limit_remaining is not None:
+            samples["rate_limit_remaining"].append(({}, self.counter.rate_limit_remaining))
+
+        lines = []
+        for name, help_text in GAUGES.items():
+            lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}_{name} gauge")
+            lines.extend(f"{PREFIX}_{name}{format_labels(labels)} {value}" for labels, value in samples[name])
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels: dict) -> str:
+    """
+    Форматирует метки метрики с экранированием значений
+    :param labels:
+    :return:
+    """
+    if not labels:
+        return ""
+    escaped = (
+        f'{key}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for key, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """GET /metrics - метрики в текстовом формате Prometheus"""
+    daemon: Daemon = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.daemon.render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(daemon: Daemon, host: str, port: int) -> ThreadingHTTPServer:
+    """
+    Создает http сервер метрик для переданного сервиса
+    :param daemon:
+    :param host:
+    :param port:
+    :return:
+    """
+    handler = type("BoundMetricsHandler", (MetricsHandler,), {"daemon": daemon})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+@click.command()
+@click.argument('config', type=click.Path(exists=True))
+def main(config):
+    """
+    Resident service that refreshes repository statistics on a schedule and exposes them
+    as Prometheus gauges on /metrics.
+
+    CONFIG is a json file: {"api_key": "...", "interval": 300, "host": "127.0.0.1", "port": 9100,
+    "repositories": [{"url": "https://github.com/owner/repo", "branch": "master"}, ...]}
+    """
+    settings = load_json(config)
+    daemon = Daemon(
+        [get_repository_params(settings.get("api_key"), repository) for repository in settings["repositories"]],
+        settings.get("interval", DEFAULT_INTERVAL)
+    )
+    server = make_server(daemon, settings.get("host", "127.0.0.1"), settings.get("port", DEFAULT_PORT))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        daemon.stop()
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -35,7 +35,9 @@ class HTTPError(Error):
     """
     Исключение, возникающее при HTTP ошибках
     """
-    pass
+    def __init__(self, message, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
 
 
 class ValidationError(Error):
@@ -43,3 +45,12 @@ class ValidationError(Error):
     Исключение, возникающее при ошибках валидации
     """
     pass
+
+
+class RateLimitError(Error):
+    """
+    Исключение, возникающее при исчерпании бюджета запросов к api
+    """
+    def __init__(self, message, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
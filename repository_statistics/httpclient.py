@@ -1,14 +1,103 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import threading
+import time
 import requests
 
-from typing import Optional, Generator
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
 from datetime import datetime
 from json.decoder import JSONDecodeError
+from urllib.parse import urlparse, parse_qs
 
-from repository_statistics.structure import ResponseData, HeadersData
+from repository_statistics.structure import ResponseData, RawResponseData, HeadersData
 from repository_statistics.exceptions import TimeoutConnectionError, ConnectError, HTTPError
 
+# Ответы 429 (и 403 вторичного лимита github) с Retry-After повторяются после паузы не больше MAX_RETRIES раз,
+# если пауза не длиннее MAX_RETRY_AFTER секунд
+MAX_RETRIES = 3
+MAX_RETRY_AFTER = 60.0
+ETAG_CACHE_SIZE = 10000
+
+_transport = requests
+_etag_cache = None
+_scoped = ContextVar("scoped_transport", default=None)
+response_hooks = []
+trace_hooks = []
+
+
+class EtagCache:
+    """
+    Кэш страниц для условных запросов: не больше max_entries страниц, при переполнении
+    вытесняется страница, которая дольше всех не использовалась (LRU). Потокобезопасен
+    """
+
+    def __init__(self, max_entries: int = ETAG_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._entries.get(key, default)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def use_session(session: Optional[requests.Session]):
+    """
+    Направляет запросы через сессию requests (переиспользование соединений).
+    None - запросы выполняются функциями модуля requests
+    :param session:
+    :return:
+    """
+    global _transport
+    _transport = session if session is not None else requests
+
+
+def use_etag_cache(cache: Optional[EtagCache]):
+    """
+    Включает условные запросы (If-None-Match) с хранением страниц в переданном кэше (EtagCache или словарь).
+    Ответы 304 github не учитывает в лимите запросов. None - кэш отключен
+    :param cache:
+    :return:
+    """
+    global _etag_cache
+    _etag_cache = cache
+
+
+@contextmanager
+def transport(session: requests.Session, etag_cache: Optional[EtagCache] = None):
+    """
+    Направляет запросы внутри блока через сессию и кэш страниц без изменения настроек модуля.
+    Действует только в текущем потоке (контексте), поэтому клиенты с разными сессиями не мешают друг другу
+    :param session:
+    :param etag_cache:
+    :return:
+    """
+    token = _scoped.set((session, etag_cache))
+    try:
+        yield
+    finally:
+        _scoped.reset(token)
+
+
+def _get_transport() -> tuple:
+    return _scoped.get() or (_transport, _etag_cache)
+
 
 def get_next_pages(links: dict) -> str:
     """
@@ -19,11 +108,37 @@ def get_next_pages(links: dict) -> str:
     return links.get("next").get("url") if links.get("next") else ""
 
 
+def get_last_page(links: dict) -> int:
+    """
+    Возвращает номер последней страницы по ссылке rel="last" (1, если ссылки нет)
+    :param links:
+    :return:
+    """
+    if not links.get("last"):
+        return 1
+    return int(parse_qs(urlparse(links.get("last").get("url")).query).get("page", ["1"])[0])
+
+
+def get_retry_after(response: requests.Response) -> Optional[float]:
+    """
+    Пауза в секундах из заголовка Retry-After ответа 429 или 403 (None - повторять запрос не нужно)
+    :param response:
+    :return:
+    """
+    if response.status_code not in (403, 429):
+        return None
+    try:
+        return max(0.0, float(response.headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return None
+
+
 def _get_response(
         url: str,
         method: str,
         parameters: Optional[dict] = None,
-        headers: Optional[dict] = None
+        headers: Optional[dict] = None,
+        payload: Optional[dict] = None
 ) -> requests.Response:
     """
     Получить объект ответа requests.Response
@@ -31,6 +146,7 @@ def _get_response(
     :param url:
     :param parameters:
     :param headers:
+    :param payload: тело запроса в формате json (для POST)
     :return:
     """
     if parameters is None:
@@ -42,11 +158,19 @@ def _get_response(
     http_error_codes = {
         401: "Не прошла авторизация. Проверьте корректность api_key.",
         403: "Доступ к ресурсу ограничен.",
-        404: "Запрашиваемый ресурс не найден. Проверьте корректность url."
+        404: "Запрашиваемый ресурс не найден. Проверьте корректность url.",
+        429: "Превышен лимит запросов к api, повторите запуск позже."
     }
 
     try:
-        response = getattr(requests, method)(url, params=parameters, headers=headers, timeout=10)
+        body = {"json": payload} if payload is not None else {}
+        for attempt in range(MAX_RETRIES + 1):
+            response = getattr(_get_transport()[0], method)(url, params=parameters, headers=headers, timeout=10,
+                                                            **body)
+            retry_after = get_retry_after(response)
+            if retry_after is None or retry_after > MAX_RETRY_AFTER or attempt == MAX_RETRIES:
+                break
+            time.sleep(retry_after)
         response.raise_for_status()
     except requests.exceptions.Timeout:
         raise TimeoutConnectionError("Превышен таймаут получения ответа от сервера.")
@@ -57,11 +181,30 @@ def _get_response(
             http_error_codes.get(
                 err.response.status_code,
                 f"Возникла HTTP ошибка, код ошибки: {err.response.status_code}."
-            )
+            ),
+            err.response.status_code
         )
+    for hook in response_hooks:
+        hook(response)
     return response
 
 
+def _trace(method: str, url: str, parameters: Optional[dict], response: requests.Response,
+           duration: float, decode: float):
+    """
+    Передает хукам трассировки сведения о выполненном запросе
+    :param method:
+    :param url:
+    :param parameters:
+    :param response:
+    :param duration: время вызова requests, включая загрузку тела ответа
+    :param decode: время десериализации тела ответа
+    :return:
+    """
+    for hook in trace_hooks:
+        hook(method, url, parameters, response, duration, decode)
+
+
 def get_response_headers_data(
         url: str, parameters: Optional[dict] = None,
         headers: Optional[dict] = None
@@ -73,7 +216,10 @@ def get_response_headers_data(
     :param headers:
     :return:
     """
+    started = time.perf_counter()
     response = _get_response(url, method="head", parameters=parameters, headers=headers)
+    if trace_hooks:
+        _trace("head", url, parameters, response, time.perf_counter() - started, 0.0)
 
     return HeadersData(
         response.links,
@@ -85,6 +231,24 @@ def get_response_headers_data(
     )
 
 
+def _make_response_data(response: requests.Response, response_json) -> ResponseData:
+    """
+    Десериализованные данные ответа и часть необходимых заголовков
+    :param response:
+    :param response_json:
+    :return:
+    """
+    return ResponseData(
+        response_json,
+        response.links,
+        response.headers.get('X-RateLimit-Remaining'),
+        datetime.fromtimestamp(
+            int(response.headers.get('X-RateLimit-Reset'))
+        ) if response.headers.get('X-RateLimit-Reset') else None,
+        response.status_code,
+    )
+
+
 def get_response_data(url: str, parameters: Optional[dict] = None, headers: Optional[dict] = None) -> ResponseData:
     """
     Получить десериализованные данные ответа Response и часть необходимых заголовков
@@ -93,15 +257,54 @@ def get_response_data(url: str, parameters: Optional[dict] = None, headers: Opti
     :param headers:
     :return:
     """
+    cache_key = cached = None
+    etag_cache = _get_transport()[1]
+    if etag_cache is not None:
+        cache_key = (url, tuple(sorted((parameters or {}).items())), (headers or {}).get('Authorization'))
+        cached = etag_cache.get(cache_key)
+        if cached:
+            headers = {**(headers or {}), 'If-None-Match': cached[0]}
+
+    started = time.perf_counter()
     response = _get_response(url, method="get", parameters=parameters, headers=headers)
+    duration = time.perf_counter() - started
+
+    if cached and response.status_code == 304:
+        if trace_hooks:
+            _trace("get", url, parameters, response, duration, 0.0)
+        return cached[1]._replace(
+            rate_limit_remaining=response.headers.get('X-RateLimit-Remaining', cached[1].rate_limit_remaining)
+        )
 
+    started = time.perf_counter()
     try:
         response_json = response.json()
     except (ValueError, JSONDecodeError):
         response_json = None
+    if trace_hooks:
+        _trace("get", url, parameters, response, duration, time.perf_counter() - started)
 
-    return ResponseData(
-        response_json,
+    response_data = _make_response_data(response, response_json)
+    if cache_key and response.headers.get('ETag'):
+        etag_cache[cache_key] = (response.headers.get('ETag'), response_data)
+    return response_data
+
+
+def get_response_raw_data(url: str, parameters: Optional[dict] = None,
+                          headers: Optional[dict] = None) -> RawResponseData:
+    """
+    Получить тело ответа без десериализации (для разбора в другом процессе) и часть необходимых заголовков
+    :param url:
+    :param parameters:
+    :param headers:
+    :return:
+    """
+    started = time.perf_counter()
+    response = _get_response(url, method="get", parameters=parameters, headers=headers)
+    if trace_hooks:
+        _trace("get", url, parameters, response, time.perf_counter() - started, 0.0)
+    return RawResponseData(
+        response.content,
         response.links,
         response.headers.get('X-RateLimit-Remaining'),
         datetime.fromtimestamp(
@@ -111,19 +314,22 @@ def get_response_data(url: str, parameters: Optional[dict] = None, headers: Opti
     )
 
 
-def get_response_content_with_pagination(request_attributes: tuple) -> Generator:
+def post_response_data(url: str, payload: dict, headers: Optional[dict] = None) -> ResponseData:
     """
-    Формирует генератор объектов поиска постранично
-    :param request_attributes:
+    Отправить json (например, запрос graphql) и получить десериализованные данные ответа
+    :param url:
+    :param payload:
+    :param headers:
     :return:
     """
-    url, parameters, headers = request_attributes
-    while url:
-        data = get_response_data(
-            url,
-            parameters,
-            headers
-            )
-        yield from data.response_json
-        url = get_next_pages(data.links)
-        parameters = None
+    started = time.perf_counter()
+    response = _get_response(url, method="post", headers=headers, payload=payload)
+    duration = time.perf_counter() - started
+    started = time.perf_counter()
+    try:
+        response_json = response.json()
+    except (ValueError, JSONDecodeError):
+        response_json = None
+    if trace_hooks:
+        _trace("post", url, None, response, duration, time.perf_counter() - started)
+    return _make_response_data(response, response_json)
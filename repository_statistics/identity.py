@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+"""
+repository_statistic.identity
+~~~~~~~~~~~~~~~~~~~
+
+Модуль содержит разрешение авторов коммитов. Коммиты без связанной учетной записи (author = null)
+относятся к логину по email: адреса users.noreply.github.com разбираются без запросов, остальные
+ищутся пакетными запросами graphql с учетом остатка лимита. Коммиты с адресами, которые не удалось проверить
+до резерва лимита, не учитываются, а их количество сообщается как признак неполного результата.
+Найденные соответствия email -> логин сохраняются между запусками, а карта псевдонимов объединяет
+логины и адреса одного человека
+"""
+import json
+import os
+import re
+import time
+
+from typing import Optional
+
+from repository_statistics.cache import get_cache_dir
+from repository_statistics.exceptions import HTTPError
+from repository_statistics.httpclient import post_response_data
+from repository_statistics.sites.github import endpoints, get_headers
+from repository_statistics.structure import Params
+from repository_statistics.utils import load_json, save_json
+
+BATCH_SIZE = 20
+RESERVE = 50
+NOT_FOUND_TTL = 30 * 24 * 3600
+
+_noreply_email = re.compile(r"^(?:\d+\+)?(?P<login>[^@+]+)@users\.noreply\.github\.com$")
+
+
+def get_identities_path() -> str:
+    return os.path.join(get_cache_dir(), "identities.json")
+
+
+def get_noreply_login(email: str) -> Optional[str]:
+    """
+    Логин из адреса вида 12345+login@users.noreply.github.com или login@users.noreply.github.com
+    :param email:
+    :return:
+    """
+    match = _noreply_email.match(email)
+    return match.group("login") if match else None
+
+
+def get_search_query(emails: list) -> str:
+    """
+    Запрос graphql, который ищет пользователей по нескольким адресам: поле eN соответствует emails[N]
+    :param emails:
+    :return:
+    """
+    searches = (
+        f'e{index}: search(query: {json.dumps(email + " in:email")}, type: USER, first: 1) '
+        '{ nodes { ... on User { login } } }'
+        for index, email in enumerate(emails)
+    )
+    return "query { " + " ".join(searches) + " }"
+
+
+class IdentityResolver:
+    """Приводит авторов коммитов к основным логинам с постоянным кэшем соответствий email -> логин"""
+
+    def __init__(self, api_key: str, aliases: Optional[dict] = None, path: Optional[str] = None,
+                 batch_size: int = BATCH_SIZE, reserve: int = RESERVE):
+        """
+        :param api_key:
+        :param aliases: псевдоним (логин или email) -> основной логин
+        :param path: файл кэша соответствий, None - identities.json в каталоге кэша
+        :param batch_size: количество адресов в одном запросе поиска
+        :param reserve: поиск прекращается, когда остаток лимита запросов не больше reserve
+        """
+        self.api_key = api_key
+        self.aliases = {(alias.lower() if "@" in alias else alias): login for alias, login in (aliases or {}).items()}
+        self.path = path or get_identities_path()
+        self.emails = (load_json(self.path) or {}).get("emails", {})
+        self.batch_size = batch_size
+        self.reserve = reserve
+        self.lookups = 0
+        self.unresolved_commits = 0
+
+    def resolve(self, logins: list, emails: list) -> list:
+        """
+        Основные логины авторов. Коммит без учетной записи, пользователь с адресом которого не найден,
+        учитывается под email автора. Коммит, адрес которого не проверен из-за лимита, не учитывается (None)
+        и добавляется к unresolved_commits
+        :param logins: логины (None, если учетная запись не связана)
+        :param emails: адреса авторов коммитов
+        :return:
+        """
+        unknown = sorted({
+            email.lower() for login, email in zip(logins, emails)
+            if login is None and email and not self._is_known(email.lower())
+        })
+        if unknown:
+            self.lookup(unknown)
+        resolved = [self.get_login(login, email) for login, email in zip(logins, emails)]
+        self.unresolved_commits += sum(1 for login, email in zip(resolved, emails) if login is None and email)
+        return resolved
+
+    def get_login(self, login: Optional[str], email: Optional[str]) -> Optional[str]:
+        """
+        Основной логин автора. None - учетная запись не связана, а адрес еще не проверен
+        :param login:
+        :param email:
+        :return:
+        """
+        if login is None and email:
+            email = email.lower()
+            entry = self.emails.get(email)
+            if email not in self.aliases and entry is None:
+                return None
+            login = self.aliases.get(email) or entry[0] or email
+        return self.aliases.get(login, login)
+
+    def lookup(self, emails: list):
+        """
+        Определяет логины по адресам и сохраняет результат в кэш.
+        Адреса, которые не удалось проверить из-за лимита или ошибки graphql, остаются для следующего запуска
+        :param emails:
+        :return:
+        """
+        now = time.time()
+        pending = []
+        for email in emails:
+            login = get_noreply_login(email)
+            if login:
+                self.emails[email] = [login, now]
+            else:
+                pending.append(email)
+        for start in range(0, len(pending), self.batch_size):
+            batch = pending[start:start + self.batch_size]
+            try:
+                response_data = post_response_data(
+                    endpoints["graphql"](), {"query": get_search_query(batch)}, get_headers(self.api_key))
+            except HTTPError:
+                break
+            self.lookups += 1
+            response_json = response_data.response_json or {}
+            data = response_json.get("data") or {}
+            if response_json.get("errors") or any(f"e{index}" not in data for index in range(len(batch))):
+                # Ответ 200 с ошибками (например, RATE_LIMITED) не означает, что адреса не найдены
+                break
+            for index, email in enumerate(batch):
+                nodes = (data.get(f"e{index}") or {}).get("nodes") or []
+                self.emails[email] = [nodes[0].get("login") if nodes else None, now]
+            remaining = response_data.rate_limit_remaining
+            if remaining is not None and int(remaining) <= self.reserve:
+                break
+        save_json(self.path, {"emails": self.emails})
+
+    def _is_known(self, email: str) -> bool:
+        if email in self.aliases:
+            return True
+        entry = self.emails.get(email)
+        return bool(entry) and (entry[0] is not None or time.time() - entry[1] < NOT_FOUND_TTL)
+
+
+def get_resolver(params: Params) -> Optional[IdentityResolver]:
+    """
+    Создает разрешение авторов, если оно включено параметрами отчета
+    :param params:
+    :return:
+    """
+    if not params.identities:
+        return None
+    return IdentityResolver(params.api_key, load_json(params.aliases) if params.aliases else None)
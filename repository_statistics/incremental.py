@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+"""
+repository_statistic.incremental
+~~~~~~~~~~~~~~~~~~~
+
+Модуль содержит инкрементальный подсчет коммитов. После каждого запуска сохраняются head ветки
+и количество коммитов по всем авторам. Следующий запуск узнает текущий head ветки одним запросом
+и загружает через compare только коммиты last_sha...head. При перезаписи истории (force push)
+или недоступном last_sha выполняется полный подсчет
+"""
+import hashlib
+import json
+import os
+
+from collections.abc import Iterator
+from typing import Callable, Optional
+
+from repository_statistics.cache import get_cache_dir
+from repository_statistics.exceptions import HTTPError
+from repository_statistics.httpclient import get_response_data, get_next_pages
+from repository_statistics.identity import IdentityResolver
+from repository_statistics.sites.base import is_commit_in_period
+from repository_statistics.sites.github import (emit_items, endpoints, get_commit_date, get_headers, load_commits,
+                                                make_commits_table, project_commit, PER_PAGE, NUM_RECORDS)
+from repository_statistics.structure import Params
+from repository_statistics.utils import load_json, save_json
+
+FAST_FORWARD = ("ahead", "identical")
+# Коды ответа compare, при которых base недоступен (удален перезаписью истории) или не связан с head
+MISSING_BASE_STATUSES = (404, 422)
+
+
+def get_state_path(params: Params) -> str:
+    """
+    Файл состояния подсчета для репозитория, ветки и периода отчета
+    :param params:
+    :return:
+    """
+    data = json.dumps([params.url, params.branch, params.begin_date, params.end_date, params.identities,
+                       params.aliases])
+    return os.path.join(get_cache_dir(), "commits", f"{hashlib.sha256(data.encode('utf-8')).hexdigest()}.json")
+
+
+def get_branch_head(params: Params) -> str:
+    """
+    sha коммита, на который указывает ветка
+    :param params:
+    :return:
+    """
+    response_data = get_response_data(endpoints["branch"](params.url, params.branch),
+                                      headers=get_headers(params.api_key))
+    return response_data.response_json["commit"]["sha"]
+
+
+def fetch_new_commits(params: Params, base: str, head: str) -> Optional[Iterator]:
+    """
+    Итератор по коммитам base...head от новых к старым (в порядке списка коммитов ветки).
+    None, если head не является продолжением base или base недоступен (404, 422).
+    Остальные ошибки, например исчерпание лимита, не означают перезаписи истории и передаются дальше
+    :param params:
+    :param base:
+    :param head:
+    :return:
+    """
+    url, parameters = endpoints["compare"](params.url, base, head), {"per_page": str(PER_PAGE)}
+    headers = get_headers(params.api_key)
+    commits = []
+    while url:
+        try:
+            response_data = get_response_data(url, parameters, headers)
+        except HTTPError as err:
+            if err.status_code in MISSING_BASE_STATUSES:
+                return None
+            raise
+        if (response_data.response_json or {}).get("status") not in FAST_FORWARD:
+            return None
+        commits.extend(response_data.response_json.get("commits") or [])
+        url, parameters = get_next_pages(response_data.links or {}), None
+    return (commit for commit in reversed(commits) if is_commit_in_period(params, get_commit_date(commit)))
+
+
+def merge_counts(new_counts: list, counts: list) -> list:
+    """
+    Добавляет количество коммитов новых коммитов к сохраненному. Новые коммиты находятся в начале списка ветки,
+    поэтому их авторы идут первыми в порядке первого появления
+    :param new_counts: [(логин, количество), ...]
+    :param counts: [(логин, количество), ...]
+    :return:
+    """
+    merged = dict(new_counts)
+    for login, count in counts:
+        merged[login] = merged.get(login, 0) + count
+    return list(merged.items())
+
+
+def count_commits_incrementally(params: Params, on_item: Optional[Callable] = None,
+                                resolver: Optional[IdentityResolver] = None) -> list:
+    """
+    Количество коммитов по авторам, как count_commits_by_author, с загрузкой только новых коммитов
+    :param params:
+    :param on_item: вызывается для каждого загруженного коммита
+    :param resolver:
+    :return:
+    """
+    path = get_state_path(params)
+    state = load_json(path)
+    head = get_branch_head(params)
+    counts = None
+    if state and state["head"] == head:
+        counts = state["counts"]
+    elif state:
+        new_commits = fetch_new_commits(params, state["head"], head)
+        if new_commits is not None:
+            table = make_commits_table(emit_items(new_commits, on_item, "commits", project_commit), resolver)
+            counts = merge_counts(table.author_counts(), state["counts"])
+    if counts is None:
+        # Полный подсчет от зафиксированного head, чтобы следующий compare не учел коммиты повторно
+        counts = load_commits(params._replace(branch=head), on_item, resolver).author_counts()
+    # Неполные счетчики (авторы части коммитов не проверены из-за лимита) не сохраняются,
+    # чтобы следующий запуск повторно разрешил эти коммиты
+    if resolver is None or not resolver.unresolved_commits:
+        save_json(path, {"head": head, "counts": counts})
+    return [tuple(pair) for pair in sorted(counts, key=lambda pair: -pair[1])[:NUM_RECORDS]]
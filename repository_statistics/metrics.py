@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+"""
+repository_statistic.metrics
+~~~~~~~~~~~~~~~~~~~
+
+Модуль вычисляет временные ряды и распределения по уже загруженным таблицам,
+не выполняя дополнительных запросов
+"""
+from datetime import date
+from typing import Optional
+
+import numpy as np
+
+from repository_statistics.structure import CommitsPerWeek, Distribution, Histogram
+from repository_statistics.table import ItemTable, NO_AUTHOR, NO_DATE, STATE_PULL_REQUEST, from_ordinals, to_ordinal
+
+PERCENTILES = np.array([50, 75, 90, 95, 99])
+AGE_BIN_EDGES = np.array([0, 1, 7, 14, 30, 90, 180, 365, np.iinfo(np.int32).max])
+
+
+def get_commits_per_week(commits: ItemTable) -> CommitsPerWeek:
+    """
+    Количество коммитов каждого автора по неделям (неделя начинается с понедельника)
+    :param commits:
+    :return:
+    """
+    mask = (commits.author != NO_AUTHOR) & (commits.created != NO_DATE)
+    if not mask.any():
+        return CommitsPerWeek(np.array([], dtype="datetime64[D]"), [], np.zeros((0, 0), dtype=np.int32))
+    # Порядковый номер 1 (01.01.0001) приходится на понедельник
+    weeks = (commits.created[mask] - 1) // 7
+    first_week = weeks.min()
+    counts = np.zeros((len(commits.authors), weeks.max() - first_week + 1), dtype=np.int32)
+    np.add.at(counts, (commits.author[mask], weeks - first_week), 1)
+    return CommitsPerWeek(
+        from_ordinals((first_week + np.arange(counts.shape[1])) * 7 + 1),
+        commits.authors,
+        counts
+    )
+
+
+def get_time_to_merge(closed_pulls: ItemTable, begin_date: Optional[date], end_date: Optional[date]) -> Distribution:
+    """
+    Перцентили времени от создания до слияния pull requests, созданных в интервале дат
+    :param closed_pulls:
+    :param begin_date:
+    :param end_date:
+    :return:
+    """
+    mask = closed_pulls.window_mask(begin_date, end_date) & (closed_pulls.merged_at != NO_DATE)
+    durations = closed_pulls.merged_at[mask] - closed_pulls.created_at[mask]
+    return Distribution(
+        PERCENTILES,
+        np.percentile(durations, PERCENTILES) if len(durations) else np.full(len(PERCENTILES), np.nan),
+        len(durations)
+    )
+
+
+def get_issues_age(
+        open_issues: ItemTable,
+        begin_date: Optional[date],
+        end_date: Optional[date],
+        current_date: Optional[date] = None
+) -> Histogram:
+    """
+    Гистограмма возраста (в днях) открытых issues, созданных в интервале дат
+    :param open_issues:
+    :param begin_date:
+    :param end_date:
+    :param current_date: по умолчанию текущая дата
+    :return:
+    """
+    mask = open_issues.window_mask(begin_date, end_date) & open_issues.flag_mask(STATE_PULL_REQUEST, is_set=False)
+    ages = np.maximum(to_ordinal(current_date or date.today()) - open_issues.created[mask], 0)
+    bins = np.searchsorted(AGE_BIN_EDGES, ages, side="right") - 1
+    return Histogram(AGE_BIN_EDGES, np.bincount(bins, minlength=len(AGE_BIN_EDGES) - 1)[:len(AGE_BIN_EDGES) - 1])
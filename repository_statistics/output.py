@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+
+"""
+repository_statistic.output
+~~~~~~~~~~~~~~~~~~~
+
+Модуль содержит потоковый машиночитаемый вывод (json, ndjson, csv). Каждое поле результирующего
+набора данных записывается сразу после завершения этапа, на котором оно вычислено, записи об объектах -
+по мере загрузки страниц. Выбранные этапы (коммиты, pull requests, issues) загружаются одновременно,
+и первым записывается результат этапа, который завершился раньше; с записями об объектах этапы выполняются
+последовательно, чтобы записи одного списка шли подряд. При ошибке документ завершается
+записью об ошибке. Модуль не импортирует requests и numpy
+"""
+import csv
+import json
+import sys
+
+from collections.abc import Iterator
+from typing import Optional, TextIO
+
+from repository_statistics.exceptions import Error
+from repository_statistics.structure import ResultData
+from repository_statistics.utils import to_serializable
+
+FORMATS = ("text", "json", "ndjson", "csv")
+
+
+class NdjsonWriter:
+    """Одна json-запись на строку: {"type": "item", "kind": ..., "data": ...} или {"type": "result", ...}"""
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+
+    def item(self, kind: str, record: dict):
+        self._write({"type": "item", "kind": kind, "data": record})
+
+    def result(self, name: str, value):
+        if value is not None:
+            self._write({"type": "result", "name": name, "data": to_serializable(value)})
+
+    def error(self, message: str):
+        self._write({"type": "error", "message": message})
+
+    def close(self):
+        pass
+
+    def _write(self, record: dict):
+        self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.stream.flush()
+
+
+class JsonWriter:
+    """
+    Один json-объект, который записывается по частям: поля результата в порядке вычисления,
+    записи об объектах - массивами с наименованием списка (commits, open_pulls, ...)
+    """
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+        self.separator = "{"
+        self.open_kind = None
+
+    def item(self, kind: str, record: dict):
+        if kind != self.open_kind:
+            self._close_items()
+            self._write(f"{self.separator}{json.dumps(kind)}: [{json.dumps(record, ensure_ascii=False)}")
+            self.separator, self.open_kind = ",\n", kind
+        else:
+            self._write(f",\n{json.dumps(record, ensure_ascii=False)}")
+
+    def result(self, name: str, value):
+        if value is None:
+            return
+        self._close_items()
+        self._write(f"{self.separator}{json.dumps(name)}: {json.dumps(to_serializable(value), ensure_ascii=False)}")
+        self.separator = ",\n"
+
+    def error(self, message: str):
+        self._close_items()
+        self._write(f"{self.separator}\"error\": {json.dumps(message, ensure_ascii=False)}")
+        self.separator = ",\n"
+
+    def close(self):
+        self._close_items()
+        self._write("{}\n" if self.separator == "{" else "}\n")
+
+    def _close_items(self):
+        if self.open_kind is not None:
+            self._write("]")
+            self.open_kind = None
+
+    def _write(self, text: str):
+        self.stream.write(text)
+        self.stream.flush()
+
+
+class CsvWriter:
+    """Длинный формат section,key,value: вложенные значения разворачиваются в ключи через точку"""
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+        self.writer = csv.writer(stream)
+        self.writer.writerow(("section", "key", "value"))
+
+    def item(self, kind: str, record: dict):
+        record_id = record.get("id")
+        self.writer.writerows(
+            (kind, f"{record_id}.{key}", value) for key, value in record.items() if key != "id"
+        )
+        self.stream.flush()
+
+    def result(self, name: str, value):
+        if value is None:
+            return
+        self.writer.writerows((name, key, item) for key, item in flatten(to_serializable(value)))
+        self.stream.flush()
+
+    def error(self, message: str):
+        self.writer.writerow(("error", "message", message))
+        self.stream.flush()
+
+    def close(self):
+        pass
+
+
+WRITERS = {
+    "json": JsonWriter,
+    "ndjson": NdjsonWriter,
+    "csv": CsvWriter,
+}
+
+
+def get_writer(output_format: str, stream: Optional[TextIO] = None):
+    """
+    Создает потоковый writer выбранного формата
+    :param output_format: json, ndjson или csv
+    :param stream: None - стандартный вывод
+    :return:
+    """
+    return WRITERS[output_format](stream or sys.stdout)
+
+
+def flatten(value, prefix: str = "") -> Iterator:
+    """
+    Разворачивает вложенное значение в пары (ключ через точку, скалярное значение).
+    Списки пар [строка, значение] (например, коммиты по авторам) разворачиваются по первому элементу пары
+    :param value:
+    :param prefix:
+    :return:
+    """
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list):
+        is_pairs = all(isinstance(item, list) and len(item) == 2 and isinstance(item[0], str) for item in value)
+        items = value if is_pairs else enumerate(value)
+    else:
+        yield prefix, value
+        return
+    for key, item in items:
+        yield from flatten(item, f"{prefix}.{key}" if prefix else str(key))
+
+
+def write_sections(writer, sections: Iterator) -> ResultData:
+    """
+    Записывает поля результирующего набора данных по мере их вычисления.
+    Возвращает собранный результирующий набор данных (записи об объектах в нем не хранятся).
+    Документ завершается и при ошибке: ошибка проекта записывается в документ и пробрасывается дальше
+    :param writer:
+    :param sections: пары (поле ResultData, значение), например calculations.iter_result_data
+    :return:
+    """
+    values = {}
+    try:
+        for name, value in sections:
+            writer.result(name, value)
+            values[name] = value
+    except Error as err:
+        writer.error(err.message if isinstance(err.message, str) else "; ".join(err.message))
+        raise
+    finally:
+        writer.close()
+    return ResultData(None, None, None)._replace(**values)
+
+
+def write_result_data(writer, result_data: ResultData):
+    """
+    Записывает уже вычисленный результирующий набор данных (например, из кэша)
+    :param writer:
+    :param result_data:
+    :return:
+    """
+    for name, value in result_data._asdict().items():
+        writer.result(name, value)
+    writer.close()
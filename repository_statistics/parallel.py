@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+"""
+repository_statistic.parallel
+~~~~~~~~~~~~~~~~~~~
+
+Модуль содержит режим расчета на нескольких ядрах. Основной процесс только загружает страницы
+(адреса всех страниц известны по ссылке rel="last" первой страницы) и передает тело ответа без разбора
+в пул процессов. Процессы десериализуют страницу, отбирают объекты по периоду, состоянию и возрасту
+и возвращают небольшие частичные результаты: количество коммитов по авторам или счетчики объектов.
+Частичные результаты объединяются в основном процессе в порядке страниц.
+Одновременно загружается и ожидает разбора не больше 2 * workers страниц,
+поэтому память не растет с длиной списка
+"""
+import contextvars
+import json
+import multiprocessing
+import os
+
+from collections import Counter, deque
+from collections.abc import Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+from typing import Optional
+
+from repository_statistics.calculations import stage
+from repository_statistics.httpclient import get_response_raw_data, get_last_page
+from repository_statistics.sites.github import (count_issues, count_pulls, get_request_attributes_for_commits,
+                                                get_request_attributes_for_issues, get_request_attributes_for_pulls,
+                                                make_commits_table, make_items_table, NUM_RECORDS)
+from repository_statistics.structure import Params, PullRequests, Issues
+
+DEFAULT_FETCHERS = 8
+
+
+def aggregate_page(kind: str, content: bytes, params: Params):
+    """
+    Частичный результат по одной странице списка (выполняется в процессе пула)
+    :param kind: commits, open_pulls, closed_pulls, open_issues или closed_issues
+    :param content: тело ответа
+    :param params:
+    :return: для коммитов [(логин, количество), ...], для остальных списков (количество, количество старых)
+    """
+    items = json.loads(content) if content else []
+    if kind == "commits":
+        return make_commits_table(items).author_counts()
+    table = make_items_table(items)
+    count = count_pulls if kind.endswith("pulls") else count_issues
+    return count(params, table), count(params, table, is_old=True)
+
+
+def merge_partials(kind: str, partials: list):
+    """
+    Объединяет частичные результаты страниц в порядке страниц
+    :param kind:
+    :param partials:
+    :return: для коммитов [(логин, количество), ...] как у count_commits_by_author, для остальных (количество, старые)
+    """
+    if kind == "commits":
+        counts = Counter()
+        for partial in partials:
+            counts.update(dict(partial))
+        return sorted(counts.items(), key=lambda pair: -pair[1])[:NUM_RECORDS]
+    return tuple(sum(values) for values in zip(*partials)) if partials else (0, 0)
+
+
+def aggregate_listing(kind: str, request_attributes: tuple, params: Params, pool: Executor,
+                      fetchers: ThreadPoolExecutor, window: int):
+    """
+    Загружает все страницы списка и агрегирует их в пуле процессов. Разбор страниц выполняется
+    одновременно с загрузкой следующих
+    :param kind:
+    :param request_attributes:
+    :param params:
+    :param pool: пул процессов разбора
+    :param fetchers: пул потоков загрузки
+    :param window: наибольшее количество загружаемых и наибольшее количество ожидающих разбора страниц
+    :return:
+    """
+    url, parameters, headers = request_attributes
+    first_page = get_response_raw_data(url, parameters, headers)
+    pages = iter(range(2, get_last_page(first_page.links or {}) + 1))
+
+    def _fetch(page: int):
+        # Контекст копируется, чтобы в потоках действовали сессия клиента и метки трассировки
+        return fetchers.submit(contextvars.copy_context().run, get_response_raw_data, url,
+                               {**parameters, 'page': str(page)}, headers)
+
+    partials = []
+    decoding = deque([pool.submit(aggregate_page, kind, first_page.content, params)])
+    fetching = deque(_fetch(page) for page in islice(pages, window))
+    while fetching:
+        content = fetching.popleft().result().content
+        page = next(pages, None)
+        if page is not None:
+            fetching.append(_fetch(page))
+        if len(decoding) >= window:
+            partials.append(decoding.popleft().result())
+        decoding.append(pool.submit(aggregate_page, kind, content, params))
+    partials.extend(partial.result() for partial in decoding)
+    return merge_partials(kind, partials)
+
+
+def iter_parallel_result_data(params: Params, fetchers: int = DEFAULT_FETCHERS) -> Iterator:
+    """
+    Получает результирующий набор данных в пуле из params.workers процессов по частям, как iter_result_data
+    :param params:
+    :param fetchers: количество потоков загрузки страниц
+    :return:
+    """
+    workers: Optional[int] = params.workers if params.workers and params.workers > 0 else None
+    window = 2 * (workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool, \
+            ThreadPoolExecutor(fetchers) as fetcher_pool:
+
+        def _aggregate(kind: str, request_attributes: tuple):
+            return aggregate_listing(kind, request_attributes, params, pool, fetcher_pool, window)
+
+        dev_activity = pull_requests = issues = None
+        if params.dev_activity:
+            with stage("dev_activity"):
+                dev_activity = _aggregate("commits", get_request_attributes_for_commits(params))
+        yield "dev_activity", dev_activity
+        if params.pull_requests:
+            with stage("pull_requests"):
+                open_pulls = _aggregate("open_pulls", get_request_attributes_for_pulls(params, True))
+                closed_pulls = _aggregate("closed_pulls", get_request_attributes_for_pulls(params, False))
+            pull_requests = PullRequests(open_pulls[0], closed_pulls[0], open_pulls[1])
+        yield "pull_requests", pull_requests
+        if params.issues:
+            with stage("issues"):
+                open_issues = _aggregate("open_issues", get_request_attributes_for_issues(params, True))
+                closed_issues = _aggregate("closed_issues", get_request_attributes_for_issues(params, False))
+            issues = Issues(open_issues[0], closed_issues[0], open_issues[1])
+        yield "issues", issues
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+"""
+repository_statistic.planner
+~~~~~~~~~~~~~~~~~~~
+
+Модуль содержит планировщик стоимости запуска: по дешевым запросам GET с per_page=1
+оценивает количество страниц каждого списка, количество запросов, время работы
+и достаточность оставшегося лимита запросов
+"""
+import math
+import time
+
+from repository_statistics.httpclient import get_response_data, get_last_page
+from repository_statistics.sampling import DEFAULT_BUDGET
+from repository_statistics.sites.github import (get_request_attributes_for_commits, get_request_attributes_for_issues,
+                                                get_request_attributes_for_pulls, PER_PAGE)
+from repository_statistics.structure import Params, ScanPlan, Plan
+
+LARGE_SCAN_PAGES = 100
+
+
+def get_scans(params: Params) -> list:
+    """
+    Список сканируемых списков выбранного запуска: [(наименование, атрибуты запроса), ...]
+    :param params:
+    :return:
+    """
+    scans = []
+    if params.dev_activity:
+        scans.append(("commits", get_request_attributes_for_commits(params)))
+    if params.pull_requests:
+        scans.append(("open pull requests", get_request_attributes_for_pulls(params, is_open=True)))
+        scans.append(("closed pull requests", get_request_attributes_for_pulls(params, is_open=False)))
+    if params.issues:
+        scans.append(("open issues", get_request_attributes_for_issues(params, is_open=True)))
+        scans.append(("closed issues", get_request_attributes_for_issues(params, is_open=False)))
+    return scans
+
+
+def probe_scan(name: str, request_attributes: tuple) -> tuple:
+    """
+    Определяет количество объектов списка запросом с per_page=1:
+    номер последней страницы при этом равен количеству объектов. Без ссылки rel="last" страница одна,
+    и объектов столько, сколько в теле ответа (0 или 1)
+    :param name:
+    :param request_attributes:
+    :return: ScanPlan и данные ответа
+    """
+    url, parameters, headers = request_attributes
+    started = time.perf_counter()
+    response_data = get_response_data(url, {**parameters, 'per_page': '1'}, headers)
+    latency = time.perf_counter() - started
+    links = response_data.links or {}
+    items = get_last_page(links) if links.get("last") else len(response_data.response_json or [])
+    pages = max(1, math.ceil(items / PER_PAGE))
+    return ScanPlan(name, items, pages, latency), response_data
+
+
+def get_requests(params: Params, scan: ScanPlan) -> int:
+    """
+    Прогноз количества запросов для списка с учетом режима оценки. С target_error без sample_budget
+    выборка не ограничена бюджетом и может загрузить все страницы, поэтому прогноз - все страницы списка
+    :param params:
+    :param scan:
+    :return:
+    """
+    if params.estimate and params.sample_budget:
+        return min(scan.pages, params.sample_budget)
+    if params.estimate and not params.target_error:
+        return min(scan.pages, DEFAULT_BUDGET)
+    return scan.pages
+
+
+def get_recommendations(params: Params, scans: list, requests: int, remaining: int) -> list:
+    """
+    Рекомендации по более дешевым стратегиям запуска
+    :param params:
+    :param scans:
+    :param requests:
+    :param remaining:
+    :return:
+    """
+    recommendations = []
+    if remaining is not None and requests > remaining:
+        recommendations.append(
+            f"The run needs {requests} requests but only {remaining} remain before the rate limit resets."
+        )
+    if not params.estimate and any(scan.pages > LARGE_SCAN_PAGES for scan in scans):
+        recommendations.append(
+            f"Use --estimate --budget {DEFAULT_BUDGET} to sample pages instead of downloading "
+            f"{max(scan.pages for scan in scans)} pages of the largest listing."
+        )
+    if not (params.begin_date and params.end_date) and requests > LARGE_SCAN_PAGES:
+        recommendations.append("Narrow the analysis window with --begin_date/--end_date.")
+    if params.dev_activity and (params.pull_requests or params.issues) and requests > LARGE_SCAN_PAGES:
+        recommendations.append("Run only the scans you need instead of --all_active: "
+                               + ", ".join(f"{scan.name} = {scan.pages} pages" for scan in scans) + ".")
+    # Список issues включает pull requests, а количество старых объектов требует дат, поэтому
+    # без загрузки известны только количества открытых и закрытых pull requests
+    if not params.begin_date and not params.end_date and params.pull_requests:
+        recommendations.append("Without a date window the open and closed pull request totals are the item counts "
+                               "above; the old pull request count still needs the scan.")
+    return recommendations
+
+
+def get_plan(params: Params) -> Plan:
+    """
+    Строит план запуска, не загружая сами данные
+    :param params:
+    :return:
+    """
+    scans, response_data = [], None
+    for name, request_attributes in get_scans(params):
+        scan, response_data = probe_scan(name, request_attributes)
+        scans.append(scan)
+    requests = sum(get_requests(params, scan) for scan in scans)
+    wall_time = sum(get_requests(params, scan) * scan.latency for scan in scans)
+    remaining = int(response_data.rate_limit_remaining) \
+        if response_data and response_data.rate_limit_remaining is not None else None
+    return Plan(
+        scans,
+        len(scans),
+        requests,
+        wall_time,
+        remaining,
+        response_data.rate_limit_reset if response_data else None,
+        remaining is None or requests <= remaining,
+        get_recommendations(params, scans, requests, remaining)
+    )
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+"""
+repository_statistic.profiling
+~~~~~~~~~~~~~~~~~~~
+
+Модуль содержит профилирование CPU (cProfile) и памяти (tracemalloc) по выбранным этапам расчета:
+dev_activity, pull_requests, issues или estimate в режиме оценки. Статистика каждого этапа сохраняется в файлы,
+краткая сводка горячих точек - в summary.txt
+"""
+import cProfile
+import io
+import os
+import pstats
+import time
+import tracemalloc
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+TOP_N = 10
+
+_current_profiler = ContextVar("current_profiler", default=None)
+
+
+class PhaseStatistics:
+    """Накопленная статистика одного этапа"""
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.wall_time = 0.0
+        self.peak_memory = 0
+        self.snapshot = None
+
+
+class Profiler:
+    """Профилировщик запуска: статистика накапливается по наименованиям этапов"""
+
+    def __init__(self, output_dir: str, top_n: int = TOP_N):
+        self.output_dir = output_dir
+        self.top_n = top_n
+        self.phases = {}
+        self.summary = ""
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Профилирует блок как часть этапа name. Этап может состоять из нескольких блоков
+        :param name:
+        :return:
+        """
+        statistics = self.phases.setdefault(name, PhaseStatistics())
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+        statistics.profile.enable()
+        try:
+            yield
+        finally:
+            statistics.profile.disable()
+            statistics.wall_time += time.perf_counter() - started
+            statistics.peak_memory = max(statistics.peak_memory, tracemalloc.get_traced_memory()[1])
+            statistics.snapshot = tracemalloc.take_snapshot()
+
+    def save(self) -> str:
+        """
+        Сохраняет статистику этапов (<этап>.prof для pstats/snakeviz, <этап>.tracemalloc)
+        и сводку горячих точек summary.txt. Возвращает текст сводки
+        :return:
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        for name, statistics in self.phases.items():
+            statistics.profile.dump_stats(os.path.join(self.output_dir, f"{name}.prof"))
+            statistics.snapshot.dump(os.path.join(self.output_dir, f"{name}.tracemalloc"))
+        self.summary = self.format_summary()
+        with open(os.path.join(self.output_dir, "summary.txt"), "w", encoding="utf-8") as file:
+            file.write(self.summary)
+        return self.summary
+
+    def format_summary(self) -> str:
+        """
+        Сводка: время и пиковая память этапов, top-N функций по собственному времени и top-N мест выделения памяти
+        :return:
+        """
+        lines = []
+        for name, statistics in self.phases.items():
+            lines.append(f"=== {name}: wall time {statistics.wall_time:.3f} s, "
+                         f"peak memory {statistics.peak_memory / 2 ** 20:.1f} MiB")
+            stream = io.StringIO()
+            pstats.Stats(statistics.profile, stream=stream).sort_stats("tottime").print_stats(self.top_n)
+            lines.extend(line for line in stream.getvalue().splitlines() if line.strip())
+            lines.append(f"top {self.top_n} allocation sites:")
+            lines.extend(f"  {statistic}" for statistic in statistics.snapshot.statistics("lineno")[:self.top_n])
+        return "\n".join(lines) + "\n"
+
+
+def is_profiling() -> bool:
+    """
+    Включено ли профилирование в текущем контексте
+    :return:
+    """
+    return _current_profiler.get() is not None
+
+
+@contextmanager
+def phase(name: str):
+    """
+    Профилирует блок как часть этапа name, если профилирование включено, иначе ничего не делает
+    :param name:
+    :return:
+    """
+    profiler = _current_profiler.get()
+    if profiler is None:
+        yield
+        return
+    with profiler.phase(name):
+        yield
+
+
+@contextmanager
+def profiling(output_dir: str, top_n: int = TOP_N):
+    """
+    Включает профилирование этапов расчета внутри блока и сохраняет результаты в output_dir при выходе
+    :param output_dir:
+    :param top_n: количество строк в сводке горячих точек
+    :return: Profiler
+    """
+    profiler = Profiler(output_dir, top_n)
+    started_tracemalloc = not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start()
+    token = _current_profiler.set(profiler)
+    try:
+        yield profiler
+    finally:
+        _current_profiler.reset(token)
+        if profiler.phases:
+            profiler.save()
+        if started_tracemalloc:
+            tracemalloc.stop()
@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+
+"""
+repository_statistic.proxy
+~~~~~~~~~~~~~~~~~~~
+
+Модуль содержит локальный кэширующий прокси api, общий для многих запусков скрипта:
+одинаковые одновременные запросы объединяются в один запрос к api, страницы хранятся с ETag
+и перепроверяются условными запросами (HEAD отвечается по сохраненной странице, как GET),
+запросы POST /graphql передаются в api без кэширования, а число запросов к api ограничено общим бюджетом:
+
+    python -m repository_statistics.proxy --port 8080 --budget 4000
+    python cli.py URL API_KEY --all_active --api_url http://127.0.0.1:8080
+"""
+import json
+import math
+import socket
+import threading
+import time
+
+from collections import Counter, OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple, Optional
+from urllib.parse import urlparse
+
+import click
+import requests
+
+from repository_statistics.exceptions import RateLimitError
+from repository_statistics.sites.github import DEFAULT_BASE_URL
+
+DEFAULT_PORT = 8080
+DEFAULT_WINDOW = 3600
+MAX_ENTRIES = 10000
+TIMEOUT = 10
+STATS_PATH = "/_proxy/stats"
+GRAPHQL_PATH = "/graphql"
+REQUEST_HEADERS = ("Accept", "Authorization")
+RESPONSE_HEADERS = ("Content-Type", "ETag", "Link", "Retry-After", "X-RateLimit-Limit", "X-RateLimit-Remaining",
+                    "X-RateLimit-Reset", "X-RateLimit-Used")
+
+
+class CachedResponse(NamedTuple):
+    """Ответ api, сохраненный прокси"""
+    status: int
+    headers: dict
+    body: bytes
+    etag: Optional[str]
+    stored: float
+
+
+class InFlight:
+    """Выполняющийся запрос к api, результат которого ожидают одинаковые запросы"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class Budget:
+    """
+    Общий для всех клиентов прокси бюджет запросов к api: не более limit запросов за окно window секунд,
+    и для каждого api_key остаток лимита api не опускается ниже reserve
+    """
+
+    def __init__(self, limit: Optional[int] = None, window: float = DEFAULT_WINDOW, reserve: int = 0):
+        self.limit = limit
+        self.window = window
+        self.reserve = reserve
+        self.window_start = time.time()
+        self.used = 0
+        self.rate_limits = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, authorization: Optional[str]) -> Optional[float]:
+        """
+        Резервирует запрос к api. Возвращает None или время в секундах, через которое можно повторить запрос
+        :param authorization: заголовок Authorization запроса
+        :return:
+        """
+        with self.lock:
+            now = time.time()
+            if now - self.window_start >= self.window:
+                self.window_start, self.used = now, 0
+            remaining, reset = self.rate_limits.get(authorization, (None, None))
+            if remaining is not None and remaining <= self.reserve and reset and reset > now:
+                return reset - now
+            if self.limit is not None and self.used >= self.limit:
+                return self.window_start + self.window - now
+            self.used += 1
+            if remaining is not None:
+                self.rate_limits[authorization] = (remaining - 1, reset)
+            return None
+
+    def refund(self):
+        """
+        Возвращает зарезервированный запрос: ответы 304 api не учитывает в лимите
+        :return:
+        """
+        with self.lock:
+            self.used = max(0, self.used - 1)
+
+    def update(self, authorization: Optional[str], headers: dict):
+        """
+        Запоминает остаток лимита api_key по заголовкам ответа
+        :param authorization:
+        :param headers:
+        :return:
+        """
+        remaining, reset = headers.get("X-RateLimit-Remaining"), headers.get("X-RateLimit-Reset")
+        if remaining is not None:
+            with self.lock:
+                self.rate_limits[authorization] = (int(remaining), int(reset) if reset else None)
+
+
+class ProxyState:
+    """Кэш страниц, выполняющиеся запросы, бюджет и счетчики прокси"""
+
+    def __init__(self, upstream: str = DEFAULT_BASE_URL, budget: Optional[Budget] = None, max_age: float = 0.0,
+                 max_entries: int = MAX_ENTRIES, session: Optional[requests.Session] = None):
+        """
+        :param upstream: адрес api
+        :param budget: None - запросы не ограничиваются
+        :param max_age: сколько секунд страница отдается из кэша без перепроверки
+        :param max_entries: максимальное количество страниц в кэше
+        :param session:
+        """
+        self.upstream = upstream.rstrip("/")
+        self.budget = budget or Budget()
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.session = session or requests.Session()
+        self.cache = OrderedDict()
+        self.in_flight = {}
+        self.statistics = Counter()
+        self.lock = threading.Lock()
+
+    def get(self, path: str, headers: dict) -> tuple:
+        """
+        Ответ на GET запрос: из кэша, по результату одинакового выполняющегося запроса или из api.
+        Возвращает пару (ответ, источник): HIT, COALESCED, REVALIDATED, MISS или STALE
+        :param path: путь с параметрами запроса
+        :param headers: заголовки запроса клиента
+        :return:
+        """
+        key = (path, headers.get("Authorization"), headers.get("Accept"))
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached:
+                self.cache.move_to_end(key)
+                if time.time() - cached.stored < self.max_age:
+                    self.statistics["HIT"] += 1
+                    return cached, "HIT"
+            in_flight = self.in_flight.get(key)
+            is_leader = in_flight is None
+            if is_leader:
+                in_flight = self.in_flight[key] = InFlight()
+
+        if not is_leader:
+            in_flight.done.wait()
+            if in_flight.error:
+                raise in_flight.error
+            with self.lock:
+                self.statistics["COALESCED"] += 1
+            return in_flight.response, "COALESCED"
+
+        try:
+            in_flight.response, source = self._fetch(key, path, headers, cached)
+            with self.lock:
+                self.statistics[source] += 1
+            return in_flight.response, source
+        except (RateLimitError, requests.RequestException) as err:
+            in_flight.error = err
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            in_flight.done.set()
+
+    def post(self, path: str, headers: dict, body: bytes) -> tuple:
+        """
+        Ответ на POST запрос graphql: передается в api без кэширования и объединения, но расходует бюджет.
+        Возвращает пару (ответ, BYPASS)
+        :param path:
+        :param headers: заголовки запроса клиента
+        :param body: тело запроса
+        :return:
+        """
+        response, _ = self._forward("post", path, headers, body=body)
+        with self.lock:
+            self.statistics["BYPASS"] += 1
+        return response, "BYPASS"
+
+    def _fetch(self, key: tuple, path: str, headers: dict, cached: Optional[CachedResponse]) -> tuple:
+        try:
+            response, not_modified = self._forward("get", path, headers, cached.etag if cached else None)
+        except RateLimitError:
+            if cached:
+                return cached, "STALE"
+            raise
+        if not_modified:
+            response = cached._replace(headers={**cached.headers, **response.headers}, stored=response.stored)
+            source = "REVALIDATED"
+        else:
+            source = "MISS"
+        if response.status == 200 and response.etag:
+            with self.lock:
+                self.cache[key] = response
+                self.cache.move_to_end(key)
+                while len(self.cache) > self.max_entries:
+                    self.cache.popitem(last=False)
+        return response, source
+
+    def _forward(self, method: str, path: str, headers: dict, etag: Optional[str] = None,
+                 body: Optional[bytes] = None) -> tuple:
+        authorization = headers.get("Authorization")
+        retry_after = self.budget.acquire(authorization)
+        if retry_after is not None:
+            with self.lock:
+                self.statistics["REJECTED"] += 1
+            raise RateLimitError("Бюджет запросов к api исчерпан.", retry_after)
+        request_headers = {name: headers[name] for name in REQUEST_HEADERS if headers.get(name)}
+        if etag:
+            request_headers["If-None-Match"] = etag
+        if body is not None:
+            request_headers["Content-Type"] = headers.get("Content-Type") or "application/json"
+        response = getattr(self.session, method)(
+            f"{self.upstream}{path}", headers=request_headers, data=body, timeout=TIMEOUT, allow_redirects=False
+        )
+        with self.lock:
+            self.statistics["UPSTREAM"] += 1
+        self.budget.update(authorization, response.headers)
+        not_modified = etag is not None and response.status_code == 304
+        if not_modified:
+            self.budget.refund()
+        return CachedResponse(
+            response.status_code,
+            {name: response.headers[name] for name in RESPONSE_HEADERS if name in response.headers},
+            response.content,
+            response.headers.get("ETag"),
+            time.time()
+        ), not_modified
+
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    """
+    GET и HEAD запросы передаются в api через общий кэш, POST /graphql - напрямую с учетом бюджета;
+    GET /_proxy/stats - счетчики прокси
+    """
+    state: ProxyState = None
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_GET(self):
+        if self.path == STATS_PATH:
+            return self._reply(200, {"Content-Type": "application/json"}, json.dumps({
+                "cached_pages": len(self.state.cache), **self.state.statistics}).encode("utf-8"))
+        self._handle(lambda: self.state.get(self.path, self.headers), send_body=True)
+
+    def do_HEAD(self):
+        # HEAD отвечается по той же странице, что и GET: из кэша или условным запросом, 304 не расходует бюджет
+        self._handle(lambda: self.state.get(self.path, self.headers), send_body=False)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if urlparse(self.path).path != GRAPHQL_PATH:
+            return self._reply(501, {"Content-Type": "application/json"},
+                               json.dumps({"message": "Прокси передает в api только POST /graphql."}).encode("utf-8"))
+        self._handle(lambda: self.state.post(self.path, self.headers, body), send_body=True)
+
+    def _handle(self, get_response, send_body: bool):
+        try:
+            response, source = get_response()
+        except RateLimitError as err:
+            headers = {"Content-Type": "application/json", "Retry-After": str(math.ceil(err.retry_after))}
+            return self._reply(429, headers, json.dumps({"message": err.message}).encode("utf-8"))
+        except requests.RequestException as err:
+            return self._reply(502, {"Content-Type": "application/json"},
+                               json.dumps({"message": str(err)}).encode("utf-8"))
+        headers = {**response.headers, "X-Proxy-Cache": source}
+        if "Link" in headers:
+            headers["Link"] = headers["Link"].replace(self.state.upstream, f"http://{self.headers.get('Host')}")
+        if response.etag and self.headers.get("If-None-Match") == response.etag:
+            return self._reply(304, headers, b"", send_body=False)
+        self._reply(response.status, headers, response.body, send_body)
+
+    def _reply(self, status: int, headers: dict, body: bytes, send_body: bool = True):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(state: ProxyState, host: str, port: int) -> ThreadingHTTPServer:
+    """
+    Создает http сервер прокси для переданного состояния
+    :param state:
+    :param host:
+    :param port:
+    :return:
+    """
+    handler = type("BoundProxyHandler", (ProxyHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+@click.command()
+@click.option('--host', type=str, default="127.0.0.1", help='interface to listen on')
+@click.option('--port', type=int, default=DEFAULT_PORT, help='port to listen on')
+@click.option('--upstream', type=str, default=DEFAULT_BASE_URL, help='API base URL')
+@click.option('--budget', type=int, default=None, help='maximum number of API requests per --window for all clients')
+@click.option('--window', type=float, default=DEFAULT_WINDOW, help='budget window, seconds')
+@click.option('--reserve', type=int, default=0,
+              help='stop forwarding requests of a token when its remaining API rate limit drops to this value')
+@click.option('--max_age', type=float, default=0.0,
+              help='serve cached pages without revalidation for this many seconds')
+def main(host, port, upstream, budget, window, reserve, max_age):
+    """
+    Local caching proxy shared by many runs of the tool: identical in-flight requests are coalesced,
+    pages are cached and revalidated with ETag, and API requests are limited by a fleet-wide budget.
+    Point the tool at it with --api_url http://HOST:PORT or REPOSITORY_STATISTICS_API_URL.
+    """
+    state = ProxyState(upstream, Budget(budget, window, reserve), max_age)
+    server = make_server(state, host, port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
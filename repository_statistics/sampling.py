@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+"""
+repository_statistic.sampling
+~~~~~~~~~~~~~~~~~~~
+
+Модуль содержит режим оценки статистики по случайной выборке страниц.
+Первая страница загружается всегда: по ссылке rel="last" определяется общее количество страниц,
+а ее объекты учитываются точно. Из остальных страниц выбирается простая случайная выборка без возвращения,
+по которой значения экстраполируются с доверительным интервалом
+"""
+import math
+import random
+
+from functools import partial
+from typing import Callable, Optional
+
+import numpy as np
+
+from repository_statistics.httpclient import get_response_data, get_last_page
+from repository_statistics.sites.github import (count_issues, count_pulls, get_request_attributes_for_commits,
+                                                get_request_attributes_for_issues, get_request_attributes_for_pulls,
+                                                make_commits_table, make_items_table, NUM_RECORDS)
+from repository_statistics.structure import Params, PullRequests, Issues, Estimate, Sampling, ResultData
+from repository_statistics.table import ItemTable
+
+DEFAULT_BUDGET = 10
+MIN_SAMPLE = 2
+CONFIDENCE_Z = 1.96
+
+
+class PageSample:
+    """Выборка страниц одного списка: точная первая страница и случайные страницы из остальных"""
+
+    def __init__(self, first: ItemTable, pages: list, total_pages: int):
+        self.first = first
+        self.pages = pages
+        self.total_pages = total_pages
+
+    def estimate(self, measure: Callable[[ItemTable], float]) -> Estimate:
+        """
+        Оценка суммы measure по всем страницам списка
+        :param measure: значение, вычисляемое по таблице одной страницы
+        :return:
+        """
+        return estimate_total(
+            measure(self.first),
+            np.array([measure(page) for page in self.pages], dtype=float),
+            self.total_pages - 1
+        )
+
+
+def estimate_total(exact: float, sample: np.ndarray, population: int) -> Estimate:
+    """
+    Оценка суммы по генеральной совокупности population страниц по выборке sample
+    (с поправкой на конечность совокупности) плюс точно известное значение exact
+    :param exact:
+    :param sample:
+    :param population:
+    :return:
+    """
+    size = len(sample)
+    if size >= population:
+        return Estimate(exact + float(sample.sum()), 0.0, population + 1, population + 1)
+    if size < MIN_SAMPLE:
+        return Estimate(exact + population * float(sample.mean()) if size else float(exact), math.inf,
+                        size + 1, population + 1)
+    variance = population ** 2 * (1 - size / population) * sample.var(ddof=1) / size
+    return Estimate(
+        exact + population * float(sample.mean()),
+        CONFIDENCE_Z * math.sqrt(variance),
+        size + 1,
+        population + 1
+    )
+
+
+def sample_pages(
+        request_attributes: tuple,
+        make_table: Callable,
+        measure: Callable[[ItemTable], float],
+        budget: Optional[int],
+        target_error: Optional[float],
+        rng: random.Random
+) -> PageSample:
+    """
+    Загружает первую страницу и случайные страницы списка, пока не исчерпан бюджет запросов
+    или относительная погрешность оценки measure не станет меньше target_error
+    :param request_attributes:
+    :param make_table: функция построения таблицы из объектов страницы
+    :param measure: основная оцениваемая величина для проверки погрешности
+    :param budget: максимальное количество запросов (включая первую страницу)
+    :param target_error: целевая относительная погрешность (половина доверительного интервала / оценка)
+    :param rng:
+    :return:
+    """
+    url, parameters, headers = request_attributes
+    first_page = get_response_data(url, parameters, headers)
+    sample = PageSample(make_table(first_page.response_json or []), [], get_last_page(first_page.links or {}))
+    budget = budget or (None if target_error else DEFAULT_BUDGET)
+    for page in rng.sample(range(2, sample.total_pages + 1), sample.total_pages - 1):
+        if budget and len(sample.pages) + 1 >= budget:
+            break
+        if target_error and len(sample.pages) >= MIN_SAMPLE:
+            estimate = sample.estimate(measure)
+            if estimate.value and estimate.margin / estimate.value <= target_error:
+                break
+        response = get_response_data(url, {**parameters, 'page': str(page)}, headers)
+        sample.pages.append(make_table(response.response_json or []))
+    return sample
+
+
+def estimate_commits_by_author(sample: PageSample) -> list:
+    """
+    Оценка количества коммитов по авторам: [(логин, Estimate), ...] в порядке убывания оценки
+    :param sample:
+    :return:
+    """
+    authors = {}
+    for table in [sample.first, *sample.pages]:
+        for login in table.authors:
+            authors.setdefault(login, len(authors))
+    counts = np.zeros((len(authors), len(sample.pages) + 1))
+    for column, table in enumerate([sample.first, *sample.pages]):
+        for login, count in table.count_by_author(len(table.authors)):
+            counts[authors[login], column] = count
+    estimates = [
+        (login, estimate_total(counts[row, 0], counts[row, 1:], sample.total_pages - 1))
+        for login, row in authors.items()
+    ]
+    return sorted(estimates, key=lambda pair: -pair[1].value)[:NUM_RECORDS]
+
+
+def get_estimated_result_data(params: Params, seed: Optional[int] = None) -> ResultData:
+    """
+    Получает оценку результирующего набора данных по случайной выборке страниц
+    :param params:
+    :param seed: зерно генератора случайных чисел (для воспроизводимости)
+    :return:
+    """
+    rng = random.Random(seed)
+    samples = []
+
+    def _sample(request_attributes: tuple, make_table: Callable, measure: Callable) -> PageSample:
+        samples.append(sample_pages(request_attributes, make_table, measure,
+                                    params.sample_budget, params.target_error, rng))
+        return samples[-1]
+
+    dev_activity = pull_requests = issues = None
+    if params.dev_activity:
+        commits = _sample(get_request_attributes_for_commits(params), make_commits_table, len)
+        dev_activity = estimate_commits_by_author(commits)
+    if params.pull_requests:
+        count_all, count_old = partial(count_pulls, params), partial(count_pulls, params, is_old=True)
+        open_pulls = _sample(get_request_attributes_for_pulls(params, True), make_items_table, count_all)
+        closed_pulls = _sample(get_request_attributes_for_pulls(params, False), make_items_table, count_all)
+        pull_requests = PullRequests(
+            open_pulls.estimate(count_all),
+            closed_pulls.estimate(count_all),
+            open_pulls.estimate(count_old)
+        )
+    if params.issues:
+        count_all, count_old = partial(count_issues, params), partial(count_issues, params, is_old=True)
+        open_issues = _sample(get_request_attributes_for_issues(params, True), make_items_table, count_all)
+        closed_issues = _sample(get_request_attributes_for_issues(params, False), make_items_table, count_all)
+        issues = Issues(
+            open_issues.estimate(count_all),
+            closed_issues.estimate(count_all),
+            open_issues.estimate(count_old)
+        )
+
+    pages_sampled = sum(len(sample.pages) + 1 for sample in samples)
+    pages_total = sum(sample.total_pages for sample in samples)
+    return ResultData(
+        dev_activity,
+        pull_requests,
+        issues,
+        sampling=Sampling(pages_sampled, pages_total, CONFIDENCE_Z)
+    )
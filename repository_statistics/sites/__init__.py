@@ -1 +1,27 @@
+from importlib import import_module
+from typing import Optional
+from urllib.parse import urlparse
+
 from . import github
+
+# Хост репозитория -> модуль драйвера. Репозитории на других хостах обслуживаются драйвером github
+SITES = {"github.com": "github", "bitbucket.org": "bitbucket"}
+DEFAULT_SITE = "github"
+
+
+def get_driver(url: Optional[str] = None):
+    """
+    Драйвер сайта по адресу репозитория
+    :param url: None - драйвер github
+    :return:
+    """
+    host = urlparse(url or "").netloc.lower().removeprefix("www.")
+    return import_module(f"{__name__}.{SITES.get(host, DEFAULT_SITE)}").driver
+
+
+def get_drivers() -> list:
+    """
+    Драйверы всех поддерживаемых сайтов
+    :return:
+    """
+    return [import_module(f"{__name__}.{site}").driver for site in dict.fromkeys(SITES.values())]
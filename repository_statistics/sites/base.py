@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+
+"""
+repository_statistic.base
+~~~~~~~~~~~~~~~~~~~
+
+Модуль содержит интерфейс драйвера сайта и общий механизм загрузки списков.
+Драйвер описывает только особенности api: адреса и параметры запросов, заголовки, разбиение на страницы
+(заголовок Link или ссылка next в теле ответа), заголовки лимита запросов и проекцию полей объектов.
+Запросы, сессия, кэш страниц по ETag, трассировка и колоночные таблицы общие для всех драйверов
+"""
+from __future__ import annotations
+
+import re
+
+from abc import ABC, abstractmethod
+from collections.abc import Iterator, Mapping
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Optional, TYPE_CHECKING
+
+from repository_statistics.httpclient import get_response_data, get_next_pages
+from repository_statistics.structure import Params, RateLimit, ResponseData
+from repository_statistics.table import ItemTable, STATE_OPEN, STATE_PULL_REQUEST
+from repository_statistics.utils import get_date_from_str_without_time
+
+if TYPE_CHECKING:
+    from repository_statistics.identity import IdentityResolver
+
+NUM_DAYS_OLD_PULL_REQUESTS = 30
+NUM_DAYS_OLD_ISSUES = 14
+NUM_RECORDS = 30
+KINDS = ("commits", "open_pulls", "closed_pulls", "open_issues", "closed_issues")
+# Режимы, которые зависят от возможностей конкретного api (sketch накапливается по head ветки через compare)
+MODES = ("estimate", "workers", "incremental", "identities", "plan", "webhook", "sketch")
+
+_template_field = re.compile(r"\{(\w+)\}")
+
+
+@lru_cache(maxsize=None)
+def get_path_pattern(template: str) -> re.Pattern:
+    """
+    Регулярное выражение окончания пути запроса по шаблону пути endpoint: {repository} - владелец и имя
+    репозитория, остальные подстановки (ветка, коммит) - любая непустая строка, в том числе со слешами
+    :param template: например, "/repos/{repository}/compare/{base}...{head}"
+    :return:
+    """
+    parts = _template_field.split(template)
+    pattern = "".join(
+        re.escape(part) if index % 2 == 0 else ("[^/]+/[^/]+" if part == "repository" else ".+")
+        for index, part in enumerate(parts)
+    )
+    return re.compile(f"{pattern}$")
+
+
+class SiteDriver(ABC):
+    """
+    Драйвер сайта (абстрактный класс). Наследник задает name, endpoints (обязательны "limit" - проверка api_key,
+    "repository" - проверка репозитория и "branch" - проверка ветки), endpoint_paths (шаблоны путей тех же
+    endpoint относительно адреса api), get_headers, set_base_url, get_request_attributes и проекции объектов,
+    остальные методы при необходимости переопределяются.
+    has_merge_dates - сообщает ли api даты слияния pull requests (без них время до слияния не вычисляется)
+    """
+    name: str = ""
+    endpoints: dict = {}
+    endpoint_paths: dict = {}
+    modes: frozenset = frozenset()
+    has_merge_dates: bool = True
+
+    @abstractmethod
+    def set_base_url(self, url: Optional[str]):
+        """
+        Задает адрес api. None - адрес по умолчанию
+        :param url:
+        :return:
+        """
+
+    @abstractmethod
+    def get_headers(self, api_key: str) -> Mapping:
+        """
+        Заголовки запроса с авторизацией (только для чтения)
+        :param api_key:
+        :return:
+        """
+
+    def get_endpoint_family(self, path: str) -> Optional[str]:
+        """
+        Семейство endpoint (ключ endpoints) по пути запроса. None - путь не соответствует ни одному шаблону
+        :param path:
+        :return:
+        """
+        for family, template in self.endpoint_paths.items():
+            if get_path_pattern(template).search(path):
+                return family
+        return None
+
+    def get_api_key_check_url(self, url: Optional[str] = None) -> str:
+        """
+        Адрес запроса для проверки api_key. По умолчанию - endpoints["limit"]
+        :param url: адрес репозитория
+        :return:
+        """
+        return self.endpoints["limit"]()
+
+    @abstractmethod
+    def get_request_attributes(self, kind: str, params: Params) -> tuple:
+        """
+        Адрес, параметры и заголовки первой страницы списка
+        :param kind: один из KINDS
+        :param params:
+        :return:
+        """
+
+    def get_page_items(self, response_json) -> list:
+        """
+        Объекты страницы списка
+        :param response_json:
+        :return:
+        """
+        return response_json or []
+
+    def get_next_page(self, response_data: ResponseData) -> str:
+        """
+        Адрес следующей страницы (пустая строка, если страница последняя). По умолчанию - ссылка rel="next"
+        :param response_data:
+        :return:
+        """
+        return get_next_pages(response_data.links or {})
+
+    def get_rate_limit(self, headers) -> Optional[RateLimit]:
+        """
+        Состояние лимита запросов по заголовкам ответа. None - ответ не содержит сведений о лимите
+        :param headers:
+        :return:
+        """
+        remaining, reset = headers.get("X-RateLimit-Remaining"), headers.get("X-RateLimit-Reset")
+        if remaining is None:
+            return None
+        return RateLimit(int(remaining), datetime.fromtimestamp(int(reset)) if reset else None)
+
+    @abstractmethod
+    def project_commit(self, commit: dict) -> dict:
+        """
+        Запись о коммите: id, login, created_at
+        :param commit:
+        :return:
+        """
+
+    @abstractmethod
+    def project_item(self, item: dict) -> dict:
+        """
+        Запись о pull request или issue: id, login, state ("open" или "closed"), created_at, closed_at,
+        merged_at, is_pull_request
+        :param item:
+        :return:
+        """
+
+    def get_commit_email(self, commit: dict) -> Optional[str]:
+        """
+        Адрес автора коммита для разрешения авторов без учетной записи
+        :param commit:
+        :return:
+        """
+        return None
+
+    def iter_items(self, request_attributes: tuple) -> Iterator:
+        """
+        Формирует генератор объектов списка постранично
+        :param request_attributes:
+        :return:
+        """
+        url, parameters, headers = request_attributes
+        while url:
+            response_data = get_response_data(url, parameters, headers)
+            yield from self.get_page_items(response_data.response_json)
+            url, parameters = self.get_next_page(response_data), None
+
+    def fetch(self, kind: str, params: Params) -> Iterator:
+        """
+        Получает итератор по объектам списка
+        :param kind:
+        :param params:
+        :return:
+        """
+        return self.iter_items(self.get_request_attributes(kind, params))
+
+    def make_commits_table(self, commits: Iterator, resolver: Optional[IdentityResolver] = None) -> ItemTable:
+        """
+        Собирает таблицу коммитов по проекциям объектов
+        :param commits:
+        :param resolver:
+        :return:
+        """
+        created, flags, logins, emails = [], [], [], []
+        for commit in commits:
+            record = self.project_commit(commit)
+            created.append(record["created_at"])
+            flags.append(0)
+            logins.append(record["login"])
+            if resolver is not None:
+                emails.append(self.get_commit_email(commit))
+        if resolver is not None:
+            logins = resolver.resolve(logins, emails)
+        return ItemTable.from_columns(created, flags, logins)
+
+    def make_items_table(self, items: Iterator) -> ItemTable:
+        """
+        Собирает таблицу pull requests или issues по проекциям объектов
+        :param items:
+        :return:
+        """
+        created, flags, logins, closed, merged = [], [], [], [], []
+        for item in items:
+            record = self.project_item(item)
+            created.append(record["created_at"])
+            closed.append(record["closed_at"])
+            merged.append(record["merged_at"])
+            flags.append(
+                (STATE_OPEN if record["state"] == "open" else 0)
+                | (STATE_PULL_REQUEST if record["is_pull_request"] else 0)
+            )
+            logins.append(record["login"])
+        return ItemTable.from_columns(created, flags, logins, closed, merged)
+
+    def load_commits(self, params: Params, on_item: Optional[Callable] = None,
+                     resolver: Optional[IdentityResolver] = None) -> ItemTable:
+        """
+        Загружает коммиты в колоночную таблицу
+        :param params:
+        :param on_item: вызывается для каждого коммита: on_item("commits", запись)
+        :param resolver: None - коммиты без связанной учетной записи не учитываются
+        :return:
+        """
+        return self.make_commits_table(
+            emit_items(self.fetch("commits", params), on_item, "commits", self.project_commit), resolver)
+
+    def load_pulls(self, params: Params, is_open: bool, on_item: Optional[Callable] = None) -> ItemTable:
+        """
+        Загружает pull requests в колоночную таблицу
+        :param params:
+        :param is_open:
+        :param on_item: вызывается для каждого pull request: on_item("open_pulls" | "closed_pulls", запись)
+        :return:
+        """
+        kind = "open_pulls" if is_open else "closed_pulls"
+        return self.make_items_table(emit_items(self.fetch(kind, params), on_item, kind, self.project_item))
+
+    def load_issues(self, params: Params, is_open: bool, on_item: Optional[Callable] = None) -> ItemTable:
+        """
+        Загружает issues в колоночную таблицу
+        :param params:
+        :param is_open:
+        :param on_item: вызывается для каждой issue: on_item("open_issues" | "closed_issues", запись)
+        :return:
+        """
+        kind = "open_issues" if is_open else "closed_issues"
+        return self.make_items_table(emit_items(self.fetch(kind, params), on_item, kind, self.project_item))
+
+
+def get_modes(**params) -> list:
+    """
+    Режимы из MODES, включенные параметрами отчета (workers=0 - включенный режим, sketch="" - выключенный)
+    :param params:
+    :return:
+    """
+    return [mode for mode in MODES if params.get(mode) is not None and params.get(mode) is not False
+            and params.get(mode) != ""]
+
+
+def is_commit_in_period(params: Params, commit_date: Optional[str]) -> bool:
+    """
+    Попадает ли дата коммита в период отчета (как параметры since и until списка коммитов github).
+    Даты сравниваются строками ISO 8601 с точностью до секунды
+    :param params:
+    :param commit_date:
+    :return:
+    """
+    commit_date = (commit_date or "")[:19]
+    return not ((params.begin_date and commit_date < params.begin_date[:19])
+                or (params.end_date and commit_date > params.end_date[:19]))
+
+
+def emit_items(items: Iterator, on_item: Optional[Callable], kind: str, project: Callable) -> Iterator:
+    """
+    Передает объекты дальше без изменений, сообщая on_item проекцию каждого объекта
+    :param items:
+    :param on_item: None - объекты передаются без обработки
+    :param kind:
+    :param project:
+    :return:
+    """
+    if on_item is None:
+        return items
+
+    def _emit():
+        for item in items:
+            on_item(kind, project(item))
+            yield item
+
+    return _emit()
+
+
+def count_commits_by_author(commits: ItemTable) -> list:
+    """
+    Возвращает список кортежей со статистикой по типу [(логин автора, количество коммитов), ...]
+    :param commits:
+    :return:
+    """
+    return commits.count_by_author(NUM_RECORDS)
+
+
+def count_pulls(params: Params, pulls: ItemTable, is_old: bool = False) -> int:
+    """
+    Возвращает количество pull request из таблицы, попадающих в интервал дат отчета
+    :param params:
+    :param pulls:
+    :param is_old:
+    :return:
+    """
+    mask = pulls.window_mask(
+        get_date_from_str_without_time(params.begin_date),
+        get_date_from_str_without_time(params.end_date)
+    )
+    if is_old:
+        mask &= pulls.older_than_mask(NUM_DAYS_OLD_PULL_REQUESTS)
+    return pulls.count(mask)
+
+
+def count_issues(params: Params, issues: ItemTable, is_old: bool = False) -> int:
+    """
+    Возвращает количество issues (без pull requests) из таблицы, попадающих в интервал дат отчета
+    :param params:
+    :param issues:
+    :param is_old:
+    :return:
+    """
+    mask = issues.flag_mask(STATE_PULL_REQUEST, is_set=False) & issues.window_mask(
+        get_date_from_str_without_time(params.begin_date),
+        get_date_from_str_without_time(params.end_date)
+    )
+    if is_old:
+        mask &= issues.older_than_mask(NUM_DAYS_OLD_ISSUES)
+    return issues.count(mask)
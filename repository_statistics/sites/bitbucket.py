@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+
+"""
+repository_statistic.bitbucket
+~~~~~~~~~~~~~~~~~~~
+
+Модуль содержит специфичные для Bitbucket Cloud (api 2.0) функции и драйвер bitbucket.
+Списки разбиваются на страницы ссылкой next в теле ответа ({"values": [...], "pagelen": ..., "next": ...}),
+issues не содержат pull requests, а список коммитов ветки не фильтруется по датам на стороне api:
+коммиты отбираются по периоду на стороне клиента, а загрузка прекращается на первой странице,
+все коммиты которой старше начала периода. Даты закрытия и слияния pull requests api не сообщает,
+поэтому время до слияния для Bitbucket не вычисляется
+"""
+import os
+import re
+
+from collections.abc import Iterator, Mapping
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Optional
+
+from repository_statistics.httpclient import get_response_data
+from repository_statistics.sites.base import is_commit_in_period, SiteDriver
+from repository_statistics.structure import Params, RateLimit, ResponseData
+from repository_statistics.utils import get_last_parts_url
+
+ACCEPT = "application/json"
+PAGELEN = 100
+PULLS_PAGELEN = 50
+# X-RateLimit-NearLimit выставляется, когда остается меньше 20% лимита
+NEAR_LIMIT_SHARE = 0.2
+OPEN_PULL_STATES = ("OPEN",)
+CLOSED_PULL_STATES = ("MERGED", "DECLINED", "SUPERSEDED")
+OPEN_ISSUE_STATES = ("new", "open", "on hold")
+CLOSED_ISSUE_STATES = ("resolved", "invalid", "duplicate", "wontfix", "closed")
+DEFAULT_BASE_URL = "https://api.bitbucket.org/2.0"
+BASE_URL_ENV = "REPOSITORY_STATISTICS_BITBUCKET_API_URL"
+BASE_URL = (os.environ.get(BASE_URL_ENV) or DEFAULT_BASE_URL).rstrip("/")
+
+_raw_author_email = re.compile(r"<(?P<email>[^>]+)>")
+
+endpoints = {
+    "limit": lambda: f"{BASE_URL}/user",
+    "repository": lambda url: f"{BASE_URL}/repositories/{get_last_parts_url(url, 2)}",
+    "branch": lambda url, branch: f"{BASE_URL}/repositories/{get_last_parts_url(url, 2)}/refs/branches/{branch}",
+    "commits": lambda url, branch: f"{BASE_URL}/repositories/{get_last_parts_url(url, 2)}/commits/{branch}",
+    "pulls": lambda url: f"{BASE_URL}/repositories/{get_last_parts_url(url, 2)}/pullrequests",
+    "issues": lambda url: f"{BASE_URL}/repositories/{get_last_parts_url(url, 2)}/issues"
+}
+
+# Шаблоны путей endpoints относительно адреса api: по ним трассировка определяет семейство запроса
+endpoint_paths = {
+    "limit": "/user",
+    "repository": "/repositories/{repository}",
+    "branch": "/repositories/{repository}/refs/branches/{branch}",
+    "commits": "/repositories/{repository}/commits/{branch}",
+    "pulls": "/repositories/{repository}/pullrequests",
+    "issues": "/repositories/{repository}/issues"
+}
+
+
+def set_base_url(url: Optional[str]):
+    """
+    Задает адрес api. None - адрес из переменной окружения REPOSITORY_STATISTICS_BITBUCKET_API_URL
+    или https://api.bitbucket.org/2.0
+    :param url:
+    :return:
+    """
+    global BASE_URL
+    BASE_URL = (url or os.environ.get(BASE_URL_ENV) or DEFAULT_BASE_URL).rstrip("/")
+
+
+@lru_cache(maxsize=64)
+def get_headers(api_key: str) -> Mapping:
+    """
+    Формирует заголовок запроса (api_key - access token). Заголовки кэшируются по api_key
+    и возвращаются только для чтения
+    :param api_key:
+    :return:
+    """
+    return MappingProxyType({'Accept': ACCEPT, 'Authorization': f'Bearer {api_key}'})
+
+
+def get_query_by_states(states: tuple) -> str:
+    """
+    Условие фильтра q по нескольким состояниям
+    :param states:
+    :return:
+    """
+    return " OR ".join(f'state="{state}"' for state in states)
+
+
+def get_request_attributes_for_commits(params: Params) -> tuple:
+    """
+    Адрес, параметры и заголовки первой страницы коммитов ветки
+    :param params:
+    :return:
+    """
+    url = endpoints["commits"](params.url, params.branch)
+    parameters = {'pagelen': str(PAGELEN)}
+    headers = get_headers(params.api_key)
+    return url, parameters, headers
+
+
+def get_request_attributes_for_pulls(params: Params, is_open: bool) -> tuple:
+    """
+    Адрес, параметры и заголовки первой страницы pull requests в ветку отчета.
+    Параметр state повторяется для каждого состояния
+    :param params:
+    :param is_open:
+    :return:
+    """
+    url = endpoints["pulls"](params.url)
+    parameters = {
+        'state': OPEN_PULL_STATES if is_open else CLOSED_PULL_STATES,
+        'q': f'destination.branch.name="{params.branch}"',
+        'pagelen': str(PULLS_PAGELEN)
+    }
+    headers = get_headers(params.api_key)
+    return url, parameters, headers
+
+
+def get_request_attributes_for_issues(params: Params, is_open: bool) -> tuple:
+    """
+    Адрес, параметры и заголовки первой страницы issues
+    :param params:
+    :param is_open:
+    :return:
+    """
+    url = endpoints["issues"](params.url)
+    parameters = {
+        'q': get_query_by_states(OPEN_ISSUE_STATES if is_open else CLOSED_ISSUE_STATES),
+        'pagelen': str(PAGELEN)
+    }
+    headers = get_headers(params.api_key)
+    return url, parameters, headers
+
+
+def project_commit(commit: dict) -> dict:
+    """
+    Запись о коммите для построчного вывода
+    :param commit:
+    :return:
+    """
+    return {
+        "id": commit.get("hash"),
+        "login": ((commit.get("author") or {}).get("user") or {}).get("nickname"),
+        "created_at": commit.get("date"),
+    }
+
+
+def project_item(item: dict) -> dict:
+    """
+    Запись о pull request или issue для построчного вывода. Bitbucket не сообщает даты закрытия и слияния
+    (updated_on меняется и после закрытия, например от комментариев), поэтому они не заполняются
+    :param item:
+    :return:
+    """
+    is_pull_request = item.get("type") == "pullrequest"
+    is_open = item.get("state") in (OPEN_PULL_STATES if is_pull_request else OPEN_ISSUE_STATES)
+    return {
+        "id": item.get("id"),
+        "login": (item.get("author" if is_pull_request else "reporter") or {}).get("nickname"),
+        "state": "open" if is_open else "closed",
+        "created_at": item.get("created_on"),
+        "closed_at": None,
+        "merged_at": None,
+        "is_pull_request": is_pull_request,
+    }
+
+
+class BitbucketDriver(SiteDriver):
+    """Драйвер Bitbucket Cloud: страницы по ссылке next в теле ответа, лимит по X-RateLimit-NearLimit"""
+    name = "bitbucket"
+    endpoints = endpoints
+    endpoint_paths = endpoint_paths
+    has_merge_dates = False
+
+    def set_base_url(self, url: Optional[str]):
+        set_base_url(url)
+
+    def get_headers(self, api_key: str) -> Mapping:
+        return get_headers(api_key)
+
+    def get_api_key_check_url(self, url: Optional[str] = None) -> str:
+        """
+        Токены доступа репозитория и рабочего пространства не дают доступа к /user,
+        поэтому api_key проверяется запросом репозитория
+        :param url:
+        :return:
+        """
+        return endpoints["repository"](url) if url else endpoints["limit"]()
+
+    def get_request_attributes(self, kind: str, params: Params) -> tuple:
+        if kind == "commits":
+            return get_request_attributes_for_commits(params)
+        if kind.endswith("pulls"):
+            return get_request_attributes_for_pulls(params, kind == "open_pulls")
+        return get_request_attributes_for_issues(params, kind == "open_issues")
+
+    def get_page_items(self, response_json) -> list:
+        return (response_json or {}).get("values") or []
+
+    def get_next_page(self, response_data: ResponseData) -> str:
+        return (response_data.response_json or {}).get("next") or ""
+
+    def get_rate_limit(self, headers) -> Optional[RateLimit]:
+        """
+        Bitbucket не сообщает остаток лимита: без X-RateLimit-NearLimit остаток оценивается сверху
+        лимитом X-RateLimit-Limit, с ним - долей NEAR_LIMIT_SHARE лимита. Время сброса не сообщается
+        :param headers:
+        :return:
+        """
+        if headers.get("X-RateLimit-Remaining") is not None:
+            return super().get_rate_limit(headers)
+        limit = headers.get("X-RateLimit-Limit")
+        if limit is None:
+            return None
+        is_near_limit = headers.get("X-RateLimit-NearLimit", "").lower() == "true"
+        return RateLimit(int(int(limit) * NEAR_LIMIT_SHARE) if is_near_limit else int(limit), None)
+
+    def project_commit(self, commit: dict) -> dict:
+        return project_commit(commit)
+
+    def project_item(self, item: dict) -> dict:
+        return project_item(item)
+
+    def get_commit_email(self, commit: dict) -> Optional[str]:
+        match = _raw_author_email.search((commit.get("author") or {}).get("raw") or "")
+        return match.group("email") if match else None
+
+    def fetch(self, kind: str, params: Params) -> Iterator:
+        if kind == "commits" and (params.begin_date or params.end_date):
+            return self.iter_commits_in_period(params)
+        return super().fetch(kind, params)
+
+    def iter_commits_in_period(self, params: Params) -> Iterator:
+        """
+        Коммиты ветки за период отчета. Список идет от новых коммитов к старым,
+        поэтому загрузка прекращается на странице, все коммиты которой старше начала периода
+        :param params:
+        :return:
+        """
+        url, parameters, headers = get_request_attributes_for_commits(params)
+        while url:
+            response_data = get_response_data(url, parameters, headers)
+            commits = self.get_page_items(response_data.response_json)
+            yield from (commit for commit in commits if is_commit_in_period(params, commit.get("date")))
+            if params.begin_date and commits and all(
+                    (commit.get("date") or "")[:19] < params.begin_date[:19] for commit in commits):
+                return
+            url, parameters = self.get_next_page(response_data), None
+
+
+driver = BitbucketDriver()
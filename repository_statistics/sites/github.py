@@ -4,52 +4,79 @@
 repository_statistic.github
 ~~~~~~~~~~~~~~~~~~~
 
-Модуль содержит специфичные для github функции
+Модуль содержит специфичные для github функции и драйвер github
 """
-from collections import Counter
-from collections.abc import Iterator
-from functools import partial
+from __future__ import annotations
+
+import os
+
+from collections.abc import Iterator, Mapping
+from typing import Callable, Optional, TYPE_CHECKING
+from functools import lru_cache
+from types import MappingProxyType
 
 from repository_statistics.structure import Params
-from repository_statistics.utils import get_date_from_str_without_time, in_interval, get_last_parts_url, to_compare_with_current_date
-from repository_statistics.httpclient import get_response_content_with_pagination
+from repository_statistics.utils import get_last_parts_url
+# Общие для всех сайтов расчеты остаются доступны и из этого модуля
+from repository_statistics.sites.base import (SiteDriver, MODES, NUM_RECORDS, NUM_DAYS_OLD_PULL_REQUESTS,
+                                              NUM_DAYS_OLD_ISSUES, count_commits_by_author, count_issues, count_pulls,
+                                              emit_items)
+from repository_statistics.table import ItemTable, STATE_OPEN, STATE_PULL_REQUEST
+
+if TYPE_CHECKING:
+    from repository_statistics.identity import IdentityResolver
 
 ACCEPT = "application/vnd.github.v3+json"
 PER_PAGE = 100
-NUM_DAYS_OLD_PULL_REQUESTS = 30
-NUM_DAYS_OLD_ISSUES = 14
-NUM_RECORDS = 30
-BASE_URL = "https://api.github.com"
+DEFAULT_BASE_URL = "https://api.github.com"
+BASE_URL_ENV = "REPOSITORY_STATISTICS_API_URL"
+BASE_URL = (os.environ.get(BASE_URL_ENV) or DEFAULT_BASE_URL).rstrip("/")
 
 endpoints = {
-    "limit": f"{BASE_URL}/rate_limit",
+    "limit": lambda: f"{BASE_URL}/rate_limit",
+    "graphql": lambda: f"{BASE_URL}/graphql",
+    "repository": lambda url: f"{BASE_URL}/repos/{get_last_parts_url(url, 2)}",
     "branch": lambda url, branch: f"{BASE_URL}/repos/{get_last_parts_url(url, 2)}/branches/{branch}",
     "commits": lambda url: f"{BASE_URL}/repos/{get_last_parts_url(url, 2)}/commits",
+    "compare": lambda url, base, head: f"{BASE_URL}/repos/{get_last_parts_url(url, 2)}/compare/{base}...{head}",
     "pulls": lambda url: f"{BASE_URL}/repos/{get_last_parts_url(url, 2)}/pulls",
     "issues": lambda url: f"{BASE_URL}/repos/{get_last_parts_url(url, 2)}/issues"
 
 }
 
-
-_is_create_date_gt_required_pulls = partial(
-        to_compare_with_current_date,
-        NUM_DAYS_OLD_PULL_REQUESTS
-    )
+# Шаблоны путей endpoints относительно адреса api: по ним трассировка определяет семейство запроса
+endpoint_paths = {
+    "limit": "/rate_limit",
+    "graphql": "/graphql",
+    "repository": "/repos/{repository}",
+    "branch": "/repos/{repository}/branches/{branch}",
+    "commits": "/repos/{repository}/commits",
+    "compare": "/repos/{repository}/compare/{base}...{head}",
+    "pulls": "/repos/{repository}/pulls",
+    "issues": "/repos/{repository}/issues"
+}
 
 
-_is_create_date_gt_required_issues = partial(
-        to_compare_with_current_date,
-        NUM_DAYS_OLD_ISSUES
-    )
+def set_base_url(url: Optional[str]):
+    """
+    Задает адрес api (например, локального кэширующего прокси).
+    None - адрес из переменной окружения REPOSITORY_STATISTICS_API_URL или https://api.github.com
+    :param url:
+    :return:
+    """
+    global BASE_URL
+    BASE_URL = (url or os.environ.get(BASE_URL_ENV) or DEFAULT_BASE_URL).rstrip("/")
 
 
-def get_headers(api_key: str) -> dict:
+@lru_cache(maxsize=64)
+def get_headers(api_key: str) -> Mapping:
     """
-    Формирует заголовок запроса
+    Формирует заголовок запроса. Заголовки кэшируются по api_key и возвращаются только для чтения,
+    для дополнительных заголовков создается новый словарь: {**get_headers(api_key), ...}
     :param api_key:
     :return:
     """
-    return {'Accept': ACCEPT, 'Authorization': f'Token {api_key}'}
+    return MappingProxyType({'Accept': ACCEPT, 'Authorization': f'Token {api_key}'})
 
 
 def get_url_parameters_for_commits(params: Params) -> dict:
@@ -137,88 +164,157 @@ def get_request_attributes_for_issues(params: Params, is_open: bool) -> tuple:
     return url, parameters, headers
 
 
-def count_commits_by_author(params: Params) -> list:
+def fetch_authors(params: Params) -> Iterator:
+    """
+    Получает итератор по коммитам, у которых известен автор
+    :param params:
+    :return:
+    """
+    return filter(lambda c: bool(c.get("author")), fetch_commits(params))
+
+
+def fetch_commits(params: Params) -> Iterator:
     """
-    Возвращает список кортежей со статистикой по типу [(логин автора, количество коммитов), ...]
+    Получает итератор по коммитам
     :param params:
     :return:
     """
-    return Counter(map(lambda c: c.get("author").get("login"), fetch_authors(params))).most_common(NUM_RECORDS)
+    return driver.iter_items(get_request_attributes_for_commits(params))
 
 
-def count_pulls(params: Params, is_open: bool, is_old: bool = False) -> int:
+def fetch_pulls(params: Params, is_open: bool) -> Iterator:
     """
-    Возвращает количество pull request
+    Получает итератор по pull requests
     :param params:
     :param is_open:
-    :param is_old:
     :return:
     """
-    return sum(map(lambda pr: 1, fetch_pulls(params, is_open, is_old)))
+    return driver.iter_items(get_request_attributes_for_pulls(params, is_open))
 
 
-def count_issues(params: Params, is_open: bool, is_old: bool = False) -> int:
+def fetch_issues(params: Params, is_open: bool) -> Iterator:
     """
-    Возвращает количество issues
+    Получает итератор по issues (включая связанные с ними pull requests)
     :param params:
     :param is_open:
-    :param is_old:
     :return:
     """
-    return sum(map(lambda pr: 1, fetch_issues(params, is_open, is_old)))
+    return driver.iter_items(get_request_attributes_for_issues(params, is_open))
 
 
-def fetch_authors(params: Params) -> Iterator:
+def load_commits(params: Params, on_item: Optional[Callable] = None,
+                 resolver: Optional[IdentityResolver] = None) -> ItemTable:
     """
-    Получает список логинов авторов коммитов
+    Загружает коммиты в колоночную таблицу
     :param params:
+    :param on_item: вызывается для каждого коммита: on_item("commits", запись)
+    :param resolver: None - коммиты без связанной учетной записи не учитываются
     :return:
     """
-    return filter(
-        lambda c: bool(c.get("author")),
-        get_response_content_with_pagination(get_request_attributes_for_commits(params))
-    )
+    return driver.load_commits(params, on_item, resolver)
 
 
-def fetch_pulls(params: Params, is_open: bool, is_old: bool) -> Iterator:
+def make_commits_table(commits: Iterator, resolver: Optional[IdentityResolver] = None) -> ItemTable:
     """
-    Получает итератор по pull requests
+    Собирает таблицу коммитов за один проход по объектам.
+    С resolver авторы приводятся к основным логинам, а коммиты без связанной учетной записи
+    определяются по email автора
+    :param commits:
+    :param resolver:
+    :return:
+    """
+    created, flags, logins, emails = [], [], [], []
+    for commit in commits:
+        author = commit.get("commit", {}).get("author", {})
+        created.append(author.get("date"))
+        flags.append(0)
+        logins.append((commit.get("author") or {}).get("login"))
+        if resolver is not None:
+            emails.append(author.get("email"))
+    if resolver is not None:
+        logins = resolver.resolve(logins, emails)
+    return ItemTable.from_columns(created, flags, logins)
+
+
+def load_pulls(params: Params, is_open: bool, on_item: Optional[Callable] = None) -> ItemTable:
+    """
+    Загружает pull requests в колоночную таблицу
     :param params:
     :param is_open:
-    :param is_old:
+    :param on_item: вызывается для каждого pull request: on_item("open_pulls" | "closed_pulls", запись)
     :return:
     """
-    _in_interval = partial(
-        in_interval,
-        get_date_from_str_without_time(params.begin_date),
-        get_date_from_str_without_time(params.end_date)
-    )
-    return filter(
-        lambda pr: (_in_interval(get_date_from_str_without_time(pr.get("created_at")))
-                    and (_is_create_date_gt_required_pulls(pr.get("created_at")) if is_old else True)),
-        get_response_content_with_pagination(get_request_attributes_for_pulls(params, is_open))
-    )
+    return driver.load_pulls(params, is_open, on_item)
 
 
-def fetch_issues(params: Params, is_open: bool, is_old: bool) -> Iterator:
+def load_issues(params: Params, is_open: bool, on_item: Optional[Callable] = None) -> ItemTable:
     """
-    Получает итератор по issues
+    Загружает issues в колоночную таблицу
     :param params:
     :param is_open:
-    :param is_old:
+    :param on_item: вызывается для каждой issue: on_item("open_issues" | "closed_issues", запись)
     :return:
     """
-    _in_interval = partial(
-        in_interval,
-        get_date_from_str_without_time(params.begin_date),
-        get_date_from_str_without_time(params.end_date)
-    )
-    return filter(
-        lambda issue: (is_item_an_issue(issue)
-                       and _in_interval(get_date_from_str_without_time(issue.get("created_at")))
-                       and (_is_create_date_gt_required_issues(issue.get("created_at")) if is_old else True)),
-        get_response_content_with_pagination(get_request_attributes_for_issues(params, is_open))
-    )
+    return driver.load_issues(params, is_open, on_item)
+
+
+def project_commit(commit: dict) -> dict:
+    """
+    Запись о коммите для построчного вывода
+    :param commit:
+    :return:
+    """
+    return {
+        "id": commit.get("sha"),
+        "login": (commit.get("author") or {}).get("login"),
+        "created_at": commit.get("commit", {}).get("author", {}).get("date"),
+    }
+
+
+def get_commit_date(commit: dict) -> Optional[str]:
+    """
+    Дата коммиттера, по которой фильтруют параметры since и until списка коммитов (без нее - дата автора)
+    :param commit:
+    :return:
+    """
+    details = commit.get("commit") or {}
+    return (details.get("committer") or details.get("author") or {}).get("date")
+
+
+def project_item(item: dict) -> dict:
+    """
+    Запись о pull request или issue для построчного вывода
+    :param item:
+    :return:
+    """
+    return {
+        "id": item.get("number"),
+        "login": (item.get("user") or {}).get("login"),
+        "state": item.get("state"),
+        "created_at": item.get("created_at"),
+        "closed_at": item.get("closed_at"),
+        "merged_at": item.get("merged_at"),
+        "is_pull_request": not is_item_an_issue(item),
+    }
+
+
+def make_items_table(items: Iterator) -> ItemTable:
+    """
+    Собирает таблицу pull requests или issues за один проход по объектам
+    :param items:
+    :return:
+    """
+    created, flags, logins, closed, merged = [], [], [], [], []
+    for item in items:
+        created.append(item.get("created_at"))
+        closed.append(item.get("closed_at"))
+        merged.append(item.get("merged_at"))
+        flags.append(
+            (STATE_OPEN if item.get("state") == "open" else 0)
+            | (0 if is_item_an_issue(item) else STATE_PULL_REQUEST)
+        )
+        logins.append((item.get("user") or {}).get("login"))
+    return ItemTable.from_columns(created, flags, logins, closed, merged)
 
 
 def is_item_an_issue(obj_search: dict) -> bool:
@@ -228,3 +324,43 @@ def is_item_an_issue(obj_search: dict) -> bool:
     :return:
     """
     return not ("issue" in obj_search.get("url") and obj_search.get("pull_request"))
+
+
+class GitHubDriver(SiteDriver):
+    """Драйвер github: страницы по заголовку Link, лимит по заголовкам X-RateLimit-*"""
+    name = "github"
+    endpoints = endpoints
+    endpoint_paths = endpoint_paths
+    modes = frozenset(MODES)
+
+    def set_base_url(self, url: Optional[str]):
+        set_base_url(url)
+
+    def get_headers(self, api_key: str) -> Mapping:
+        return get_headers(api_key)
+
+    def get_request_attributes(self, kind: str, params: Params) -> tuple:
+        if kind == "commits":
+            return get_request_attributes_for_commits(params)
+        if kind.endswith("pulls"):
+            return get_request_attributes_for_pulls(params, kind == "open_pulls")
+        return get_request_attributes_for_issues(params, kind == "open_issues")
+
+    def project_commit(self, commit: dict) -> dict:
+        return project_commit(commit)
+
+    def project_item(self, item: dict) -> dict:
+        return project_item(item)
+
+    def get_commit_email(self, commit: dict) -> Optional[str]:
+        return commit.get("commit", {}).get("author", {}).get("email")
+
+    # Таблицы собираются напрямую из объектов github, без промежуточных записей
+    def make_commits_table(self, commits: Iterator, resolver: Optional[IdentityResolver] = None) -> ItemTable:
+        return make_commits_table(commits, resolver)
+
+    def make_items_table(self, items: Iterator) -> ItemTable:
+        return make_items_table(items)
+
+
+driver = GitHubDriver()
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+
+"""
+repository_statistic.sketches
+~~~~~~~~~~~~~~~~~~~
+
+Модуль содержит потоковые скетчи с ограниченным объемом памяти для статистики по авторам коммитов:
+Space-Saving для top-N авторов и HyperLogLog для количества уникальных авторов.
+Скетчи объединяются между репозиториями и запусками и сериализуются в json.
+Для каждого репозитория и ветки скетч хранит sha учтенного head ветки,
+поэтому повторный запуск добавляет только коммиты, появившиеся в ветке после него
+"""
+import base64
+import hashlib
+import heapq
+import math
+
+from typing import Optional
+
+import numpy as np
+
+from repository_statistics.structure import Contributors
+from repository_statistics.table import ItemTable, NO_AUTHOR
+from repository_statistics.utils import load_json, save_json
+
+SPACE_SAVING_CAPACITY = 1000
+HYPERLOGLOG_PRECISION = 14
+
+
+class SpaceSaving:
+    """
+    Сводка Space-Saving: хранит не более capacity счетчиков.
+    Оценка количества любого элемента завышена не более чем на его error, а error не превосходит total / capacity.
+    Минимальный счетчик ищется по куче (count, элемент) с отложенным удалением устаревших записей,
+    поэтому вытеснение занимает O(log capacity)
+    """
+
+    def __init__(self, capacity: int = SPACE_SAVING_CAPACITY):
+        self.capacity = capacity
+        self.total = 0
+        self.counters = {}
+        self._heap = []
+
+    def update(self, item: str, count: int = 1):
+        """
+        Учитывает count появлений элемента item
+        :param item:
+        :param count:
+        :return:
+        """
+        self.total += count
+        if item in self.counters:
+            self.counters[item][0] += count
+        elif len(self.counters) < self.capacity:
+            self.counters[item] = [count, 0]
+        else:
+            minimum = self._pop_minimum()
+            self.counters[item] = [minimum + count, minimum]
+        heapq.heappush(self._heap, (self.counters[item][0], item))
+        if len(self._heap) > 4 * self.capacity:
+            self._rebuild_heap()
+
+    def _pop_minimum(self) -> int:
+        """
+        Удаляет элемент с минимальным счетчиком и возвращает этот счетчик.
+        Записи кучи, не совпадающие с текущим счетчиком элемента, устарели и пропускаются
+        :return:
+        """
+        while True:
+            count, item = heapq.heappop(self._heap)
+            if item in self.counters and self.counters[item][0] == count:
+                del self.counters[item]
+                return count
+
+    def _rebuild_heap(self):
+        self._heap = [(count, item) for item, (count, _) in self.counters.items()]
+        heapq.heapify(self._heap)
+
+    def merge(self, other: "SpaceSaving") -> "SpaceSaving":
+        """
+        Объединяет сводку с другой сводкой (алгоритм слияния Agarwal et al.), сохраняя гарантию точности
+        :param other:
+        :return:
+        """
+        own_minimum = self._minimum()
+        other_minimum = other._minimum()
+        merged = {}
+        for item in self.counters.keys() | other.counters.keys():
+            count, error = self.counters.get(item, [own_minimum, own_minimum])
+            other_count, other_error = other.counters.get(item, [other_minimum, other_minimum])
+            merged[item] = [count + other_count, error + other_error]
+        self.capacity = max(self.capacity, other.capacity)
+        self.total += other.total
+        self.counters = dict(sorted(merged.items(), key=lambda pair: -pair[1][0])[:self.capacity])
+        self._rebuild_heap()
+        return self
+
+    def top(self, num_records: int) -> list:
+        """
+        Возвращает список кортежей [(элемент, оценка количества, максимальная ошибка), ...]
+        :param num_records:
+        :return:
+        """
+        return [
+            (item, count, error)
+            for item, (count, error) in sorted(self.counters.items(), key=lambda pair: -pair[1][0])[:num_records]
+        ]
+
+    def _minimum(self) -> int:
+        """
+        Минимальный счетчик заполненной сводки (для незаполненной - 0)
+        :return:
+        """
+        return min(count for count, _ in self.counters.values()) if len(self.counters) >= self.capacity else 0
+
+    def to_dict(self) -> dict:
+        return {"capacity": self.capacity, "total": self.total, "counters": self.counters}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SpaceSaving":
+        summary = cls(data["capacity"])
+        summary.total = data["total"]
+        summary.counters = {item: list(value) for item, value in data["counters"].items()}
+        summary._rebuild_heap()
+        return summary
+
+
+class HyperLogLog:
+    """
+    Скетч HyperLogLog для оценки количества уникальных элементов.
+    Относительная стандартная ошибка равна 1.04 / sqrt(2 ** precision)
+    """
+
+    def __init__(self, precision: int = HYPERLOGLOG_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, item: str):
+        """
+        Добавляет элемент в скетч
+        :param item:
+        :return:
+        """
+        value = int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=8).digest(), "big")
+        index = value >> (64 - self.precision)
+        rest = value & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """
+        Объединяет скетч с другим скетчем той же точности
+        :param other:
+        :return:
+        """
+        if other.precision != self.precision:
+            raise ValueError("Объединять можно только скетчи HyperLogLog одинаковой точности.")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> int:
+        """
+        Оценка количества уникальных элементов
+        :return:
+        """
+        size = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / size) * size * size / np.sum(np.ldexp(1.0, -self.registers.astype(int)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * size and zeros:
+            estimate = size * math.log(size / zeros)
+        return int(round(estimate))
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def to_dict(self) -> dict:
+        return {"precision": self.precision, "registers": base64.b64encode(self.registers.tobytes()).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "HyperLogLog":
+        sketch = cls(data["precision"])
+        sketch.registers = np.frombuffer(base64.b64decode(data["registers"]), dtype=np.uint8).copy()
+        return sketch
+
+
+class ContributorSketch:
+    """
+    Скетч статистики авторов коммитов: top-N авторов, количество уникальных авторов и учтенные head веток
+    {репозиторий#ветка: [sha head, дата коммиттера самого нового учтенного коммита]}
+    """
+
+    def __init__(self, top: Optional[SpaceSaving] = None, distinct: Optional[HyperLogLog] = None,
+                 heads: Optional[dict] = None):
+        self.top = top or SpaceSaving()
+        self.distinct = distinct or HyperLogLog()
+        self.heads = heads if heads is not None else {}
+
+    def add(self, login: str, count: int = 1):
+        """
+        Учитывает count коммитов автора
+        :param login:
+        :param count:
+        :return:
+        """
+        self.top.update(login, count)
+        self.distinct.add(login)
+
+    def update(self, commits: ItemTable):
+        """
+        Учитывает коммиты из таблицы
+        :param commits:
+        :return:
+        """
+        counts = np.bincount(commits.author[commits.author != NO_AUTHOR], minlength=len(commits.authors))
+        for login, count in zip(commits.authors, counts):
+            self.add(login, int(count))
+
+    def merge(self, other: "ContributorSketch") -> "ContributorSketch":
+        """
+        Объединяет скетч со скетчем другого репозитория или другой части выборки.
+        Для ветки, учтенной в обоих скетчах, сохраняется head этого скетча
+        :param other:
+        :return:
+        """
+        self.top.merge(other.top)
+        self.distinct.merge(other.distinct)
+        for key, head in other.heads.items():
+            self.heads.setdefault(key, head)
+        return self
+
+    def get_contributors(self, num_records: int) -> Contributors:
+        """
+        Возвращает оценки статистики авторов вместе с их точностью
+        :param num_records:
+        :return:
+        """
+        return Contributors(
+            self.top.top(num_records),
+            self.top.total,
+            self.top.total // self.top.capacity,
+            self.distinct.count(),
+            self.distinct.relative_error
+        )
+
+    def to_dict(self) -> dict:
+        return {"top": self.top.to_dict(), "distinct": self.distinct.to_dict(), "heads": self.heads}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ContributorSketch":
+        return cls(SpaceSaving.from_dict(data["top"]), HyperLogLog.from_dict(data["distinct"]),
+                   dict(data.get("heads") or {}))
+
+
+def load_sketch(path: str) -> ContributorSketch:
+    """
+    Загружает скетч из файла или создает пустой, если файла нет
+    :param path:
+    :return:
+    """
+    data = load_json(path)
+    return ContributorSketch.from_dict(data) if data else ContributorSketch()
+
+
+def save_sketch(path: str, sketch: ContributorSketch):
+    """
+    Сохраняет скетч в файл
+    :param path:
+    :param sketch:
+    :return:
+    """
+    save_json(path, sketch.to_dict())
@@ -6,9 +6,16 @@ repository_statistic.structure
 
 Модуль содержит структуры данных, используемые в проекте
 """
-from typing import NamedTuple, Optional
+from __future__ import annotations
+
+from typing import NamedTuple, Optional, TYPE_CHECKING
 from datetime import datetime
 
+if TYPE_CHECKING:
+    import numpy as np
+
+    from repository_statistics.table import ItemTable
+
 
 class Params(NamedTuple):
     """Параметры отчета"""
@@ -20,6 +27,16 @@ class Params(NamedTuple):
     dev_activity: bool
     pull_requests: bool
     issues: bool
+    metrics: bool = False
+    sketch: Optional[str] = None
+    estimate: bool = False
+    sample_budget: Optional[int] = None
+    target_error: Optional[float] = None
+    plan: bool = False
+    identities: bool = False
+    aliases: Optional[str] = None
+    workers: Optional[int] = None
+    incremental: bool = False
 
 
 class PullRequests(NamedTuple):
@@ -36,11 +53,91 @@ class Issues(NamedTuple):
     old_issues: int
 
 
+class CommitsPerWeek(NamedTuple):
+    """Количество коммитов по неделям: counts[i, j] - коммиты автора authors[i] за неделю weeks[j]"""
+    weeks: np.ndarray
+    authors: list
+    counts: np.ndarray
+
+
+class Distribution(NamedTuple):
+    """Перцентили распределения длительностей в секундах"""
+    percentiles: np.ndarray
+    values: np.ndarray
+    size: int
+
+
+class Histogram(NamedTuple):
+    """Гистограмма: counts[i] - количество значений в полуинтервале [bin_edges[i]; bin_edges[i + 1])"""
+    bin_edges: np.ndarray
+    counts: np.ndarray
+
+
+class Metrics(NamedTuple):
+    """Временные ряды и распределения, вычисленные по уже загруженным данным"""
+    commits_per_week: Optional[CommitsPerWeek]
+    pull_requests_time_to_merge: Optional[Distribution]
+    open_issues_age: Optional[Histogram]
+
+
+class Contributors(NamedTuple):
+    """
+    Оценка статистики авторов коммитов по скетчам.
+    top - [(логин, оценка количества коммитов, максимальное завышение оценки), ...],
+    max_error - общая граница завышения оценок, distinct_relative_error - стандартная относительная ошибка distinct
+    """
+    top: list[tuple]
+    total_commits: int
+    max_error: int
+    distinct: int
+    distinct_relative_error: float
+
+
+class Estimate(NamedTuple):
+    """Оценка значения по выборке страниц: value ± margin (половина доверительного интервала)"""
+    value: float
+    margin: float
+    pages_sampled: int
+    pages_total: int
+
+    @property
+    def sampling_fraction(self) -> float:
+        return self.pages_sampled / self.pages_total
+
+
+class Sampling(NamedTuple):
+    """Сводка по выборке страниц в режиме оценки"""
+    pages_sampled: int
+    pages_total: int
+    confidence_z: float
+
+    @property
+    def sampling_fraction(self) -> float:
+        return self.pages_sampled / self.pages_total if self.pages_total else 1.0
+
+
+class Tables(NamedTuple):
+    """Загруженные колоночные таблицы объектов"""
+    commits: Optional[ItemTable]
+    open_pulls: Optional[ItemTable]
+    closed_pulls: Optional[ItemTable]
+    open_issues: Optional[ItemTable]
+    closed_issues: Optional[ItemTable]
+
+
 class ResultData(NamedTuple):
-    """Результирующий набор данных"""
+    """
+    Результирующий набор данных.
+    unresolved_commits - коммиты без учетной записи, адреса авторов которых не проверены из-за лимита запросов
+    и которые не учтены в dev_activity (больше нуля - статистика авторов неполна)
+    """
     dev_activity: Optional[list[tuple]]
     pull_requests: Optional[PullRequests]
     issues: Optional[Issues]
+    metrics: Optional[Metrics] = None
+    contributors: Optional[Contributors] = None
+    sampling: Optional[Sampling] = None
+    unresolved_commits: Optional[int] = None
 
 
 class ResponseData(NamedTuple):
@@ -52,9 +149,44 @@ class ResponseData(NamedTuple):
     status_code: int
 
 
+class RawResponseData(NamedTuple):
+    """Структура хранит тело ответа без десериализации и заголовки"""
+    content: bytes
+    links: Optional[dict]
+    rate_limit_remaining: Optional[int]
+    rate_limit_reset: Optional[datetime]
+    status_code: int
+
+
 class HeadersData(NamedTuple):
     """заголовки ответа, необходимые для валидации входных параметров"""
     links: Optional[dict]
     rate_limit_remaining: Optional[int]
     rate_limit_reset: Optional[datetime]
     status_code: int
+
+
+class ScanPlan(NamedTuple):
+    """Прогноз по одному сканируемому списку"""
+    name: str
+    items: int
+    pages: int
+    latency: float
+
+
+class Plan(NamedTuple):
+    """Прогноз стоимости запуска: запросы, время и достаточность лимита запросов"""
+    scans: list[ScanPlan]
+    probes: int
+    requests: int
+    wall_time: float
+    rate_limit_remaining: Optional[int]
+    rate_limit_reset: Optional[datetime]
+    fits: bool
+    recommendations: list[str]
+
+
+class RateLimit(NamedTuple):
+    """Состояние лимита запросов одного api_key по последнему ответу"""
+    remaining: Optional[int]
+    reset: Optional[datetime]
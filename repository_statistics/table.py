@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+"""
+repository_statistic.table
+~~~~~~~~~~~~~~~~~~~
+
+Модуль содержит компактное колоночное хранилище загруженных объектов
+(коммитов, pull requests, issues) и векторные фильтры по нему
+"""
+from datetime import date
+from typing import Optional
+
+import numpy as np
+
+STATE_OPEN = 1
+STATE_PULL_REQUEST = 2
+
+NO_DATE = 0
+NO_AUTHOR = -1
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def to_ordinals(dates: list) -> np.ndarray:
+    """
+    Векторно конвертирует список строк вида "%Y-%m-%dT..." в массив порядковых номеров дат (date.toordinal).
+    Отсутствующие даты получают значение NO_DATE
+    :param dates:
+    :return:
+    """
+    days = np.array([d[:10] if d else "NaT" for d in dates], dtype="datetime64[D]")
+    return np.where(np.isnat(days), NO_DATE, days.astype(np.int64) + _EPOCH_ORDINAL).astype(np.int32)
+
+
+def from_ordinals(ordinals: np.ndarray) -> np.ndarray:
+    """
+    Конвертирует массив порядковых номеров дат в массив numpy.datetime64 с точностью до дня
+    :param ordinals:
+    :return:
+    """
+    return (np.asarray(ordinals, dtype=np.int64) - _EPOCH_ORDINAL).astype("datetime64[D]")
+
+
+def to_timestamps(dates: list) -> np.ndarray:
+    """
+    Векторно конвертирует список строк ISO 8601 (UTC) в массив unix-времени в секундах.
+    Отсутствующие даты получают значение NO_DATE
+    :param dates:
+    :return:
+    """
+    moments = np.array([d[:19] if d else "NaT" for d in dates], dtype="datetime64[s]")
+    return np.where(np.isnat(moments), NO_DATE, moments.astype(np.int64))
+
+
+def to_ordinal(target_date: Optional[date]) -> Optional[int]:
+    """
+    Возвращает порядковый номер даты или None
+    :param target_date:
+    :return:
+    """
+    return target_date.toordinal() if target_date else None
+
+
+class ItemTable:
+    """
+    Колоночная таблица объектов.
+    created - порядковые номера дат создания, flags - битовые флаги состояния,
+    author - идентификаторы авторов, authors - интернированные логины (индекс = идентификатор),
+    created_at, closed_at, merged_at - unix-время создания, закрытия и слияния в секундах
+    """
+    __slots__ = ("created", "flags", "author", "authors", "created_at", "closed_at", "merged_at")
+
+    def __init__(
+            self,
+            created: np.ndarray,
+            flags: np.ndarray,
+            author: np.ndarray,
+            authors: list,
+            created_at: np.ndarray,
+            closed_at: np.ndarray,
+            merged_at: np.ndarray
+    ):
+        self.created = created
+        self.flags = flags
+        self.author = author
+        self.authors = authors
+        self.created_at = created_at
+        self.closed_at = closed_at
+        self.merged_at = merged_at
+
+    @classmethod
+    def from_columns(
+            cls,
+            created: list,
+            flags: list,
+            logins: list,
+            closed: Optional[list] = None,
+            merged: Optional[list] = None
+    ) -> "ItemTable":
+        """
+        Строит таблицу из списков значений, собранных за один проход по объектам
+        :param created: строки дат создания
+        :param flags: битовые флаги состояния
+        :param logins: логины авторов (None, если автор неизвестен)
+        :param closed: строки дат закрытия (None, если не известны)
+        :param merged: строки дат слияния (None, если не известны)
+        :return:
+        """
+        ids = {}
+        author = np.fromiter(
+            (ids.setdefault(login, len(ids)) if login is not None else NO_AUTHOR for login in logins),
+            dtype=np.int32,
+            count=len(logins)
+        )
+        return cls(
+            to_ordinals(created),
+            np.array(flags, dtype=np.uint8),
+            author,
+            list(ids),
+            to_timestamps(created),
+            to_timestamps(closed) if closed is not None else np.full(len(created), NO_DATE, dtype=np.int64),
+            to_timestamps(merged) if merged is not None else np.full(len(created), NO_DATE, dtype=np.int64)
+        )
+
+    def __len__(self) -> int:
+        return len(self.created)
+
+    def window_mask(self, begin_date: Optional[date], end_date: Optional[date]) -> np.ndarray:
+        """
+        Маска вхождения даты создания в интервал дат [begin_date; end_date]
+        :param begin_date:
+        :param end_date:
+        :return:
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if begin_date:
+            mask &= self.created >= to_ordinal(begin_date)
+        if end_date:
+            mask &= self.created <= to_ordinal(end_date)
+        return mask
+
+    def older_than_mask(self, num_days: int, current_date: Optional[date] = None) -> np.ndarray:
+        """
+        Маска объектов, с даты создания которых прошло больше num_days дней.
+        Объекты без даты создания и с датой в будущем старыми не считаются
+        :param num_days:
+        :param current_date: по умолчанию текущая дата
+        :return:
+        """
+        today = to_ordinal(current_date or date.today())
+        return (self.created != NO_DATE) & (today - self.created > num_days)
+
+    def flag_mask(self, flag: int, is_set: bool = True) -> np.ndarray:
+        """
+        Маска объектов с установленным (или сброшенным) флагом
+        :param flag:
+        :param is_set:
+        :return:
+        """
+        return (self.flags & flag) != 0 if is_set else (self.flags & flag) == 0
+
+    def count(self, mask: Optional[np.ndarray] = None) -> int:
+        """
+        Количество объектов, удовлетворяющих маске
+        :param mask:
+        :return:
+        """
+        return int(np.count_nonzero(mask)) if mask is not None else len(self)
+
+    def count_by_author(self, num_records: int, mask: Optional[np.ndarray] = None) -> list:
+        """
+        Возвращает список кортежей [(логин автора, количество), ...] в порядке убывания количества.
+        При равенстве количества порядок соответствует порядку первого появления автора
+        :param num_records:
+        :param mask:
+        :return:
+        """
+        counts = self._count_authors(mask)
+        order = np.argsort(-counts, kind="stable")[:num_records]
+        return [(self.authors[i], int(counts[i])) for i in order if counts[i]]
+
+    def author_counts(self, mask: Optional[np.ndarray] = None) -> list:
+        """
+        Возвращает список кортежей [(логин автора, количество), ...] в порядке первого появления автора.
+        Частичные результаты по страницам, объединенные по порядку страниц, дают тот же порядок, что и count_by_author
+        :param mask:
+        :return:
+        """
+        return [(login, int(count)) for login, count in zip(self.authors, self._count_authors(mask)) if count]
+
+    def _count_authors(self, mask: Optional[np.ndarray]) -> np.ndarray:
+        author = self.author if mask is None else self.author[mask]
+        return np.bincount(author[author != NO_AUTHOR], minlength=len(self.authors))
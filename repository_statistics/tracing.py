@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+"""
+repository_statistic.tracing
+~~~~~~~~~~~~~~~~~~~
+
+Модуль содержит трассировку запросов: по одной структурированной записи на запрос
+(семейство endpoint, страница, статус, размер, время соединения, ожидания первого байта,
+загрузки и десериализации, заголовки лимита) в jsonl файл или произвольный приемник,
+а также сводку времени по этапам расчета
+"""
+import json
+import threading
+import time
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
+from urllib.parse import urlparse, parse_qs
+
+import urllib3.connection
+
+from repository_statistics import httpclient
+from repository_statistics.sites import get_drivers
+
+_current_scan = ContextVar("current_scan", default=None)
+_connect = threading.local()
+
+SUMMARY_FIELDS = ("connect", "ttfb", "download", "decode", "total", "bytes")
+
+
+@contextmanager
+def scan(name: str):
+    """
+    Помечает запросы внутри блока наименованием этапа расчета
+    :param name:
+    :return:
+    """
+    token = _current_scan.set(name)
+    try:
+        yield
+    finally:
+        _current_scan.reset(token)
+
+
+def get_endpoint_family(url: str) -> str:
+    """
+    Семейство endpoint по шаблонам путей драйверов сайтов (commits, compare, pulls, issues, branch, repository,
+    limit, graphql). Для адресов вне шаблонов - последний сегмент пути
+    :param url:
+    :return:
+    """
+    path = urlparse(url).path.rstrip("/")
+    for driver in get_drivers():
+        family = driver.get_endpoint_family(path)
+        if family:
+            return family
+    parts = [part for part in path.split("/") if part]
+    return parts[-1] if parts else ""
+
+
+def get_page(url: str, parameters: Optional[dict]) -> int:
+    """
+    Номер страницы из параметров запроса или адреса следующей страницы
+    :param url:
+    :param parameters:
+    :return:
+    """
+    page = (parameters or {}).get("page") or parse_qs(urlparse(url).query).get("page", ["1"])[0]
+    return int(page)
+
+
+def _timed_connect(connect: Callable) -> Callable:
+    """
+    Обертка метода connect соединения urllib3: накапливает время установки соединения (DNS, TCP, TLS) в потоке
+    :param connect:
+    :return:
+    """
+    def wrapper(self, *args, **kwargs):
+        depth = getattr(_connect, "depth", 0)
+        _connect.depth = depth + 1
+        started = time.perf_counter()
+        try:
+            return connect(self, *args, **kwargs)
+        finally:
+            _connect.depth = depth
+            if not depth:
+                _connect.seconds = getattr(_connect, "seconds", 0.0) + time.perf_counter() - started
+
+    wrapper.original = connect
+    return wrapper
+
+
+def _pop_connect_time() -> float:
+    seconds = getattr(_connect, "seconds", 0.0)
+    _connect.seconds = 0.0
+    return seconds
+
+
+class JsonlSink:
+    """Приемник записей трассировки: одна json строка на запрос"""
+
+    def __init__(self, path: str):
+        self.file = open(path, "a", encoding="utf-8")
+        self.lock = threading.Lock()
+
+    def __call__(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False)
+        with self.lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class Tracer:
+    """
+    Хук трассировки httpclient. Формирует запись о каждом запросе, передает ее приемникам
+    и накапливает сводку по этапам расчета
+    """
+    _connection_classes = (urllib3.connection.HTTPConnection, urllib3.connection.HTTPSConnection)
+
+    def __init__(self, sinks: Optional[list] = None):
+        self.sinks = sinks or []
+        self.summary = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, method: str, url: str, parameters: Optional[dict], response, duration: float, decode: float):
+        connect = _pop_connect_time()
+        elapsed = response.elapsed.total_seconds()
+        record = {
+            "timestamp": time.time(),
+            "scan": _current_scan.get(),
+            "endpoint": get_endpoint_family(url),
+            "method": method,
+            "page": get_page(url, parameters),
+            "status": response.status_code,
+            "bytes": len(response.content or b""),
+            "connect": connect,
+            "ttfb": max(elapsed - connect, 0.0),
+            "download": max(duration - elapsed, 0.0),
+            "decode": decode,
+            "total": duration + decode,
+            "rate_limit_remaining": response.headers.get("X-RateLimit-Remaining"),
+            "rate_limit_reset": response.headers.get("X-RateLimit-Reset"),
+        }
+        with self.lock:
+            totals = self.summary.setdefault(record["scan"], dict.fromkeys(("requests",) + SUMMARY_FIELDS, 0))
+            totals["requests"] += 1
+            for field in SUMMARY_FIELDS:
+                totals[field] += record[field]
+        for sink in self.sinks:
+            sink(record)
+
+    def enable(self):
+        """
+        Регистрирует трассировщик в httpclient и включает замер времени установки соединений
+        :return:
+        """
+        for connection_class in self._connection_classes:
+            if "connect" in vars(connection_class) and not hasattr(connection_class.connect, "original"):
+                connection_class.connect = _timed_connect(connection_class.connect)
+        httpclient.trace_hooks.append(self)
+
+    def disable(self):
+        httpclient.trace_hooks.remove(self)
+        if not httpclient.trace_hooks:
+            for connection_class in self._connection_classes:
+                if hasattr(vars(connection_class).get("connect"), "original"):
+                    connection_class.connect = connection_class.connect.original
+
+    def format_summary(self) -> str:
+        """
+        Сводка времени по этапам расчета
+        :return:
+        """
+        lines = ['{0:25} | {1:>8} | {2:>9} | {3:>9} | {4:>9} | {5:>9} | {6:>9} | {7:>12}'.format(
+            "scan", "requests", "connect", "ttfb", "download", "decode", "total", "bytes")]
+        lines.append("-" * len(lines[0]))
+        for name, totals in self.summary.items():
+            lines.append('{0:25} | {1:8d} | {2:9.3f} | {3:9.3f} | {4:9.3f} | {5:9.3f} | {6:9.3f} | {7:12d}'.format(
+                name or "-", totals["requests"], totals["connect"], totals["ttfb"], totals["download"],
+                totals["decode"], totals["total"], totals["bytes"]))
+        return "\n".join(lines)
+
+
+@contextmanager
+def tracing(path: Optional[str] = None, sinks: Optional[list] = None):
+    """
+    Включает трассировку запросов внутри блока.
+    :param path: jsonl файл для записей (None - без записи в файл)
+    :param sinks: дополнительные приемники записей (вызываемые объекты, принимающие dict)
+    :return: Tracer со сводкой по этапам
+    """
+    file_sink = JsonlSink(path) if path else None
+    tracer = Tracer(([file_sink] if file_sink else []) + (sinks or []))
+    tracer.enable()
+    try:
+        yield tracer
+    finally:
+        tracer.disable()
+        if file_sink:
+            file_sink.close()
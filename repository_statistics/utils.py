@@ -6,8 +6,12 @@ repository_statistic.utils
 
 Модуль общие функции, которые могут использоваться в нескольких модулях проекта
 """
+import json
+import os
+import tempfile
+
 from datetime import datetime, date
-from typing import Optional
+from typing import Any, Optional, Union
 
 
 def get_begin_date(target_date: str) -> str:
@@ -85,11 +89,50 @@ def get_last_parts_url(url: str, num_parts: int) -> str:
     return "/".join(url.split("/")[-num_parts:])
 
 
-def to_compare_with_current_date(num_days: int, created_date: str) -> bool:
+def load_json(path: str) -> Optional[Union[dict, list]]:
+    """
+    Загружает объект из json файла. Возвращает None, если файла не существует
+    :param path:
+    :return:
+    """
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def save_json(path: str, data: Union[dict, list]):
+    """
+    Атомарно сохраняет объект в json файл (через временный файл в том же каталоге)
+    :param path:
+    :param data:
+    :return:
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory, delete=False) as file:
+        json.dump(data, file, ensure_ascii=False)
+    os.replace(file.name, path)
+
+
+def to_serializable(obj: Any) -> Any:
     """
-    Возвращает True, если количество дней от текущей даты превосходит заданное количество дней, иначе False
-    :param created_date:
-    :param num_days:
+    Рекурсивно приводит структуры проекта (NamedTuple, массивы numpy, даты) к типам, сериализуемым в json
+    :param obj:
     :return:
     """
-    return abs(datetime.now().date() - get_date_from_str_without_time(created_date)).days > num_days
+    if hasattr(obj, "_asdict"):
+        return {key: to_serializable(value) for key, value in obj._asdict().items()}
+    if isinstance(obj, dict):
+        return {key: to_serializable(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_serializable(value) for value in obj]
+    if hasattr(obj, "tolist"):
+        # массивы и скаляры numpy (без импорта numpy)
+        return to_serializable(obj.tolist())
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, float) and (obj != obj or obj in (float("inf"), float("-inf"))):
+        return None
+    return obj
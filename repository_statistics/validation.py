@@ -1,35 +1,47 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-from repository_statistics.sites.github import endpoints, get_headers
+from typing import Optional
+
+from repository_statistics.sites import get_driver
+from repository_statistics.sites.base import get_modes
 from repository_statistics.exceptions import HTTPError, ValidationError
 from repository_statistics.utils import get_date_from_str
 from repository_statistics.structure import Params
 from repository_statistics.httpclient import get_response_headers_data
 
 
-def is_url(url: str) -> bool:
+def is_url(url: str, api_key: Optional[str] = None) -> bool:
     """
-    Валидация параметра url
+    Валидация параметра url. С api_key репозиторий проверяется запросом к api с авторизацией
+    (страница закрытого репозитория без входа на сайт недоступна)
     :param url:
+    :param api_key: None - проверяется страница репозитория на сайте
     :return:
     """
     try:
-        response_data = get_response_headers_data(url)
+        if api_key:
+            driver = get_driver(url)
+            response_data = get_response_headers_data(driver.endpoints["repository"](url),
+                                                      headers=driver.get_headers(api_key))
+        else:
+            response_data = get_response_headers_data(url)
         return response_data.status_code == 200
     except HTTPError:
         return False
 
 
-def is_api_key(api_key: str) -> bool:
+def is_api_key(api_key: str, url: Optional[str] = None) -> bool:
     """
     Проверка корректности api_key
     :param api_key:
+    :param url: адрес репозитория, по которому выбирается сайт (None - github)
     :return:
     """
+    driver = get_driver(url)
     try:
         return get_response_headers_data(
-            endpoints['limit'],
-            headers=get_headers(api_key)
+            driver.get_api_key_check_url(url),
+            headers=driver.get_headers(api_key)
         ).status_code == 200
     except HTTPError:
         return False
@@ -48,21 +60,57 @@ def is_date(date: str) -> bool:
     return True
 
 
-def is_branch(url: str, branch: str) -> bool:
+def is_branch(url: str, branch: str, api_key: Optional[str] = None) -> bool:
     """
     Валидация наименования ветки
     :param url:
     :param branch:
+    :param api_key: None - запрос без авторизации (только для открытых репозиториев)
     :return:
     """
+    driver = get_driver(url)
     try:
         return get_response_headers_data(
-            endpoints["branch"](url, branch)
+            driver.endpoints["branch"](url, branch),
+            headers=driver.get_headers(api_key) if api_key else None
         ).status_code == 200
     except HTTPError:
         return False
 
 
+def get_mode_errors(**params) -> list:
+    """
+    Ошибки режимов, которые не поддерживает драйвер сайта репозитория
+    :param params:
+    :return:
+    """
+    driver = get_driver(params["url"])
+    return [f'Режим {mode} не поддерживается для репозиториев {driver.name}.'
+            for mode in get_modes(**params) if mode not in driver.modes]
+
+
+def get_date_errors(begin_date: Optional[str], end_date: Optional[str]) -> list:
+    """
+    Ошибки параметров периода отчета
+    :param begin_date: None - период не ограничен слева
+    :param end_date: None - период не ограничен справа
+    :return:
+    """
+    errors = []
+
+    if begin_date and not is_date(begin_date):
+        errors.append(f'Некорректно задан параметр даты начала периода, {begin_date}.')
+
+    if end_date and not is_date(end_date):
+        errors.append(f'Некорректно задан параметр даты конца периода, {end_date}.')
+
+    if (begin_date and end_date and is_date(begin_date) and is_date(end_date)
+            and get_date_from_str(begin_date) > get_date_from_str(end_date)):
+        errors.append('Дата начала периода больше даты конца периода')
+
+    return errors
+
+
 def get_validation_errors(**params) -> list:
     """
     Формирует общее сообщение об ошибках валидации параметров.
@@ -71,23 +119,17 @@ def get_validation_errors(**params) -> list:
     """
     errors = []
 
-    if not is_url(params["url"]):
-        errors.append(f'Неккорректно задан параметр url или репозитория с адресом {params["url"]} не существует.')
-
-    if not is_api_key(params["api_key"]):
-        errors.append('Авторизация не удалась. Вероятно, некорректный api_key.')
+    if not is_url(params["url"], params["api_key"]):
+        errors.append(f'Некорректно задан параметр url или репозитория с адресом {params["url"]} не существует.')
 
-    if params["begin_date"] and not is_date(params["begin_date"]):
-        errors.append(f'Неккорректно задан параметр даты начала периода, {params["begin_date"]}.')
+    errors.extend(get_mode_errors(**params))
 
-    if params["end_date"] and not is_date(params["end_date"]):
-        errors.append(f'Неккорректно задан параметр даты конца периода, {params["end_date"]}.')
+    if not is_api_key(params["api_key"], params["url"]):
+        errors.append('Авторизация не удалась. Вероятно, некорректный api_key.')
 
-    if (params["begin_date"] and params["end_date"] and is_date(params["begin_date"]) and is_date(params["end_date"])
-            and get_date_from_str(params["begin_date"]) > get_date_from_str(params["end_date"])):
-        errors.append('Дата начала периода больше даты конца периода')
+    errors.extend(get_date_errors(params["begin_date"], params["end_date"]))
 
-    if not is_branch(params["url"], params["branch"]):
+    if not is_branch(params["url"], params["branch"], params["api_key"]):
         errors.append(f'Ветки репозитория с указанным именем {params["branch"]} не существует.')
 
     return errors
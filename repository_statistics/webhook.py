@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+
+"""
+repository_statistic.webhook
+~~~~~~~~~~~~~~~~~~~
+
+Модуль содержит сервер приема webhook событий github (push, pull_request, issues),
+инкрементально обновляющий статистику после однократной начальной загрузки.
+Список коммитов в событии push может быть обрезан, тогда коммиты загружаются через compare before...after.
+Без секрета сервер запускается только явно (insecure): иначе любой, кто достучится до порта, меняет статистику
+"""
+import hashlib
+import hmac
+import json
+import threading
+
+from collections import Counter
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from repository_statistics.exceptions import HTTPError
+from repository_statistics.incremental import fetch_new_commits
+from repository_statistics.sites.github import (count_issues, count_pulls, fetch_commits, fetch_issues, fetch_pulls,
+                                                make_items_table, NUM_RECORDS)
+from repository_statistics.structure import Params, PullRequests, Issues, ResultData
+from repository_statistics.utils import get_date_from_str_without_time, in_interval, to_serializable
+
+SIGNATURE_HEADER = "X-Hub-Signature-256"
+EVENT_HEADER = "X-GitHub-Event"
+REMOVE_ACTIONS = ("deleted", "transferred")
+# Наибольшее количество коммитов в событии push; при большем числе список обрезается
+PUSH_COMMITS_LIMIT = 20
+ZERO_SHA = "0" * 40
+
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    """
+    Проверка подписи тела запроса (заголовок X-Hub-Signature-256 вида "sha256=<hex>")
+    :param secret:
+    :param body:
+    :param signature:
+    :return:
+    """
+    if not signature or not signature.startswith("sha256="):
+        return False
+    expected = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature[len("sha256="):])
+
+
+def project_item(item: dict) -> dict:
+    """
+    Оставляет только поля pull request или issue, необходимые для статистики
+    :param item:
+    :return:
+    """
+    return {key: item.get(key) for key in ("url", "state", "created_at", "pull_request")}
+
+
+class StatisticsState:
+    """Текущее состояние статистики репозитория, обновляемое по событиям"""
+
+    def __init__(self, params: Params):
+        self.params = params
+        self.commits = Counter()
+        self.seen_commits = set()
+        self.pulls = {}
+        self.issues = {}
+        self.lock = threading.Lock()
+        self._in_interval = partial(
+            in_interval,
+            get_date_from_str_without_time(params.begin_date),
+            get_date_from_str_without_time(params.end_date)
+        )
+
+    def backfill(self):
+        """
+        Однократная начальная загрузка состояния через функции загрузки github
+        :return:
+        """
+        if self.params.dev_activity:
+            for commit in fetch_commits(self.params):
+                self._add_commit(commit.get("sha"), (commit.get("author") or {}).get("login"))
+        if self.params.pull_requests:
+            for is_open in (True, False):
+                for pull in fetch_pulls(self.params, is_open):
+                    self.pulls[pull.get("number")] = project_item(pull)
+        if self.params.issues:
+            for is_open in (True, False):
+                for issue in fetch_issues(self.params, is_open):
+                    self.issues[issue.get("number")] = project_item(issue)
+
+    def handle_event(self, event: str, payload: dict):
+        """
+        Применяет событие к состоянию
+        :param event: значение заголовка X-GitHub-Event
+        :param payload:
+        :return:
+        """
+        with self.lock:
+            if event == "push":
+                self._handle_push(payload)
+            elif event == "pull_request":
+                self._handle_pull_request(payload)
+            elif event == "issues":
+                self._handle_issue(payload)
+
+    def _handle_push(self, payload: dict):
+        if not self.params.dev_activity or payload.get("ref") != f"refs/heads/{self.params.branch}":
+            return
+        commits = payload.get("commits") or []
+        if len(commits) >= PUSH_COMMITS_LIMIT or payload.get("size", len(commits)) > len(commits):
+            pushed_commits = self._fetch_pushed_commits(payload)
+            if pushed_commits is not None:
+                for commit in pushed_commits:
+                    self._add_commit(commit.get("sha"), (commit.get("author") or {}).get("login"))
+                return
+        for commit in commits:
+            if commit.get("distinct", True) and self._is_in_period(commit.get("timestamp")):
+                self._add_commit(commit.get("id"), (commit.get("author") or {}).get("username"))
+
+    def _fetch_pushed_commits(self, payload: dict) -> Optional[list]:
+        """
+        Все коммиты события push через compare before...after.
+        None - загрузить нельзя (новая ветка, перезапись истории или ошибка api), учитываются коммиты из события
+        :param payload:
+        :return:
+        """
+        before, after = payload.get("before"), payload.get("after")
+        if not before or not after or before == ZERO_SHA or payload.get("forced"):
+            return None
+        try:
+            pushed_commits = fetch_new_commits(self.params, before, after)
+        except HTTPError:
+            return None
+        return list(pushed_commits) if pushed_commits is not None else None
+
+    def _is_in_period(self, timestamp: Optional[str]) -> bool:
+        """
+        Попадает ли дата коммита из события в период отчета. Коммит без даты учитывается только без периода
+        :param timestamp:
+        :return:
+        """
+        commit_date = get_date_from_str_without_time(timestamp)
+        if commit_date is None:
+            return not (self.params.begin_date or self.params.end_date)
+        return self._in_interval(commit_date)
+
+    def _handle_pull_request(self, payload: dict):
+        if not self.params.pull_requests:
+            return
+        pull = payload.get("pull_request", {})
+        if (pull.get("base") or {}).get("ref") != self.params.branch:
+            # pull request мог быть перенаправлен в другую ветку
+            self.pulls.pop(pull.get("number"), None)
+            return
+        self.pulls[pull.get("number")] = project_item(pull)
+
+    def _handle_issue(self, payload: dict):
+        if not self.params.issues:
+            return
+        issue = payload.get("issue", {})
+        if payload.get("action") in REMOVE_ACTIONS:
+            self.issues.pop(issue.get("number"), None)
+        else:
+            self.issues[issue.get("number")] = project_item(issue)
+
+    def _add_commit(self, sha: Optional[str], login: Optional[str]):
+        if sha in self.seen_commits:
+            return
+        self.seen_commits.add(sha)
+        if login:
+            self.commits[login] += 1
+
+    def get_result_data(self) -> ResultData:
+        """
+        Текущий результирующий набор данных
+        :return:
+        """
+        with self.lock:
+            pulls = list(self.pulls.values())
+            issues = list(self.issues.values())
+            dev_activity = self.commits.most_common(NUM_RECORDS) if self.params.dev_activity else None
+        return ResultData(
+            dev_activity,
+            self._get_pull_requests(pulls) if self.params.pull_requests else None,
+            self._get_issues(issues) if self.params.issues else None
+        )
+
+    def _get_pull_requests(self, pulls: list) -> PullRequests:
+        open_pulls = make_items_table(pull for pull in pulls if pull.get("state") == "open")
+        closed_pulls = make_items_table(pull for pull in pulls if pull.get("state") != "open")
+        return PullRequests(
+            count_pulls(self.params, open_pulls),
+            count_pulls(self.params, closed_pulls),
+            count_pulls(self.params, open_pulls, is_old=True)
+        )
+
+    def _get_issues(self, issues: list) -> Issues:
+        open_issues = make_items_table(issue for issue in issues if issue.get("state") == "open")
+        closed_issues = make_items_table(issue for issue in issues if issue.get("state") != "open")
+        return Issues(
+            count_issues(self.params, open_issues),
+            count_issues(self.params, closed_issues),
+            count_issues(self.params, open_issues, is_old=True)
+        )
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    """
+    POST - прием события (подпись проверяется, если задан секрет; без секрета сервер создается только явно),
+    GET - текущий результирующий набор данных в формате json
+    """
+    state: StatisticsState = None
+    secret: Optional[str] = None
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.secret and not verify_signature(self.secret, body, self.headers.get(SIGNATURE_HEADER)):
+            return self._reply(401, {"error": "invalid signature"})
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return self._reply(400, {"error": "invalid json"})
+        self.state.handle_event(self.headers.get(EVENT_HEADER, ""), payload)
+        self._reply(202, {"status": "accepted"})
+
+    def do_GET(self):
+        self._reply(200, to_serializable(self.state.get_result_data()))
+
+    def _reply(self, status: int, data: dict):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(state: StatisticsState, host: str, port: int, secret: Optional[str] = None,
+                insecure: bool = False) -> ThreadingHTTPServer:
+    """
+    Создает http сервер приема событий для переданного состояния
+    :param state:
+    :param host:
+    :param port:
+    :param secret: секрет webhook
+    :param insecure: разрешить сервер без секрета (подпись не проверяется)
+    :return:
+    """
+    if not secret and not insecure:
+        raise ValueError("Сервер webhook без секрета запускается только с insecure=True.")
+    handler = type("BoundWebhookHandler", (WebhookHandler,), {"state": state, "secret": secret})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve(params: Params, host: str, port: int, secret: Optional[str] = None, insecure: bool = False):
+    """
+    Выполняет начальную загрузку и обслуживает события до остановки процесса
+    :param params:
+    :param host:
+    :param port:
+    :param secret:
+    :param insecure: разрешить сервер без секрета
+    :return:
+    """
+    if not secret and not insecure:
+        raise ValueError("Сервер webhook без секрета запускается только с insecure=True.")
+    state = StatisticsState(params)
+    state.backfill()
+    make_server(state, host, port, secret, insecure).serve_forever()
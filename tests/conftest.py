@@ -1,7 +1,39 @@
 import pytest
 
+from contextlib import ExitStack
+
+from benchmarks.stub_server import StubServer
+from repository_statistics.sites import bitbucket, github
+
+
+SITE_MODULES = {"github": github, "bitbucket": bitbucket}
+
 
 @pytest.fixture()
 def url():
     """Возвращает фикстуру url"""
     return "https://github.com/Xe1ga/repository-statistics"
+
+
+@pytest.fixture()
+def make_stub(monkeypatch):
+    """
+    Фабрика заглушек api: make_stub(dataset, site="github", **options) запускает заглушку сайта site
+    и направляет на нее адрес api драйвера. Заглушки останавливаются после теста
+    """
+    with ExitStack() as stack:
+        def _make_stub(dataset, site: str = "github", **options) -> StubServer:
+            stub = stack.enter_context(StubServer(dataset, site=site, **options))
+            monkeypatch.setattr(SITE_MODULES[site], "BASE_URL", stub.url)
+            return stub
+
+        yield _make_stub
+
+
+@pytest.fixture()
+def stub(make_stub, request):
+    """
+    Заглушка github api с набором данных из параметра фикстуры (indirect-параметризация)
+    или из переменной dataset модуля тестов
+    """
+    return make_stub(getattr(request, "param", None) or request.module.dataset)
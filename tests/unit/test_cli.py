@@ -0,0 +1,152 @@
+import json
+import subprocess
+import sys
+import numpy as np
+import pytest
+
+from click.testing import CliRunner
+from unittest.mock import patch
+
+import cli
+from repository_statistics.cache import get_cache_key, save_result_data, load_result_data
+from repository_statistics.exceptions import HTTPError
+from repository_statistics.structure import (Params, ResultData, PullRequests, Issues, Metrics, Distribution, Histogram,
+                                             CommitsPerWeek)
+
+
+arguments = ["https://github.com/owner/repo", "key", "--all_active"]
+options = dict(url=arguments[0], branch="master", begin_date="", end_date="", dev_activity=True, pull_requests=True,
+               issues=True, metrics=False, sketch="", estimate=False, sample_budget=None, target_error=None,
+               plan=False, identities=False, aliases=None, workers=None, incremental=False)
+result_data = ResultData([("alice", 3)], PullRequests(1, 2, 0), Issues(4, 5, 1))
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """Кэш результатов во временном каталоге"""
+    monkeypatch.setenv("REPOSITORY_STATISTICS_CACHE", str(tmp_path))
+
+
+def test_import_cli_does_not_load_network_modules():
+    """Импорт cli не загружает requests, numpy, модуль валидации и модуль github"""
+    code = ("import sys, cli; print([m for m in ('requests', 'numpy', 'repository_statistics.validation', "
+            "'repository_statistics.sites.github') if m in sys.modules])")
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "[]"
+
+
+def test_cache_roundtrip():
+    """Результаты, включая метрики, восстанавливаются из кэша"""
+    metrics = Metrics(
+        CommitsPerWeek(np.array(["2020-11-02"], dtype="datetime64[D]"), ["alice"], np.array([[3]])),
+        Distribution(np.array([50]), np.array([np.nan]), 0),
+        Histogram(np.array([0, 1]), np.array([2]))
+    )
+    save_result_data("key", result_data._replace(metrics=metrics))
+    restored = load_result_data("key")
+    assert restored[:3] == result_data[:3]
+    assert restored.metrics.commits_per_week.weeks == ["2020-11-02"]
+    assert restored.metrics.pull_requests_time_to_merge.values == [None]
+    assert load_result_data("key", max_age=-1) is None
+    assert load_result_data("missing") is None
+
+
+def test_offline_serves_cached_results():
+    """В режиме --offline результат берется из кэша без сетевых запросов"""
+    save_result_data(get_cache_key(**options), result_data)
+    with patch('cli.get_params') as mock_get_params:
+        output = CliRunner().invoke(cli.main, arguments + ["--offline"]).output
+    assert not mock_get_params.called
+    assert "alice" in output
+    assert "Number of closed issues = 5" in output
+
+
+def test_get_options_matches_cache_key_of_main():
+    """Параметры, построенные по опциям командной строки, дают тот же ключ кэша, что и запуск cli"""
+    values = cli.main.make_context("cli.py", arguments + ["--aliases", __file__]).params
+    assert get_cache_key(**cli.get_options(**values)) == \
+        get_cache_key(**{**options, "identities": True, "aliases": __file__})
+    save_result_data(get_cache_key(**cli.get_options(**values)), result_data)
+    assert "alice" in CliRunner().invoke(cli.main, arguments + ["--aliases", __file__, "--offline"]).output
+
+
+def test_offline_without_cache():
+    """Без записи в кэше режим --offline сообщает об этом"""
+    output = CliRunner().invoke(cli.main, arguments + ["--offline"]).output
+    assert "В кэше нет результатов" in output
+
+
+@patch('repository_statistics.calculations.get_result_data', return_value=result_data)
+@patch('cli.get_params', return_value=Params(url=arguments[0], api_key="key", begin_date=None, end_date=None,
+                                              branch="master", dev_activity=True, pull_requests=True, issues=True))
+def test_online_run_fills_cache(mock_get_params, mock_get_result_data):
+    """Успешный запуск с --cache сохраняет результаты, и их можно получить с --max_age"""
+    CliRunner().invoke(cli.main, arguments)
+    assert load_result_data(get_cache_key(**options)) is None
+    CliRunner().invoke(cli.main, arguments + ["--cache"])
+    assert load_result_data(get_cache_key(**options)) == result_data
+    mock_get_params.reset_mock()
+    output = CliRunner().invoke(cli.main, arguments + ["--max_age", "60"]).output
+    assert not mock_get_params.called
+    assert "alice" in output
+
+
+def test_cache_key_depends_on_all_result_parameters():
+    """Режимы, меняющие результат, дают разные ключи кэша, а план и sketch из кэша не выдаются"""
+    assert get_cache_key(**options) != get_cache_key(**{**options, "estimate": True, "sample_budget": 10})
+    assert get_cache_key(**options) != get_cache_key(**{**options, "incremental": True})
+    result = CliRunner().invoke(cli.main, arguments + ["--offline", "--plan"])
+    assert result.exit_code == 2 and "--plan" in result.output
+
+
+@pytest.mark.parametrize('mode', [["--metrics"], ["--sketch", "sketch.json"], ["--identities"],
+                                  ["--aliases", "aliases.json"], ["--items", "--format", "json"]])
+def test_estimate_rejects_unsupported_modes(mode, tmp_path, monkeypatch):
+    """Режим оценки не сочетается с режимами, которые требуют загрузки всех объектов"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "aliases.json").write_text("{}")
+    with patch('cli.get_params') as mock_get_params:
+        result = CliRunner().invoke(cli.main, arguments + ["--estimate"] + mode)
+    assert result.exit_code == 2 and "--estimate cannot be combined" in result.output
+    assert not mock_get_params.called
+
+
+def test_offline_machine_readable_format():
+    """Результаты из кэша выводятся в выбранном машиночитаемом формате"""
+    save_result_data(get_cache_key(**options), result_data)
+    output = CliRunner().invoke(cli.main, arguments + ["--offline", "--format", "ndjson"]).output
+    assert [json.loads(line)["name"] for line in output.splitlines()] == ["dev_activity", "pull_requests", "issues"]
+
+
+@patch('repository_statistics.calculations.iter_result_data')
+@patch('cli.get_params', return_value=Params(url=arguments[0], api_key="key", begin_date=None, end_date=None,
+                                              branch="master", dev_activity=True, pull_requests=True, issues=True))
+def test_machine_readable_format_error(mock_get_params, mock_iter_result_data):
+    """Ошибка посреди расчета завершает json-документ, а сообщения выводятся в stderr"""
+    def failing_sections(*args):
+        yield "dev_activity", [("alice", 3)]
+        raise HTTPError("Доступ к ресурсу ограничен.")
+
+    mock_iter_result_data.side_effect = failing_sections
+    result = CliRunner().invoke(cli.main, arguments + ["--format", "json"])
+    data = json.loads(result.stdout)
+    assert data["error"] == "Доступ к ресурсу ограничен."
+    assert "Доступ к ресурсу ограничен." in result.stderr
+    assert "Что-то пошло не так" in result.stderr
+
+
+@pytest.mark.parametrize('output_format', ["text", "json", "ndjson", "csv"])
+@patch('repository_statistics.calculations.iter_result_data')
+@patch('repository_statistics.validation.is_url', return_value=False)
+@patch('repository_statistics.validation.is_api_key', return_value=True)
+@patch('repository_statistics.validation.is_branch', return_value=True)
+def test_validation_failure(is_branch, is_api_key, is_url, mock_iter_result_data, output_format):
+    """При ошибке валидации расчет не выполняется, сообщение выводится один раз, а скрипт завершается с ошибкой"""
+    result = CliRunner().invoke(cli.main, arguments + ["--format", output_format])
+    assert result.exit_code == 1
+    assert not mock_iter_result_data.called
+    message = result.stdout if output_format == "text" else result.stderr
+    assert "Проверьте правильность указания параметров скрипта" in message
+    assert "Что-то пошло не так" not in result.output
+    if output_format != "text":
+        assert result.stdout == ""
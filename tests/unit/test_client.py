@@ -0,0 +1,49 @@
+import pytest
+
+from benchmarks.datasets import Dataset
+from repository_statistics import httpclient
+from repository_statistics.client import Client
+from repository_statistics.exceptions import ValidationError
+
+
+dataset = Dataset(commits=250, open_pulls=120, closed_pulls=30, open_issues=50, closed_issues=10, authors=5)
+
+
+def test_client_validates_once(stub):
+    """api_key и ветка проверяются один раз, последующие вызовы выполняют только запросы данных"""
+    with Client("key") as client:
+        assert client.pull_requests(stub.repository_url).open_pull_requests == 120
+        requests_after_first = stub.state.requests
+        assert client.issues(stub.repository_url).closed_issues == 8
+        assert stub.state.requests - requests_after_first == 2
+        assert client.rate_limits["key"].remaining == stub.state.remaining
+
+
+def test_client_report_and_dates(stub):
+    """Период задается в каждом вызове, некорректные даты отклоняются без запросов"""
+    with Client("key", validate=False) as client:
+        result_data = client.report(stub.repository_url, issues=False)
+        assert sum(commits for _, commits in result_data.dev_activity) <= dataset.commits
+        assert result_data.pull_requests.closed_pull_requests == 30
+        assert result_data.issues is None
+        requests_before = stub.state.requests
+        with pytest.raises(ValidationError) as error:
+            client.dev_activity(stub.repository_url, begin_date="31.12.2020", end_date="01.12.2020")
+        assert stub.state.requests == requests_before
+        assert error.value.message == ['Дата начала периода больше даты конца периода']
+
+
+def test_client_etag_cache_is_bounded():
+    """Кэш страниц клиента по умолчанию ограничен, как и кэш демона"""
+    with Client("key", validate=False) as client:
+        assert isinstance(client.etag_cache, httpclient.EtagCache)
+
+
+def test_client_picks_api_key_with_most_remaining():
+    """Запрос выполняется с api_key, у которого больше остаток лимита"""
+    client = Client(["first", "second"], validate=False)
+    assert client.get_api_key() == "first"
+    client.rate_limits["first"] = client.rate_limits["first"]._replace(remaining=10)
+    assert client.get_api_key() == "second"
+    client.rate_limits["second"] = client.rate_limits["second"]._replace(remaining=5)
+    assert client.get_api_key() == "first"
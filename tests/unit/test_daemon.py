@@ -0,0 +1,58 @@
+import pytest
+
+from unittest.mock import patch, Mock
+
+from repository_statistics.daemon import Daemon, format_labels, get_repository_params
+from repository_statistics.exceptions import HTTPError
+from repository_statistics.structure import ResultData, PullRequests, Issues
+
+
+params = get_repository_params("key", {"url": "https://github.com/owner/repo"})
+result_data = ResultData([("alice", 3)], PullRequests(1, 2, 0), Issues(4, 5, 1))
+
+
+@pytest.fixture()
+def daemon():
+    """Демон с одним репозиторием, новый для каждого теста"""
+    return Daemon([params])
+
+
+def make_requests(daemon):
+    """Имитирует два запроса к api во время обновления"""
+    def _make_requests(params):
+        for remaining in ("99", "98"):
+            daemon.counter(Mock(headers={"X-RateLimit-Remaining": remaining}))
+        return result_data
+
+    return _make_requests
+
+
+def test_format_labels():
+    """Значения меток экранируются"""
+    assert format_labels({"author": 'a"b\\c'}) == '{author="a\\"b\\\\c"}'
+    assert format_labels({}) == ""
+
+
+@patch('repository_statistics.daemon.get_result_data')
+def test_refresh_and_render_metrics(mock_get_result_data, daemon):
+    """После обновления метрики содержат статистику и операционные показатели"""
+    mock_get_result_data.side_effect = make_requests(daemon)
+    result = daemon.refresh(params)
+    assert result.requests == 2
+    metrics = daemon.render_metrics()
+    labels = 'repository="owner/repo",branch="master"'
+    assert f'repository_statistics_commits{{{labels},author="alice"}} 3' in metrics
+    assert f'repository_statistics_pull_requests{{{labels},state="closed"}} 2' in metrics
+    assert f'repository_statistics_issues{{{labels},state="old"}} 1' in metrics
+    assert f'repository_statistics_refresh_requests{{{labels}}} 2' in metrics
+    assert 'repository_statistics_rate_limit_remaining 98' in metrics
+
+
+@patch('repository_statistics.daemon.get_result_data', side_effect=HTTPError("Доступ к ресурсу ограничен."))
+def test_refresh_error_keeps_previous_result(mock_get_result_data, daemon):
+    """При ошибке обновления отдаются предыдущие результаты и признак неуспеха"""
+    daemon.results[(params.url, params.branch)] = daemon.refresh(params)._replace(result_data=result_data)
+    result = daemon.refresh(params)
+    assert result.result_data == result_data
+    assert result.error
+    assert 'repository_statistics_refresh_success{repository="owner/repo",branch="master"} 0' in daemon.render_metrics()
@@ -4,9 +4,8 @@ from jsonschema import validate
 from unittest.mock import patch, Mock
 from json.decoder import JSONDecodeError
 
-from repository_statistics.httpclient import (get_response_content_with_pagination,
-                                              _get_response, requests, get_response_data)
-from repository_statistics.structure import ResponseData
+from repository_statistics.httpclient import (_get_response, requests, get_response_data, use_etag_cache,
+                                              EtagCache)
 from repository_statistics.exceptions import TimeoutConnectionError, ConnectError, HTTPError
 
 
@@ -49,31 +48,6 @@ def response_return_value_with_json_exception(mock_function):
     mock_function.return_value.headers = {}
 
 
-def get_structure_response_data(*args, **kwargs):
-    response_json = [result_json]
-    links = dict(next={"url": "good"})
-    return ResponseData(
-        response_json=response_json,
-        links=links,
-        rate_limit_remaining=None,
-        rate_limit_reset=None,
-        status_code=200
-    )
-
-
-@pytest.mark.parametrize('url, parameters, headers', request_attributes)
-def test_get_response_content_with_pagination(url, parameters, headers):
-    with patch('repository_statistics.httpclient.get_response_data') as mock_get_response_data:
-        with patch('repository_statistics.httpclient.get_next_pages') as mock_get_next_pages:
-            mock_get_response_data.side_effect = get_structure_response_data
-            mock_get_next_pages.return_value = ""
-            params = (url, parameters, headers)
-            data = get_response_content_with_pagination(params)
-            assert next(data) == result_json
-            with pytest.raises(StopIteration):
-                next(data)
-
-
 @pytest.mark.parametrize('url, method, parameters, headers', request_attributes_with_method)
 @patch.object(requests, 'head', side_effect=[requests.exceptions.Timeout(), requests.exceptions.ConnectionError()])
 @patch.object(requests, 'get', side_effect=[requests.exceptions.Timeout(), requests.exceptions.ConnectionError()])
@@ -85,8 +59,8 @@ def test_get_response_timeout_connect_exception(mock_requests_get, mock_requests
         _get_response(url, method, parameters, headers)
 
 
-def raise_http_error():
-    raise requests.exceptions.HTTPError(response=Mock(status_code=404))
+def raise_http_error(status_code=404):
+    raise requests.exceptions.HTTPError(response=Mock(status_code=status_code))
 
 
 @pytest.mark.parametrize('url, method, parameters, headers', request_attributes_with_method)
@@ -114,6 +88,23 @@ def test_get_response_200_ok(mock_requests_get, mock_requests_head, url, method,
     assert response.json() == result_json
 
 
+@pytest.mark.parametrize('url, method, parameters, headers', request_attributes_with_method)
+@patch('repository_statistics.httpclient.time.sleep')
+def test_get_response_retry_after(mock_sleep, url, method, parameters, headers):
+    """Ответ 429 с Retry-After повторяется после паузы, слишком долгая пауза завершается ошибкой"""
+    rate_limited = Mock(status_code=429, headers={"Retry-After": "2"})
+    rate_limited.raise_for_status.side_effect = lambda: raise_http_error(429)
+    with patch.object(requests, method, side_effect=[rate_limited, Mock(status_code=200)]) as mock_request:
+        assert _get_response(url, method, parameters, headers).status_code == 200
+    assert mock_request.call_count == 2
+    mock_sleep.assert_called_once_with(2.0)
+    rate_limited.headers = {"Retry-After": "3600"}
+    with patch.object(requests, method, return_value=rate_limited) as mock_request:
+        with pytest.raises(HTTPError):
+            _get_response(url, method, parameters, headers)
+    assert mock_request.call_count == 1
+
+
 @pytest.mark.parametrize('url, parameters, headers', request_attributes)
 @patch('repository_statistics.httpclient._get_response')
 def test_get_response_data_200_ok(mock_get_response, url, parameters, headers):
@@ -131,3 +122,31 @@ def test_get_response_data_json_exception(mock_get_response, url, parameters, he
     response_data = get_response_data(url, parameters, headers)
     assert response_data.response_json is None
 
+
+@pytest.mark.parametrize('url, parameters, headers', request_attributes)
+@patch('repository_statistics.httpclient._get_response')
+def test_get_response_data_etag_cache(mock_get_response, url, parameters, headers):
+    """При включенном кэше ответ 304 возвращает сохраненную страницу"""
+    response_return_value(mock_get_response)
+    mock_get_response.return_value.headers = {'ETag': '"abc"'}
+    cache = {}
+    use_etag_cache(cache)
+    try:
+        assert get_response_data(url, parameters, headers).response_json == result_json
+        mock_get_response.return_value.status_code = 304
+        mock_get_response.return_value.json.side_effect = ValueError
+        assert get_response_data(url, parameters, headers).response_json == result_json
+        assert mock_get_response.call_args.kwargs["headers"]["If-None-Match"] == '"abc"'
+    finally:
+        use_etag_cache(None)
+
+
+def test_etag_cache_evicts_least_recently_used():
+    """При переполнении вытесняется страница, которая дольше всех не использовалась"""
+    cache = EtagCache(max_entries=2)
+    cache["a"], cache["b"] = 1, 2
+    assert cache.get("a") == 1
+    cache["c"] = 3
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
@@ -0,0 +1,71 @@
+from benchmarks.datasets import Dataset
+from repository_statistics import identity
+from repository_statistics.identity import IdentityResolver, get_noreply_login, get_search_query
+from repository_statistics.sites.github import load_commits
+from repository_statistics.structure import Params, ResponseData
+from repository_statistics.utils import load_json
+
+
+dataset = Dataset(commits=200, authors=4, commits_without_author=5)
+
+
+def test_noreply_login_and_search_query():
+    """Адреса noreply разбираются без запросов, поиск нескольких адресов выполняется одним запросом"""
+    assert get_noreply_login("12345+alice@users.noreply.github.com") == "alice"
+    assert get_noreply_login("bob@users.noreply.github.com") == "bob"
+    assert get_noreply_login("bob@example.com") is None
+    assert get_search_query(["a@x.com", "b@x.com"]).count("in:email") == 2
+
+
+def test_resolve_aliases_and_cache(stub, tmp_path):
+    """Коммиты без учетной записи учитываются по email, псевдонимы объединяются, соответствия сохраняются"""
+    path = str(tmp_path / "identities.json")
+    params = Params(url=stub.repository_url, api_key="key", begin_date=None, end_date=None, branch="master",
+                    dev_activity=True, pull_requests=False, issues=False)
+    plain = dict(load_commits(params).count_by_author(10))
+    resolver = IdentityResolver("key", {"developer1": "developer0"}, path)
+    resolved = dict(load_commits(params, resolver=resolver).count_by_author(10))
+    assert sum(resolved.values()) == dataset.commits > sum(plain.values())
+    assert "developer1" not in resolved
+    assert resolved["developer0"] > plain["developer0"] + plain["developer1"]
+    assert resolver.lookups == 1
+    assert load_json(path)["emails"]
+
+    cached = IdentityResolver("key", {"developer1": "developer0"}, path)
+    requests_before = stub.state.requests
+    assert dict(load_commits(params, resolver=cached).count_by_author(10)) == resolved
+    assert cached.lookups == 0
+    assert stub.state.requests - requests_before == 2
+
+
+def test_unresolved_email_and_rate_limit(stub, tmp_path):
+    """Ненайденный адрес учитывается как есть; при малом остатке лимита непроверенные адреса не учитываются"""
+    resolver = IdentityResolver("key", {"Bot@Example.com": "bots"}, str(tmp_path / "identities.json"))
+    resolver.emails["ghost@example.com"] = [None, 0]
+    assert resolver.get_login(None, "bot@example.com") == "bots"
+    assert resolver.get_login(None, "ghost@example.com") == "ghost@example.com"
+    assert not resolver._is_known("ghost@example.com")
+
+    limited = IdentityResolver("key", path=str(tmp_path / "limited.json"), batch_size=1, reserve=stub.state.rate_limit)
+    logins = limited.resolve([None, None, "alice"], ["developer0@example.com", "developer1@example.com", None])
+    assert limited.lookups == 1
+    assert limited._is_known("developer0@example.com") and not limited._is_known("developer1@example.com")
+    # Непроверенный адрес не учитывается под email, а результат помечается неполным
+    assert logins == ["developer0", None, "alice"]
+    assert limited.unresolved_commits == 1
+
+
+def test_graphql_errors_leave_emails_unchecked(tmp_path, monkeypatch):
+    """Ответ 200 с ошибками graphql не сохраняется: адреса остаются непроверенными, коммиты - неучтенными"""
+    path = str(tmp_path / "identities.json")
+    responses = [
+        ResponseData({"errors": [{"type": "RATE_LIMITED"}], "data": None}, {}, "100", None, 200),
+        ResponseData({"data": {"e0": {"nodes": [{"login": "developer0"}]}}}, {}, "100", None, 200),
+    ]
+    monkeypatch.setattr(identity, "post_response_data", lambda *args: responses.pop(0))
+    for _ in range(2):
+        resolver = IdentityResolver("key", path=path)
+        logins = resolver.resolve([None, None], ["developer0@example.com", "developer1@example.com"])
+        assert logins == [None, None]
+        assert resolver.unresolved_commits == 2
+        assert load_json(path)["emails"] == {}
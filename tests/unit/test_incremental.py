@@ -0,0 +1,87 @@
+import pytest
+
+from unittest.mock import patch
+
+from benchmarks.datasets import Dataset
+from repository_statistics.calculations import get_result_data
+from repository_statistics.exceptions import HTTPError
+from repository_statistics.incremental import fetch_new_commits, merge_counts
+from repository_statistics.sites import github
+from repository_statistics.sites.base import is_commit_in_period
+from repository_statistics.structure import Params
+
+
+dataset = Dataset(commits=450, open_pulls=0, closed_pulls=0, open_issues=0, closed_issues=0, authors=7)
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """Состояние инкрементального подсчета во временном каталоге"""
+    monkeypatch.setenv("REPOSITORY_STATISTICS_CACHE", str(tmp_path))
+
+
+def make_params(stub) -> Params:
+    return Params(url=stub.repository_url, api_key="key", begin_date=None, end_date=None, branch="master",
+                  dev_activity=True, pull_requests=False, issues=False, incremental=True)
+
+
+def test_merge_counts_puts_new_authors_first():
+    """Авторы новых коммитов идут первыми, количество коммитов складывается"""
+    assert merge_counts([("carol", 1), ("alice", 2)], [["alice", 3], ["bob", 2]]) == \
+        [("carol", 1), ("alice", 5), ("bob", 2)]
+
+
+def test_is_commit_in_period():
+    """Дата коммита сравнивается с периодом отчета по дате коммиттера"""
+    params = Params(url="", api_key="", begin_date="2021-01-01T00:00:00Z", end_date="2021-02-01T00:00:00Z",
+                    branch="master", dev_activity=True, pull_requests=False, issues=False)
+    commit_date = github.get_commit_date({"commit": {"committer": {"date": "2021-01-15T10:00:00Z"}}})
+    assert is_commit_in_period(params, commit_date)
+    assert not is_commit_in_period(params._replace(begin_date="2021-01-16T00:00:00Z"), commit_date)
+    assert is_commit_in_period(params._replace(begin_date=None, end_date=None), commit_date)
+    assert is_commit_in_period(params, "2021-01-15T10:00:00+00:00")
+
+
+def test_incremental_matches_full_scan(stub):
+    """После новых коммитов загружаются только они, а результат совпадает с полным подсчетом"""
+    params = make_params(stub)
+    stub.state.hidden_commits = 130
+    get_result_data(params)
+
+    stub.state.hidden_commits = 0
+    requests = stub.state.requests
+    incremental = get_result_data(params)
+    # head ветки и две страницы compare вместо пяти страниц списка коммитов
+    assert stub.state.requests - requests == 3
+    assert incremental.dev_activity == get_result_data(params._replace(incremental=False)).dev_activity
+
+    requests = stub.state.requests
+    assert get_result_data(params).dev_activity == incremental.dev_activity
+    assert stub.state.requests - requests == 1
+
+
+def test_diverged_history_falls_back_to_full_scan(stub):
+    """При перезаписи истории выполняется полный подсчет"""
+    params = make_params(stub)
+    stub.state.hidden_commits = 10
+    get_result_data(params)
+
+    stub.state.hidden_commits, stub.state.diverged = 0, True
+    requests = stub.state.requests
+    result = get_result_data(params)
+    assert stub.state.requests - requests == 2 + 5
+    assert result.dev_activity == get_result_data(params._replace(incremental=False)).dev_activity
+
+
+@pytest.mark.parametrize('status_code, falls_back', [(404, True), (422, True), (403, False), (500, False)])
+def test_fetch_new_commits_errors(status_code, falls_back):
+    """Полный подсчет выполняется только при недоступном base, остальные ошибки api передаются дальше"""
+    params = Params(url="https://github.com/owner/repo", api_key="key", begin_date=None, end_date=None,
+                    branch="master", dev_activity=True, pull_requests=False, issues=False, incremental=True)
+    error = HTTPError("Ошибка", status_code)
+    with patch('repository_statistics.incremental.get_response_data', side_effect=error):
+        if falls_back:
+            assert fetch_new_commits(params, "a" * 40, "b" * 40) is None
+        else:
+            with pytest.raises(HTTPError):
+                fetch_new_commits(params, "a" * 40, "b" * 40)
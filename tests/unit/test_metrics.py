@@ -0,0 +1,57 @@
+import numpy as np
+
+from datetime import date
+
+from repository_statistics.metrics import get_commits_per_week, get_time_to_merge, get_issues_age
+from repository_statistics.table import ItemTable, STATE_OPEN, STATE_PULL_REQUEST
+
+
+def test_get_commits_per_week():
+    """Коммиты группируются по неделям, начинающимся с понедельника"""
+    commits = ItemTable.from_columns(
+        ["2020-11-02T10:00:00Z", "2020-11-08T10:00:00Z", "2020-11-09T10:00:00Z", "2020-11-20T10:00:00Z"],
+        [0] * 4,
+        ["alice", "alice", "bob", None]
+    )
+    result = get_commits_per_week(commits)
+    assert result.weeks.tolist() == [date(2020, 11, 2), date(2020, 11, 9)]
+    assert result.authors == ["alice", "bob"]
+    assert result.counts.tolist() == [[2, 0], [0, 1]]
+
+
+def test_get_commits_per_week_empty():
+    """Для пустой таблицы возвращается пустая матрица"""
+    result = get_commits_per_week(ItemTable.from_columns([], [], []))
+    assert result.counts.shape == (0, 0)
+
+
+def test_get_time_to_merge():
+    """Перцентили считаются только по слитым pull requests из интервала дат"""
+    pulls = ItemTable.from_columns(
+        ["2020-11-01T00:00:00Z", "2020-11-02T00:00:00Z", "2020-11-03T00:00:00Z", "2020-10-01T00:00:00Z"],
+        [0] * 4,
+        ["a", "b", "c", "d"],
+        closed=["2020-11-01T01:00:00Z", "2020-11-02T03:00:00Z", "2020-11-04T00:00:00Z", "2020-10-02T00:00:00Z"],
+        merged=["2020-11-01T01:00:00Z", "2020-11-02T03:00:00Z", None, "2020-10-02T00:00:00Z"]
+    )
+    result = get_time_to_merge(pulls, date(2020, 11, 1), None)
+    assert result.size == 2
+    assert result.values[0] == 2 * 3600
+
+
+def test_get_time_to_merge_empty():
+    """Без слитых pull requests перцентили не определены"""
+    result = get_time_to_merge(ItemTable.from_columns([], [], []), None, None)
+    assert result.size == 0
+    assert np.isnan(result.values).all()
+
+
+def test_get_issues_age():
+    """Pull requests не попадают в гистограмму возраста issues"""
+    issues = ItemTable.from_columns(
+        ["2020-11-20T00:00:00Z", "2020-11-15T00:00:00Z", "2020-11-15T00:00:00Z", "2019-01-01T00:00:00Z"],
+        [STATE_OPEN, STATE_OPEN, STATE_OPEN | STATE_PULL_REQUEST, STATE_OPEN],
+        ["a", "b", "c", "d"]
+    )
+    result = get_issues_age(issues, None, None, current_date=date(2020, 11, 20))
+    assert result.counts.tolist() == [1, 1, 0, 0, 0, 0, 0, 1]
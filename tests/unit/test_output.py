@@ -0,0 +1,106 @@
+import io
+import json
+import threading
+
+import pytest
+
+from benchmarks.datasets import Dataset
+from repository_statistics.calculations import iter_result_data
+from repository_statistics.exceptions import HTTPError
+from repository_statistics.sites import github
+from repository_statistics.output import get_writer, flatten, write_sections
+from repository_statistics.structure import Params, PullRequests, Issues
+
+
+sections = [("dev_activity", [("alice", 3), ("bob", 1)]), ("contributors", None),
+            ("pull_requests", PullRequests(1, 2, 0)), ("issues", Issues(4, 5, 1)), ("metrics", None)]
+
+
+def test_json_writer_streams_valid_document():
+    """Записи об объектах и поля результата образуют один корректный json-объект"""
+    stream = io.StringIO()
+    writer = get_writer("json", stream)
+    writer.item("commits", {"id": "a", "login": "alice"})
+    writer.item("commits", {"id": "b", "login": "bob"})
+    result_data = write_sections(writer, iter(sections))
+    data = json.loads(stream.getvalue())
+    assert list(data) == ["commits", "dev_activity", "pull_requests", "issues"]
+    assert data["pull_requests"]["closed_pull_requests"] == 2
+    assert result_data.issues == Issues(4, 5, 1)
+
+
+def test_sections_written_before_next_scan():
+    """Поле выводится сразу после вычисления, до начала следующего этапа"""
+    stream = io.StringIO()
+
+    def slow_sections():
+        yield sections[0]
+        assert '"dev_activity"' in stream.getvalue()
+        yield sections[2]
+
+    write_sections(get_writer("ndjson", stream), slow_sections())
+    assert [json.loads(line)["name"] for line in stream.getvalue().splitlines()] == ["dev_activity", "pull_requests"]
+
+
+@pytest.mark.parametrize("output_format", ["json", "ndjson", "csv"])
+def test_error_terminates_document(output_format):
+    """Ошибка посреди расчета записывается в документ, и документ остается завершенным"""
+    stream = io.StringIO()
+
+    def failing_sections():
+        yield sections[0]
+        raise HTTPError("Доступ к ресурсу ограничен.")
+
+    with pytest.raises(HTTPError):
+        write_sections(get_writer(output_format, stream), failing_sections())
+    output = stream.getvalue()
+    if output_format == "json":
+        assert json.loads(output)["error"] == "Доступ к ресурсу ограничен."
+    elif output_format == "ndjson":
+        assert json.loads(output.splitlines()[-1]) == {"type": "error", "message": "Доступ к ресурсу ограничен."}
+    else:
+        assert output.splitlines()[-1] == "error,message,Доступ к ресурсу ограничен."
+
+
+def test_csv_flatten():
+    """Вложенные значения разворачиваются в ключи через точку, пары - по логину"""
+    assert list(flatten([["alice", {"value": 3, "margin": 1}]])) == [("alice.value", 3), ("alice.margin", 1)]
+    assert list(flatten({"counts": [[1, 2]]})) == [("counts.0.0", 1), ("counts.0.1", 2)]
+    stream = io.StringIO()
+    write_sections(get_writer("csv", stream), iter(sections[:1]))
+    assert stream.getvalue().splitlines() == ["section,key,value", "dev_activity,alice,3", "dev_activity,bob,1"]
+
+
+def test_iter_result_data_streams_items(make_stub):
+    """Записи об объектах передаются по мере загрузки страниц"""
+    stub = make_stub(Dataset(commits=150, open_pulls=5, closed_pulls=3, open_issues=0, closed_issues=0, authors=3))
+    params = Params(url=stub.repository_url, api_key="key", begin_date=None, end_date=None, branch="master",
+                    dev_activity=True, pull_requests=True, issues=False)
+    items = []
+    names = [name for name, _ in iter_result_data(params, lambda kind, record: items.append(kind))]
+    # Записи об объектах одного списка идут подряд, поэтому этапы выполняются последовательно
+    assert names == ["dev_activity", "unresolved_commits", "contributors", "pull_requests", "issues", "metrics"]
+    assert items.count("commits") == 150 and items.count("open_pulls") == 5 and items.count("closed_pulls") == 3
+
+
+def test_iter_result_data_emits_finished_scans_first(make_stub, monkeypatch):
+    """Этапы загружаются одновременно: pull requests выводятся, пока коммиты еще загружаются"""
+    stub = make_stub(Dataset(commits=10, open_pulls=2, closed_pulls=1, open_issues=0, closed_issues=0, authors=2))
+    params = Params(url=stub.repository_url, api_key="key", begin_date=None, end_date=None, branch="master",
+                    dev_activity=True, pull_requests=True, issues=False)
+    pulls_emitted = threading.Event()
+    load_commits = github.driver.load_commits
+
+    def slow_load_commits(*args, **kwargs):
+        pulls_emitted.wait(5)
+        return load_commits(*args, **kwargs)
+
+    monkeypatch.setattr(github.driver, "load_commits", slow_load_commits)
+    names = []
+    for name, value in iter_result_data(params):
+        names.append(name)
+        if name == "pull_requests":
+            assert value.open_pull_requests == 2 and value.closed_pull_requests == 1
+            pulls_emitted.set()
+    assert names.index("pull_requests") < names.index("dev_activity")
+    assert names[-1] == "metrics"
@@ -0,0 +1,51 @@
+import pytest
+
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.datasets import Dataset
+from repository_statistics.calculations import get_result_data, iter_result_data
+from repository_statistics.exceptions import ValidationError
+from repository_statistics.parallel import aggregate_listing, merge_partials
+from repository_statistics.sites.github import get_request_attributes_for_commits
+from repository_statistics.structure import Params
+
+
+dataset = Dataset(commits=450, open_pulls=120, closed_pulls=230, open_issues=150, closed_issues=40, authors=7)
+
+
+def test_merge_partials_keeps_first_seen_order():
+    """При равном количестве коммитов порядок авторов соответствует первому появлению, как в расчете по таблице"""
+    partials = [[("bob", 2), ("alice", 1)], [("alice", 1), ("carol", 2)], [("dave", 1)]]
+    assert merge_partials("commits", partials) == [("bob", 2), ("alice", 2), ("carol", 2), ("dave", 1)]
+    assert merge_partials("open_pulls", [(3, 1), (2, 2)]) == (5, 3)
+    assert merge_partials("open_pulls", []) == (0, 0)
+
+
+def test_parallel_result_matches_sequential(stub):
+    """Расчет в пуле процессов совпадает с последовательным расчетом"""
+    params = Params(url=stub.repository_url, api_key="key", begin_date="2020-12-01T00:00:00Z",
+                    end_date=None, branch="master", dev_activity=True, pull_requests=True, issues=True)
+    sequential = get_result_data(params)
+    parallel = get_result_data(params._replace(workers=2))
+    assert parallel.dev_activity == sequential.dev_activity
+    assert parallel.pull_requests == sequential.pull_requests
+    assert parallel.issues == sequential.issues
+    assert get_result_data(params._replace(workers=1, pull_requests=False)).pull_requests is None
+
+
+def test_parallel_window_limits_pages_in_flight(stub):
+    """Загрузка и разбор ограничены окном страниц, а результат от размера окна не зависит"""
+    params = Params(url=stub.repository_url, api_key="key", begin_date=None, end_date=None, branch="master",
+                    dev_activity=True, pull_requests=False, issues=False)
+    with ThreadPoolExecutor(1) as pool, ThreadPoolExecutor(8) as fetchers:
+        narrow = aggregate_listing("commits", get_request_attributes_for_commits(params), params, pool, fetchers, 1)
+        wide = aggregate_listing("commits", get_request_attributes_for_commits(params), params, pool, fetchers, 16)
+    assert narrow == wide == get_result_data(params).dev_activity
+
+
+def test_parallel_rejects_items(stub):
+    """Записи объектов в режиме workers не передаются"""
+    params = Params(url=stub.repository_url, api_key="key", begin_date=None, end_date=None, branch="master",
+                    dev_activity=True, pull_requests=False, issues=False, workers=1)
+    with pytest.raises(ValidationError):
+        dict(iter_result_data(params, lambda kind, record: None))
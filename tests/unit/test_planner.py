@@ -0,0 +1,56 @@
+from unittest.mock import patch
+
+from repository_statistics.planner import get_plan
+from repository_statistics.structure import Params, ResponseData
+
+
+params = Params(url="https://github.com/owner/repo", api_key="key", begin_date=None, end_date=None, branch="master",
+                dev_activity=True, pull_requests=True, issues=False, plan=True)
+items = {"commits": 12345, "pulls": 150}
+
+
+def get_response_data(url, parameters=None, headers=None):
+    """Ответ на запрос с per_page=1: номер последней страницы равен количеству объектов"""
+    total = items[url.rsplit("/", 1)[-1]]
+    assert parameters["per_page"] == "1"
+    if total <= 1:
+        return ResponseData([{}] * total, {}, "100", None, 200)
+    return ResponseData([{}], {"last": {"url": f"{url}?per_page=1&page={total}"}}, "100", None, 200)
+
+
+@patch('repository_statistics.planner.get_response_data', side_effect=get_response_data)
+def test_get_plan(mock_get_response_data):
+    """План считает страницы по количеству объектов и сравнивает запросы с лимитом"""
+    plan = get_plan(params)
+    assert [(scan.name, scan.pages) for scan in plan.scans] == [
+        ("commits", 124), ("open pull requests", 2), ("closed pull requests", 2)]
+    assert plan.probes == 3
+    assert plan.requests == 128
+    assert plan.rate_limit_remaining == 100
+    assert not plan.fits
+    assert any("--estimate" in recommendation for recommendation in plan.recommendations)
+
+
+@patch('repository_statistics.planner.get_response_data', side_effect=get_response_data)
+def test_get_plan_estimation_mode(mock_get_response_data):
+    """В режиме оценки количество запросов ограничено бюджетом выборки"""
+    plan = get_plan(params._replace(estimate=True, sample_budget=5))
+    assert plan.requests == 5 + 2 + 2
+    assert plan.fits
+
+
+@patch('repository_statistics.planner.get_response_data', side_effect=get_response_data)
+def test_get_plan_target_error_without_budget(mock_get_response_data):
+    """С целевой ошибкой без бюджета выборка может загрузить все страницы, и план учитывает их все"""
+    plan = get_plan(params._replace(estimate=True, target_error=0.05))
+    assert plan.requests == 124 + 2 + 2
+    assert not plan.fits
+
+
+@patch('repository_statistics.planner.get_response_data', side_effect=get_response_data)
+@patch.dict(items, {"commits": 1, "pulls": 0})
+def test_get_plan_without_last_link(mock_get_response_data):
+    """Без ссылки rel="last" количество объектов равно количеству объектов в теле ответа"""
+    plan = get_plan(params)
+    assert [(scan.name, scan.items) for scan in plan.scans] == [
+        ("commits", 1), ("open pull requests", 0), ("closed pull requests", 0)]
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from benchmarks.datasets import Dataset
+from repository_statistics.calculations import get_result_data
+from repository_statistics.profiling import profiling, phase
+from repository_statistics.structure import Params
+
+
+dataset = Dataset(commits=250, open_pulls=20, closed_pulls=10, open_issues=5, closed_issues=5, authors=5)
+
+
+def allocate():
+    return [str(i) for i in range(10000)]
+
+
+def test_profiling_writes_phase_files(tmp_path):
+    """Для каждого этапа сохраняются статистика cProfile, снимок tracemalloc и общая сводка"""
+    with profiling(str(tmp_path), top_n=5) as profiler:
+        with phase("dev_activity"):
+            allocate()
+        with phase("dev_activity"):
+            allocate()
+        with phase("issues"):
+            pass
+    assert sorted(os.listdir(tmp_path)) == [
+        "dev_activity.prof", "dev_activity.tracemalloc", "issues.prof", "issues.tracemalloc", "summary.txt"]
+    assert profiler.phases["dev_activity"].peak_memory > 0
+    assert "allocate" in profiler.summary
+    assert "=== issues" in (tmp_path / "summary.txt").read_text()
+
+
+def test_phase_without_profiler():
+    """Вне режима профилирования этап ничего не делает"""
+    with phase("dev_activity"):
+        assert allocate()
+
+
+@pytest.mark.parametrize('options, phases', [
+    ({"pull_requests": True}, ["pull_requests"]),
+    ({"dev_activity": True, "estimate": True, "sample_budget": 2}, ["estimate"]),
+])
+def test_only_requested_phases_profiled(stub, tmp_path, options, phases):
+    """Профилируются только выбранные этапы расчета, включая режим оценки"""
+    params = Params(url=stub.repository_url, api_key="key", begin_date=None, end_date=None, branch="master",
+                    dev_activity=False, pull_requests=False, issues=False)._replace(**options)
+    with profiling(str(tmp_path)) as profiler:
+        get_result_data(params)
+    assert list(profiler.phases) == phases
+    assert sorted(os.listdir(tmp_path)) == sorted([f"{name}.prof" for name in phases]
+                                                  + [f"{name}.tracemalloc" for name in phases] + ["summary.txt"])
@@ -0,0 +1,105 @@
+import threading
+
+import pytest
+import requests
+
+from benchmarks.datasets import Dataset
+from benchmarks.stub_server import StubServer
+from repository_statistics.calculations import get_result_data
+from repository_statistics.identity import IdentityResolver
+from repository_statistics.proxy import ProxyState, Budget, make_server
+from repository_statistics.sites import github
+from repository_statistics.structure import Params
+
+
+dataset = Dataset(commits=250, open_pulls=20, closed_pulls=10, open_issues=5, closed_issues=5, authors=5)
+
+
+@pytest.fixture()
+def proxy_and_stub():
+    with StubServer(dataset, latency=0.05) as stub:
+        state = ProxyState(stub.url, Budget(limit=20))
+        server = make_server(state, "127.0.0.1", 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        yield f"http://127.0.0.1:{server.server_address[1]}", state, stub
+        server.shutdown()
+        server.server_close()
+
+
+def test_proxy_coalesces_in_flight_requests(proxy_and_stub):
+    """Одинаковые одновременные запросы выполняются одним запросом к api"""
+    url, state, stub = proxy_and_stub
+    responses = []
+    threads = [threading.Thread(target=lambda: responses.append(requests.get(f"{url}/repos/owner/repo/pulls")))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert stub.state.requests == 1
+    assert {response.headers["X-Proxy-Cache"] for response in responses} == {"MISS", "COALESCED"}
+    assert all(len(response.json()) == 20 for response in responses)
+
+
+def test_proxy_revalidates_with_etag_and_rewrites_links(proxy_and_stub):
+    """Повторный запрос перепроверяется условным запросом, ссылки пагинации указывают на прокси"""
+    url, state, stub = proxy_and_stub
+    first = requests.get(f"{url}/repos/owner/repo/commits", params={"per_page": 100})
+    second = requests.get(f"{url}/repos/owner/repo/commits", params={"per_page": 100})
+    assert second.headers["X-Proxy-Cache"] == "REVALIDATED"
+    assert second.json() == first.json()
+    assert first.links["next"]["url"].startswith(url)
+    assert stub.state.remaining == stub.state.rate_limit - 1
+    assert state.budget.used == 1
+    not_modified = requests.get(f"{url}/repos/owner/repo/commits", params={"per_page": 100},
+                                headers={"If-None-Match": first.headers["ETag"]})
+    assert not_modified.status_code == 304
+
+
+def test_proxy_head_uses_cache(proxy_and_stub):
+    """HEAD отвечается по сохраненной странице: повторная проверка не расходует бюджет"""
+    url, state, stub = proxy_and_stub
+    first = requests.head(f"{url}/repos/owner/repo/branches/master")
+    second = requests.head(f"{url}/repos/owner/repo/branches/master")
+    assert first.status_code == second.status_code == 200
+    assert second.headers["X-Proxy-Cache"] == "REVALIDATED"
+    assert not second.content
+    assert state.budget.used == 1
+
+
+def test_proxy_budget(proxy_and_stub):
+    """При исчерпании бюджета прокси отдает сохраненные страницы, для остальных - 429 с Retry-After"""
+    url, state, stub = proxy_and_stub
+    state.budget.limit = 1
+    assert requests.get(f"{url}/repos/owner/repo/issues").status_code == 200
+    stale = requests.get(f"{url}/repos/owner/repo/issues")
+    assert stale.headers["X-Proxy-Cache"] == "STALE"
+    rejected = requests.get(f"{url}/repos/owner/repo/pulls")
+    assert rejected.status_code == 429
+    assert int(rejected.headers["Retry-After"]) > 0
+
+
+def test_full_scan_through_proxy(proxy_and_stub, monkeypatch):
+    """Расчет через прокси совпадает с расчетом напрямую, повторный запуск не расходует лимит api"""
+    url, state, stub = proxy_and_stub
+    monkeypatch.setattr(github, "BASE_URL", url)
+    params = Params(url=stub.repository_url, api_key="key", begin_date=None, end_date=None, branch="master",
+                    dev_activity=True, pull_requests=True, issues=False)
+    first = get_result_data(params)
+    remaining = stub.state.remaining
+    assert get_result_data(params) == first
+    assert stub.state.remaining == remaining
+
+
+def test_proxy_forwards_graphql(proxy_and_stub, monkeypatch, tmp_path):
+    """POST /graphql передается в api без кэширования и расходует бюджет, остальные POST отклоняются"""
+    url, state, stub = proxy_and_stub
+    monkeypatch.setattr(github, "BASE_URL", url)
+    emails = ["developer0@example.com", "developer1@example.com"]
+    for attempt in range(1, 3):
+        resolver = IdentityResolver("key", path=str(tmp_path / f"identities{attempt}.json"))
+        assert resolver.resolve([None, None], emails) == ["developer0", "developer1"]
+        assert resolver.unresolved_commits == 0
+        assert stub.state.requests == state.budget.used == attempt
+    assert state.statistics["BYPASS"] == 2
+    assert requests.post(f"{url}/repos/owner/repo/pulls", json={}).status_code == 501
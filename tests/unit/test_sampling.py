@@ -0,0 +1,71 @@
+import math
+import random
+import numpy as np
+import pytest
+
+from unittest.mock import patch
+
+from repository_statistics.calculations import iter_result_data
+from repository_statistics.exceptions import ValidationError
+from repository_statistics.sampling import estimate_total, sample_pages, get_estimated_result_data
+from repository_statistics.sites.github import make_commits_table
+from repository_statistics.structure import Params, ResponseData
+
+
+total_pages = 10
+params = Params(url="https://github.com/owner/repo", api_key="key", begin_date=None, end_date=None, branch="master",
+                dev_activity=True, pull_requests=False, issues=False, estimate=True)
+
+
+def get_page(url, parameters=None, headers=None):
+    """Страница из 100 коммитов: 60 от alice и 40 от bob"""
+    page = int(parameters.get("page", "1"))
+    commits = [{"commit": {"author": {"date": "2020-11-01T00:00:00Z"}},
+                "author": {"login": "alice" if i < 60 else "bob"}} for i in range(100)]
+    links = {"last": {"url": f"{url}?per_page=100&page={total_pages}"}} if page == 1 else {}
+    return ResponseData(commits, links, None, None, 200)
+
+
+def test_estimate_total_exact_when_all_pages_sampled():
+    """Если выбраны все страницы, оценка точная"""
+    assert estimate_total(5, np.array([1.0, 2.0, 3.0]), 3) == (11.0, 0.0, 4, 4)
+
+
+def test_estimate_total_margin():
+    """Половина доверительного интервала учитывает поправку на конечность совокупности"""
+    estimate = estimate_total(0, np.array([1.0, 3.0]), 4)
+    assert estimate.value == 8.0
+    assert math.isclose(estimate.margin, 1.96 * math.sqrt(16 * 0.5 * 2.0 / 2))
+
+
+@patch('repository_statistics.sampling.get_response_data', side_effect=get_page)
+def test_sample_pages_respects_budget(mock_get_response_data):
+    """Количество запросов не превышает бюджет"""
+    sample = sample_pages(("http://url", {"per_page": "100"}, {}), make_commits_table, len, 4, None, random.Random(1))
+    assert mock_get_response_data.call_count == 4
+    assert sample.total_pages == total_pages
+    assert sample.estimate(len).value == 1000
+
+
+@patch('repository_statistics.sampling.get_response_data', side_effect=get_page)
+def test_sample_pages_stops_on_target_error(mock_get_response_data):
+    """При одинаковых страницах погрешность нулевая, и выборка останавливается на минимальном размере"""
+    sample_pages(("http://url", {"per_page": "100"}, {}), make_commits_table, len, None, 0.01, random.Random(1))
+    assert mock_get_response_data.call_count == 3
+
+
+@patch('repository_statistics.sampling.get_response_data', side_effect=get_page)
+def test_get_estimated_result_data(mock_get_response_data):
+    """Оценка количества коммитов по авторам экстраполируется на все страницы"""
+    result_data = get_estimated_result_data(params._replace(sample_budget=5), seed=1)
+    assert [(login, estimate.value) for login, estimate in result_data.dev_activity] == [("alice", 600), ("bob", 400)]
+    assert result_data.sampling.sampling_fraction == 0.5
+
+
+@pytest.mark.parametrize('mode', [{"metrics": True}, {"sketch": "sketch.json"}, {"identities": True}])
+def test_estimate_rejects_unsupported_modes(mode):
+    """Режим оценки не сочетается с метриками, скетчем, разрешением авторов и записями объектов"""
+    with pytest.raises(ValidationError):
+        dict(iter_result_data(params._replace(**mode)))
+    with pytest.raises(ValidationError):
+        dict(iter_result_data(params, lambda kind, record: None))
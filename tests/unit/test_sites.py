@@ -0,0 +1,124 @@
+import pytest
+
+from benchmarks.datasets import Dataset
+from repository_statistics.calculations import get_result_data, iter_result_data
+from repository_statistics.exceptions import ValidationError
+from repository_statistics.sites import get_driver, bitbucket, github
+from repository_statistics.sites.base import SiteDriver
+from repository_statistics.structure import Params, RateLimit
+from repository_statistics.validation import is_api_key, is_branch, is_url
+
+
+dataset = Dataset(commits=450, open_pulls=120, closed_pulls=230, open_issues=150, closed_issues=40, authors=7,
+                  commits_without_author=10)
+
+
+@pytest.fixture()
+def stubs(make_stub):
+    return make_stub(dataset), make_stub(dataset, site="bitbucket")
+
+
+def make_params(url: str) -> Params:
+    return Params(url=url, api_key="key", begin_date="2020-12-10T00:00:00Z", end_date="2020-12-30T23:59:59Z",
+                  branch="master", dev_activity=True, pull_requests=True, issues=True, metrics=True)
+
+
+def test_get_driver_by_host():
+    """Драйвер выбирается по хосту репозитория, неизвестные хосты обслуживает драйвер github"""
+    assert get_driver("https://bitbucket.org/workspace/repo") is bitbucket.driver
+    assert get_driver("https://www.github.com/owner/repo") is github.driver
+    assert get_driver("https://github.example.com/owner/repo") is github.driver
+    assert get_driver(None) is github.driver
+
+
+def test_driver_must_implement_interface():
+    """Драйвер без обязательных методов нельзя создать"""
+    class PartialDriver(SiteDriver):
+        def set_base_url(self, url):
+            pass
+
+    with pytest.raises(TypeError, match="get_request_attributes"):
+        PartialDriver()
+
+
+@pytest.mark.parametrize('driver', [github.driver, bitbucket.driver])
+def test_cached_headers_are_read_only(driver):
+    """Кэшируемые заголовки запроса нельзя изменить через возвращенное значение"""
+    headers = driver.get_headers("key")
+    with pytest.raises(TypeError):
+        headers["Authorization"] = "changed"
+    assert {**headers, "If-None-Match": "etag"}["Authorization"] == driver.get_headers("key")["Authorization"]
+
+
+@pytest.mark.parametrize('driver', [github.driver, bitbucket.driver])
+def test_endpoint_paths_match_endpoints(driver):
+    """Каждый адрес endpoints распознается по шаблонам endpoint_paths как свое семейство"""
+    assert set(driver.endpoint_paths) == set(driver.endpoints)
+    arguments = {"url": "https://example.com/owner/repo", "branch": "feature/x", "base": "abc", "head": "def"}
+    for family, endpoint in driver.endpoints.items():
+        url = endpoint(*(arguments[name] for name in endpoint.__code__.co_varnames))
+        assert driver.get_endpoint_family(url) == family
+
+
+def test_bitbucket_rate_limit_headers():
+    """Bitbucket сообщает только лимит и признак приближения к нему"""
+    rate_limit = bitbucket.driver.get_rate_limit
+    assert rate_limit({"X-RateLimit-Limit": "1000", "X-RateLimit-NearLimit": "false"}) == RateLimit(1000, None)
+    assert rate_limit({"X-RateLimit-Limit": "1000", "X-RateLimit-NearLimit": "true"}) == RateLimit(200, None)
+    assert rate_limit({}) is None
+    assert github.driver.get_rate_limit({"X-RateLimit-Remaining": "42"}) == RateLimit(42, None)
+
+
+def test_bitbucket_matches_github(stubs):
+    """Один набор данных на обоих сайтах дает одинаковый результат, включая фильтр коммитов по периоду"""
+    github_stub, bitbucket_stub = stubs
+    github_result = get_result_data(make_params(github_stub.repository_url))
+    bitbucket_result = get_result_data(make_params(bitbucket_stub.repository_url))
+    assert bitbucket_result.dev_activity == github_result.dev_activity
+    assert bitbucket_result.pull_requests == github_result.pull_requests
+    assert bitbucket_result.issues == github_result.issues
+    assert bitbucket_result.metrics.open_issues_age.counts.tolist() == \
+        github_result.metrics.open_issues_age.counts.tolist()
+    # Bitbucket не сообщает даты слияния, время до слияния не вычисляется
+    assert bitbucket_result.metrics.pull_requests_time_to_merge is None
+
+
+def test_bitbucket_stops_paging_before_period(stubs):
+    """Загрузка коммитов прекращается на странице, все коммиты которой старше начала периода"""
+    _, bitbucket_stub = stubs
+    params = make_params(bitbucket_stub.repository_url)._replace(pull_requests=False, issues=False, metrics=False)
+    # Коммиты набора данных идут от 2020-12-31 к 2020-12-19 по 100 на странице: с 2020-12-27 нужны две страницы,
+    # а третья страница уже целиком старше начала периода
+    result = get_result_data(params._replace(begin_date="2020-12-27T00:00:00Z"))
+    assert bitbucket_stub.state.requests == 3
+    assert sum(count for _, count in result.dev_activity) < 200
+
+
+def test_bitbucket_validation_with_access_token(stubs):
+    """Репозиторий, ветка и api_key Bitbucket проверяются запросами к api репозитория с авторизацией"""
+    _, bitbucket_stub = stubs
+    url = bitbucket_stub.repository_url
+    assert bitbucket.driver.get_api_key_check_url(url).endswith("/repositories/owner/repo")
+    requests = bitbucket_stub.state.requests
+    assert is_url(url, "key") and is_api_key("key", url) and is_branch(url, "master", "key")
+    assert bitbucket_stub.state.requests - requests == 3
+
+
+def test_bitbucket_items_projection(stubs):
+    """Записи объектов Bitbucket имеют те же поля, что и записи github"""
+    _, bitbucket_stub = stubs
+    records = []
+    params = make_params(bitbucket_stub.repository_url)._replace(dev_activity=False, issues=False, metrics=False)
+    dict(iter_result_data(params, lambda kind, record: records.append((kind, record))))
+    kind, record = next(item for item in records if item[0] == "closed_pulls")
+    assert set(record) == {"id", "login", "state", "created_at", "closed_at", "merged_at", "is_pull_request"}
+    assert record["state"] == "closed" and record["is_pull_request"]
+    assert record["closed_at"] is None and record["merged_at"] is None
+
+
+@pytest.mark.parametrize('mode', [{"estimate": True}, {"sketch": "sketch.json"}])
+def test_unsupported_mode(mode):
+    """Режимы, которые драйвер сайта не поддерживает, отклоняются"""
+    params = make_params("https://bitbucket.org/workspace/repo")._replace(**mode)
+    with pytest.raises(ValidationError):
+        get_result_data(params)
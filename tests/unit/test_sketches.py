@@ -0,0 +1,161 @@
+import random
+
+import pytest
+
+from benchmarks import stub_server
+from benchmarks.datasets import Dataset, get_commit
+from repository_statistics.calculations import get_result_data
+from repository_statistics.sketches import SpaceSaving, HyperLogLog, ContributorSketch, load_sketch, save_sketch
+from repository_statistics.structure import Params
+from repository_statistics.table import ItemTable
+
+
+dataset = Dataset(commits=450, open_pulls=0, closed_pulls=0, open_issues=0, closed_issues=0, authors=7,
+                  commits_without_author=10)
+
+
+def test_space_saving_exact_under_capacity():
+    """Пока сводка не заполнена, подсчет точный"""
+    summary = SpaceSaving(capacity=10)
+    for login in ["a", "b", "a", "c", "a", "b"]:
+        summary.update(login)
+    assert summary.top(2) == [("a", 3, 0), ("b", 2, 0)]
+
+
+def test_space_saving_error_bound():
+    """Ошибка оценки не превосходит total / capacity, частые элементы не теряются"""
+    summary = SpaceSaving(capacity=5)
+    stream = ["heavy"] * 50 + [f"user{i}" for i in range(100)]
+    for login in stream:
+        summary.update(login)
+    (item, count, error), = summary.top(1)
+    assert item == "heavy"
+    assert count - error <= 50 <= count
+    assert error <= summary.total // summary.capacity
+
+
+def test_space_saving_evicts_minimum():
+    """Вытесняется элемент с минимальным счетчиком, как при полном переборе счетчиков"""
+    generator = random.Random(1)
+    summary, counters = SpaceSaving(capacity=8), {}
+    for _ in range(2000):
+        item = f"user{int(generator.paretovariate(1.2)) % 40}"
+        if item in counters:
+            counters[item][0] += 1
+        elif len(counters) < 8:
+            counters[item] = [1, 0]
+        else:
+            minimum = min(count for count, _ in counters.values())
+            victims = [key for key, (count, _) in counters.items() if count == minimum]
+            counters.pop(min(victims))
+            counters[item] = [minimum + 1, minimum]
+        summary.update(item)
+    assert summary.counters == counters
+    assert len(summary._heap) <= 4 * summary.capacity
+
+
+def test_space_saving_merge():
+    """Слияние сводок эквивалентно подсчету по объединенному потоку, пока помещается в capacity"""
+    first, second = SpaceSaving(capacity=10), SpaceSaving(capacity=10)
+    first.update("a", 5)
+    first.update("b", 1)
+    second.update("a", 2)
+    second.update("c", 4)
+    assert first.merge(second).top(3) == [("a", 7, 0), ("c", 4, 0), ("b", 1, 0)]
+    assert first.total == 12
+
+
+@pytest.mark.parametrize('num_items', [10, 1000, 50000])
+def test_hyperloglog_count(num_items):
+    """Оценка количества уникальных элементов укладывается в несколько стандартных ошибок"""
+    sketch = HyperLogLog()
+    for i in range(num_items):
+        sketch.add(f"user{i}")
+        sketch.add(f"user{i}")
+    assert abs(sketch.count() - num_items) <= max(1, 4 * sketch.relative_error * num_items)
+
+
+def test_hyperloglog_merge():
+    """Объединение скетчей дает оценку объединения множеств"""
+    first, second = HyperLogLog(), HyperLogLog()
+    for i in range(1000):
+        first.add(f"user{i}")
+        second.add(f"user{i + 500}")
+    assert abs(first.merge(second).count() - 1500) <= 4 * first.relative_error * 1500
+
+
+def test_hyperloglog_merge_precision_mismatch():
+    """Нельзя объединять скетчи разной точности"""
+    with pytest.raises(ValueError):
+        HyperLogLog(10).merge(HyperLogLog(12))
+
+
+def test_contributor_sketch_roundtrip(tmp_path):
+    """Скетч сохраняется в файл и накапливается между запусками"""
+    path = str(tmp_path / "sketch.json")
+    commits = ItemTable.from_columns(["2020-11-01T00:00:00Z"] * 3, [0] * 3, ["a", "b", "a"])
+    for _ in range(2):
+        sketch = load_sketch(path)
+        sketch.update(commits)
+        save_sketch(path, sketch)
+    contributors = load_sketch(path).get_contributors(30)
+    assert contributors.top == [("a", 4, 0), ("b", 2, 0)]
+    assert contributors.total_commits == 6
+    assert contributors.distinct == 2
+
+
+def test_contributor_sketch_merge():
+    """Скетчи разных репозиториев объединяются"""
+    first, second = ContributorSketch(), ContributorSketch()
+    first.update(ItemTable.from_columns(["2020-11-01T00:00:00Z"], [0], ["a"]))
+    second.update(ItemTable.from_columns(["2020-11-01T00:00:00Z"], [0], ["b"]))
+    assert first.merge(second).get_contributors(30).distinct == 2
+
+
+def test_repeated_runs_do_not_double_count(stub, tmp_path):
+    """Повторный запуск по тому же репозиторию добавляет в скетч только новые коммиты"""
+    params = Params(url=stub.repository_url, api_key="key", begin_date=None, end_date=None, branch="master",
+                    dev_activity=True, pull_requests=False, issues=False, sketch=str(tmp_path / "sketch.json"))
+    stub.state.hidden_commits = 50
+    assert get_result_data(params).contributors.total_commits == \
+        sum(count for _, count in get_result_data(params._replace(sketch=None)).dev_activity)
+
+    stub.state.hidden_commits = 0
+    expected = get_result_data(params._replace(sketch=None)).dev_activity
+    second = get_result_data(params)
+    assert second.dev_activity == expected
+    assert second.contributors.total_commits == sum(count for _, count in expected)
+    assert get_result_data(params).contributors.total_commits == sum(count for _, count in expected)
+
+
+def test_backdated_commit_is_counted(stub, tmp_path, monkeypatch):
+    """Коммит со старой датой автора, попавший в ветку после запуска (слияние ветки, cherry-pick), учитывается"""
+    params = Params(url=stub.repository_url, api_key="key", begin_date=None, end_date=None, branch="master",
+                    dev_activity=True, pull_requests=False, issues=False, sketch=str(tmp_path / "sketch.json"))
+    stub.state.hidden_commits = 2
+    get_result_data(params)
+
+    def get_backdated_commit(dataset, index):
+        commit = get_commit(dataset, index)
+        if index == 1:
+            commit["commit"]["author"]["date"] = "2000-01-01T00:00:00Z"
+        return commit
+
+    monkeypatch.setattr(stub_server, "get_commit", get_backdated_commit)
+    stub.state.hidden_commits = 0
+    expected = get_result_data(params._replace(sketch=str(tmp_path / "full.json"))).contributors.total_commits
+    assert get_result_data(params).contributors.total_commits == expected
+
+
+def test_period_does_not_limit_sketch(stub, tmp_path):
+    """Период отчета ограничивает статистику запуска, а скетч учитывает всю историю ветки"""
+    params = Params(url=stub.repository_url, api_key="key", begin_date="2020-12-27T00:00:00Z", end_date=None,
+                    branch="master", dev_activity=True, pull_requests=False, issues=False,
+                    sketch=str(tmp_path / "sketch.json"))
+    windowed = get_result_data(params)
+    assert windowed.dev_activity == get_result_data(params._replace(sketch=None)).dev_activity
+    whole_history = get_result_data(params._replace(begin_date=None, sketch=None)).dev_activity
+    assert sum(count for _, count in windowed.dev_activity) < windowed.contributors.total_commits == \
+        sum(count for _, count in whole_history)
+    assert get_result_data(params._replace(begin_date=None)).contributors.total_commits == \
+        sum(count for _, count in whole_history)
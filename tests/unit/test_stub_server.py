@@ -0,0 +1,28 @@
+import requests
+
+from benchmarks.datasets import Dataset
+from repository_statistics.calculations import get_result_data
+from repository_statistics.structure import Params
+
+
+dataset = Dataset(commits=250, open_pulls=120, closed_pulls=30, open_issues=50, closed_issues=10, authors=5,
+                  pull_request_ratio=5, commits_without_author=10)
+
+
+def test_stub_pagination_headers(stub):
+    """Заглушка отдает ссылки rel="next"/"last" и заголовки лимита"""
+    response = requests.get(f"{stub.url}/repos/owner/repo/pulls", params={"per_page": "100", "state": "open"})
+    assert len(response.json()) == 100
+    assert response.links["last"]["url"].endswith("page=2")
+    assert int(response.headers["X-RateLimit-Remaining"]) == stub.state.rate_limit - 1
+
+
+def test_full_scan_against_stub(stub):
+    """Полный расчет по заглушке совпадает с размерами синтетического набора"""
+    params = Params(url=stub.repository_url, api_key="key", begin_date=None, end_date=None, branch="master",
+                    dev_activity=True, pull_requests=True, issues=True)
+    result_data = get_result_data(params)
+    assert sum(commits for _, commits in result_data.dev_activity) == 250 - 25
+    assert result_data.pull_requests[:2] == (120, 30)
+    assert result_data.issues[:2] == (40, 8)
+    assert stub.state.requests == 3 + 2 + 1 + 1 + 1
@@ -0,0 +1,62 @@
+import pytest
+
+from datetime import date
+
+from repository_statistics.table import ItemTable, STATE_OPEN, STATE_PULL_REQUEST
+
+
+created = ["2020-10-01T10:00:00Z", "2020-10-15T10:00:00Z", "2020-11-01T10:00:00Z", "2020-11-20T10:00:00Z"]
+flags = [STATE_OPEN, STATE_OPEN | STATE_PULL_REQUEST, 0, STATE_OPEN]
+logins = ["bob", "alice", None, "alice"]
+
+
+@pytest.fixture()
+def table():
+    """Возвращает таблицу из четырех объектов"""
+    return ItemTable.from_columns(created, flags, logins)
+
+
+@pytest.mark.parametrize('begin_date, end_date, expected', [
+    pytest.param(None, None, 4, id='unlimited'),
+    pytest.param(date(2020, 10, 15), None, 3, id='left bound'),
+    pytest.param(None, date(2020, 10, 15), 2, id='right bound'),
+    pytest.param(date(2020, 10, 2), date(2020, 11, 1), 2, id='both bounds')])
+def test_window_mask(table, begin_date, end_date, expected):
+    """Маска интервала дат должна включать границы интервала"""
+    assert table.count(table.window_mask(begin_date, end_date)) == expected
+
+
+def test_older_than_mask(table):
+    """Маска старых объектов считается относительно переданной текущей даты"""
+    assert table.older_than_mask(14, date(2020, 11, 20)).tolist() == [True, True, True, False]
+
+
+def test_older_than_mask_skips_missing_and_future_dates():
+    """Объекты без даты создания и с датой в будущем не считаются старыми"""
+    table = ItemTable.from_columns([None, "2021-03-01T10:00:00Z", "2020-10-01T10:00:00Z"], [0, 0, 0], [None] * 3)
+    assert table.older_than_mask(14, date(2020, 11, 20)).tolist() == [False, False, True]
+
+
+def test_flag_mask(table):
+    """Маска флагов учитывает как установленные, так и сброшенные флаги"""
+    assert table.count(table.flag_mask(STATE_OPEN)) == 3
+    assert table.count(table.flag_mask(STATE_PULL_REQUEST, is_set=False)) == 3
+
+
+def test_count_by_author(table):
+    """Подсчет по авторам пропускает неизвестных авторов и сортирует по убыванию"""
+    assert table.count_by_author(30) == [("alice", 2), ("bob", 1)]
+    assert table.count_by_author(1) == [("alice", 2)]
+
+
+def test_count_by_author_ties_keep_first_seen_order():
+    """При равенстве количества порядок соответствует первому появлению автора, как у Counter.most_common"""
+    table = ItemTable.from_columns(created, [0] * 4, ["carol", "bob", "bob", "carol"])
+    assert table.count_by_author(30) == [("carol", 2), ("bob", 2)]
+
+
+def test_empty_table():
+    """Пустая таблица не должна вызывать ошибок"""
+    table = ItemTable.from_columns([], [], [])
+    assert table.count(table.window_mask(date(2020, 1, 1), None)) == 0
+    assert table.count_by_author(30) == []
@@ -0,0 +1,70 @@
+import json
+import threading
+import pytest
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from repository_statistics import httpclient
+from repository_statistics.sites import github
+from repository_statistics.tracing import tracing, scan, get_endpoint_family, get_page
+
+
+class PagesHandler(BaseHTTPRequestHandler):
+    """Две страницы коммитов со ссылкой rel="next" на первой странице"""
+
+    def do_GET(self):
+        page = 2 if "page=2" in self.path else 1
+        body = json.dumps([{"sha": str(page)}]).encode("utf-8")
+        self.send_response(200)
+        if page == 1:
+            next_url = f"http://127.0.0.1:{self.server.server_address[1]}/repos/o/r/commits?page=2"
+            self.send_header("Link", f'<{next_url}>; rel="next"')
+        self.send_header("X-RateLimit-Remaining", str(100 - page))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture()
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PagesHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/repos/o/r/commits"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize('url, parameters, family, page', [
+    ("https://api.github.com/repos/o/r/commits", {"per_page": "100"}, "commits", 1),
+    ("https://api.github.com/repos/o/r/issues?page=7", None, "issues", 7),
+    ("https://api.github.com/repos/o/r/branches/feature/x", None, "branch", 1),
+    ("https://api.github.com/repos/o/r/compare/abc...def", {"page": "2"}, "compare", 2),
+    ("https://api.github.com/repos/o/r", None, "repository", 1),
+    ("https://api.bitbucket.org/2.0/repositories/ws/repo/commits/master?page=3", None, "commits", 3),
+    ("https://api.bitbucket.org/2.0/repositories/ws/repo", None, "repository", 1),
+    ("http://127.0.0.1:8080/repositories/ws/repo/refs/branches/main", None, "branch", 1)])
+def test_endpoint_family_and_page(url, parameters, family, page):
+    """Семейство endpoint и номер страницы определяются по адресу и параметрам"""
+    assert get_endpoint_family(url) == family
+    assert get_page(url, parameters) == page
+
+
+def test_tracing_records_and_summary(server_url, tmp_path):
+    """На каждый запрос пишется запись, сводка группируется по этапам"""
+    path = tmp_path / "trace.jsonl"
+    with tracing(str(path)) as tracer:
+        with scan("dev_activity"):
+            items = list(github.driver.iter_items((server_url, {"per_page": "1"}, {})))
+    assert items == [{"sha": "1"}, {"sha": "2"}]
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(record["scan"], record["endpoint"], record["page"], record["status"]) for record in records] == [
+        ("dev_activity", "commits", 1, 200), ("dev_activity", "commits", 2, 200)]
+    assert records[1]["rate_limit_remaining"] == "98"
+    assert all(record["bytes"] > 0 and record["total"] >= record["decode"] for record in records)
+    assert records[0]["connect"] > 0
+    assert tracer.summary["dev_activity"]["requests"] == 2
+    assert "dev_activity" in tracer.format_summary()
+    assert not httpclient.trace_hooks
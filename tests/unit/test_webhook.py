@@ -0,0 +1,133 @@
+import hashlib
+import hmac
+import json
+import threading
+import pytest
+
+from unittest.mock import patch
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from repository_statistics.structure import Params
+from repository_statistics.webhook import StatisticsState, make_server, verify_signature
+
+
+secret = "secret"
+params = Params(url="https://github.com/owner/repo", api_key="key", begin_date=None, end_date=None, branch="master",
+                dev_activity=True, pull_requests=True, issues=True)
+
+backfill_commits = [{"sha": "1", "author": {"login": "alice"}}, {"sha": "2", "author": None}]
+backfill_pulls = [{"number": 1, "url": "pulls/1", "state": "open", "created_at": "2020-01-01T00:00:00Z"}]
+backfill_issues = [{"number": 2, "url": "issues/2", "state": "open", "created_at": "2020-01-01T00:00:00Z"},
+                   {"number": 1, "url": "issues/1", "state": "open", "created_at": "2020-01-01T00:00:00Z",
+                    "pull_request": {"url": "pulls/1"}}]
+
+push_payload = {"ref": "refs/heads/master", "commits": [
+    {"id": "1", "distinct": True, "timestamp": "2020-01-02T00:00:00Z", "author": {"username": "alice"}},
+    {"id": "3", "distinct": True, "timestamp": "2020-01-02T00:00:00Z", "author": {"username": "bob"}},
+    {"id": "4", "distinct": True, "timestamp": "2020-01-02T00:00:00Z", "author": {"username": "bob"}}]}
+pull_request_payload = {"action": "closed", "pull_request": {
+    "number": 1, "url": "pulls/1", "state": "closed", "created_at": "2020-01-01T00:00:00Z", "base": {"ref": "master"}}}
+issue_payload = {"action": "opened", "issue": {
+    "number": 3, "url": "issues/3", "state": "open", "created_at": "2020-01-03T00:00:00Z"}}
+
+
+@pytest.fixture()
+def server():
+    """Сервер webhook с предзагруженным состоянием, запущенный в отдельном потоке"""
+    with patch('repository_statistics.webhook.fetch_commits', return_value=iter(backfill_commits)), \
+            patch('repository_statistics.webhook.fetch_pulls', side_effect=[iter(backfill_pulls), iter([])]), \
+            patch('repository_statistics.webhook.fetch_issues', side_effect=[iter(backfill_issues), iter([])]):
+        state = StatisticsState(params)
+        state.backfill()
+    server = make_server(state, "127.0.0.1", 0, secret)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def post(url, event, payload, key=secret):
+    body = json.dumps(payload).encode("utf-8")
+    signature = "sha256=" + hmac.new(key.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    request = Request(url, data=body, headers={"X-GitHub-Event": event, "X-Hub-Signature-256": signature})
+    return urlopen(request).status
+
+
+def get(url):
+    return json.loads(urlopen(url).read())
+
+
+def test_verify_signature():
+    """Подпись проверяется по HMAC SHA256 тела запроса"""
+    signature = "sha256=" + hmac.new(b"secret", b"body", hashlib.sha256).hexdigest()
+    assert verify_signature("secret", b"body", signature)
+    assert not verify_signature("secret", b"other body", signature)
+    assert not verify_signature("secret", b"body", None)
+
+
+def test_backfill(server):
+    """После начальной загрузки сервер отдает статистику"""
+    result_data = get(server)
+    assert result_data["dev_activity"] == [["alice", 1]]
+    assert result_data["pull_requests"]["open_pull_requests"] == 1
+    assert result_data["issues"]["open_issues"] == 1
+
+
+def test_events_update_statistics(server):
+    """События обновляют статистику на месте, повторные коммиты не учитываются дважды"""
+    assert post(server, "push", push_payload) == 202
+    assert post(server, "pull_request", pull_request_payload) == 202
+    assert post(server, "issues", issue_payload) == 202
+    result_data = get(server)
+    assert result_data["dev_activity"] == [["bob", 2], ["alice", 1]]
+    assert result_data["pull_requests"] == {"open_pull_requests": 0, "closed_pull_requests": 1, "old_pull_requests": 0}
+    assert result_data["issues"]["open_issues"] == 2
+
+
+def test_invalid_signature_rejected(server):
+    """Событие с неверной подписью отклоняется и не меняет состояние"""
+    with pytest.raises(HTTPError) as err:
+        post(server, "push", push_payload, key="wrong")
+    assert err.value.code == 401
+    assert get(server)["dev_activity"] == [["alice", 1]]
+
+
+def test_server_requires_secret():
+    """Без секрета сервер создается только явно"""
+    with pytest.raises(ValueError):
+        make_server(StatisticsState(params), "127.0.0.1", 0)
+    server = make_server(StatisticsState(params), "127.0.0.1", 0, insecure=True)
+    server.server_close()
+
+
+def test_push_without_timestamp():
+    """Коммит без даты в событии не ломает обработку и учитывается только без периода отчета"""
+    payload = {"ref": "refs/heads/master", "commits": [{"id": "5", "author": {"username": "carol"}}]}
+    state = StatisticsState(params._replace(begin_date="2020-01-01T00:00:00Z"))
+    state.handle_event("push", payload)
+    assert state.get_result_data().dev_activity == []
+    state = StatisticsState(params)
+    state.handle_event("push", payload)
+    assert state.get_result_data().dev_activity == [("carol", 1)]
+
+
+def test_truncated_push_fetches_compare():
+    """Обрезанный список коммитов события push дополняется через compare before...after"""
+    commits = [{"id": str(i), "timestamp": "2020-01-02T00:00:00Z", "author": {"username": "bob"}} for i in range(20)]
+    compare = [{"sha": str(i), "author": {"login": "bob"}} for i in range(25)]
+    state = StatisticsState(params)
+    with patch('repository_statistics.webhook.fetch_new_commits', return_value=iter(compare)) as mock_compare:
+        state.handle_event("push", {"ref": "refs/heads/master", "before": "a" * 40, "after": "b" * 40,
+                                    "commits": commits})
+    mock_compare.assert_called_once_with(params, "a" * 40, "b" * 40)
+    assert state.get_result_data().dev_activity == [("bob", 25)]
+
+
+def test_retargeted_pull_request_removed():
+    """Pull request, перенаправленный в другую ветку, перестает учитываться"""
+    state = StatisticsState(params)
+    state.handle_event("pull_request", pull_request_payload)
+    retargeted = {"action": "edited", "pull_request": {**pull_request_payload["pull_request"], "base": {"ref": "dev"}}}
+    state.handle_event("pull_request", retargeted)
+    assert state.get_result_data().pull_requests.closed_pull_requests == 0